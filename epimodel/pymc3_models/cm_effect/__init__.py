@@ -1,3 +1,19 @@
 from . import models
 from . import datapreprocessor
-from . import sensitivitylib
\ No newline at end of file
+from . import sensitivitylib
+from . import scheduler
+from . import startpoints
+from . import forward
+from . import sequential
+from . import experiments
+from . import factory
+from . import results
+from . import crossval
+from . import instrumentation
+from . import workqueue
+from . import memory
+from . import traceio
+from . import streaming
+from . import diagnostics
+from . import catalog
+from . import npi_statistics
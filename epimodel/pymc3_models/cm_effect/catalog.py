@@ -0,0 +1,253 @@
+"""
+Catalog of completed runs in a single SQLite file, so that the results of all experiments can be queried
+instead of found by filename convention.
+
+Runners record each sampled model when it completes. A run has three tables:
+- runs: experiment, name, model class, data fingerprint, result key, trace location, outputs, timings and
+  run-level diagnostics
+- params: the experiment parameters, one row per name, e.g. DailyGrowthNoise, min_deaths or the sampler settings
+- summaries: mean, sd, quantiles, R-hat and ESS of each element of the summarised variables (CMReduction)
+
+e.g. all CMReduction summaries with DailyGrowthNoise 0.1: ResultsCatalog().summaries("CMReduction",
+DailyGrowthNoise=0.1). Recording a run again under the same experiment, name and result key replaces the earlier
+record, so re-running a sweep does not add duplicates. Writes are single transactions and wait for concurrent
+writers, so runs on one machine can share a catalog; SQLite locking is unreliable on network filesystems, so
+use one catalog per node there.
+"""
+import contextlib
+import datetime
+import hashlib
+import json
+import logging
+import socket
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from epimodel.pymc3_models.cm_effect.diagnostics import chain_values, diagnostics, drop_elements, free_varnames
+from epimodel.pymc3_models.cm_effect.factory import value_key
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CATALOG = "results_catalog.sqlite"
+CATALOG_QUANTILES = [2.5, 25, 50, 75, 97.5]
+SUMMARY_COLUMNS = ["variable", "element", "label", "mean", "sd", "q2_5", "q25", "q50", "q75", "q97_5", "r_hat",
+                   "ess"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    experiment TEXT,
+    name TEXT,
+    model_class TEXT,
+    data_fingerprint TEXT,
+    result_key TEXT,
+    trace_path TEXT,
+    outputs TEXT,
+    created TEXT,
+    host TEXT,
+    chains INTEGER,
+    draws INTEGER,
+    timings TEXT,
+    max_r_hat REAL,
+    min_ess REAL,
+    divergences INTEGER
+);
+CREATE TABLE IF NOT EXISTS params (
+    run_id INTEGER REFERENCES runs(run_id),
+    name TEXT,
+    value TEXT,
+    num REAL
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    run_id INTEGER REFERENCES runs(run_id),
+    variable TEXT,
+    element TEXT,
+    label TEXT,
+    mean REAL,
+    sd REAL,
+    q2_5 REAL,
+    q25 REAL,
+    q50 REAL,
+    q75 REAL,
+    q97_5 REAL,
+    r_hat REAL,
+    ess REAL
+);
+CREATE INDEX IF NOT EXISTS params_name_value ON params (name, value, num);
+CREATE INDEX IF NOT EXISTS summaries_run ON summaries (run_id, variable);
+"""
+
+
+def _param_value(value):
+    """(JSON, number) stored for a parameter value, the number being NULL for non-numeric values"""
+    if isinstance(value, np.ndarray):
+        return json.dumps(value_key(value)), None
+    if isinstance(value, (bool, np.bool_, np.integer, np.floating)):
+        value = value.item() if isinstance(value, np.generic) else value
+    if isinstance(value, (bool, int, float)):
+        return json.dumps(value), float(value)
+    return json.dumps(value, default=str, sort_keys=True), None
+
+
+def params_key(params):
+    """Result key of a run identified by its parameters alone, for runners without a ResultStore key."""
+    return hashlib.sha1(json.dumps([[name, _param_value(value)[0]] for name, value in sorted(params.items())])
+                        .encode()).hexdigest()
+
+
+def variable_summary(model, name, labels=None, skip=()):
+    """
+    Rows of SUMMARY_COLUMNS (mean, sd, CATALOG_QUANTILES, R-hat and ESS) for each element of `name`.
+
+    :param skip: flat indices of elements to leave out
+    """
+    values = chain_values(model.trace, name)
+    flat = values.reshape(values.shape[0] * values.shape[1], -1)
+    quantiles = np.percentile(flat, CATALOG_QUANTILES, axis=0)
+    table = diagnostics(model, [name])
+    rows = []
+    for i, element in enumerate(table.element):
+        if i in skip:
+            continue
+        rows.append([name, element, None if labels is None else str(labels[i]), float(flat[:, i].mean()),
+                     float(flat[:, i].std()), *quantiles[:, i].tolist(), float(table.r_hat[i]),
+                     float(table.ess[i])])
+    return rows
+
+
+class ResultsCatalog(object):
+    def __init__(self, path=DEFAULT_CATALOG, timeout=60):
+        """
+        :param timeout: seconds to wait for other processes writing to the catalog
+        """
+        self.path = path
+        self.timeout = timeout
+        with self._transaction() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=self.timeout)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        connection = self._connect()
+        try:
+            # commits on success, rolls back on error
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def record(self, experiment, name, model, params=None, result_key=None, trace_path=None, outputs=None,
+               timings=None, variables=("CMReduction",), skip_elements=None):
+        """
+        Add a completed run of `model` (whose trace is model.trace).
+
+        :param experiment: the analysis or script the run belongs to, e.g. "cm_leavout_sensitivity"
+        :param name: name of the run within the experiment
+        :param params: dict of experiment parameters; arrays are stored by their hash
+        :param trace_path: where the trace is stored, if anywhere
+        :param outputs: files written from the run
+        :param timings: dict of stage -> seconds
+        :param variables: variables to summarise; CMReduction elements are labelled with the features
+        :param skip_elements: dict of variable name -> flat indices of elements left out of the summaries and
+        run-level diagnostics, e.g. the coefficients of a feature left out by masking, which are sampled from
+        their prior
+        :return: the run_id
+        """
+        trace = model.trace
+        skip_elements = {} if skip_elements is None else skip_elements
+        stored = hasattr(model, "free_RVs") or hasattr(model, "free_variables")
+        free = [v for v in free_varnames(model) if v in trace.varnames] if stored else []
+        table = diagnostics(model, free) if free else None
+        if table is not None:
+            table = drop_elements(table, skip_elements)
+        divergences = None
+        if "diverging" in getattr(trace, "stat_names", ()):
+            divergences = int(np.sum(trace.get_sampler_stats("diverging")))
+
+        summaries = []
+        for variable in variables:
+            if variable in trace.varnames:
+                labels = list(model.d.CMs) if variable == "CMReduction" and hasattr(model, "d") else None
+                summaries.extend(variable_summary(model, variable, labels, skip_elements.get(variable, ())))
+
+        run = dict(experiment=experiment, name=str(name),
+                   model_class=getattr(model, "model_class_name", type(model).__name__),
+                   data_fingerprint=model.d.fingerprint() if hasattr(model, "d") else None, result_key=result_key,
+                   trace_path=trace_path, outputs=json.dumps(outputs), created=datetime.datetime.now().isoformat(),
+                   host=socket.gethostname(), chains=trace.nchains, draws=len(trace),
+                   timings=json.dumps(timings), max_r_hat=None if table is None else float(table.r_hat.max()),
+                   min_ess=None if table is None else float(table.ess.min()), divergences=divergences)
+
+        with self._transaction() as connection:
+            if result_key is not None:
+                previous = connection.execute("SELECT run_id FROM runs WHERE experiment IS ? AND name = ? "
+                                              "AND result_key = ?", (experiment, str(name), result_key)).fetchall()
+                for (old_id,) in previous:
+                    for table_name in ["summaries", "params", "runs"]:
+                        connection.execute(f"DELETE FROM {table_name} WHERE run_id = ?", (old_id,))
+            cursor = connection.execute(f"INSERT INTO runs ({', '.join(run)}) "
+                                        f"VALUES ({', '.join('?' * len(run))})", list(run.values()))
+            run_id = cursor.lastrowid
+            connection.executemany("INSERT INTO params VALUES (?, ?, ?, ?)",
+                                   [(run_id, key, *_param_value(value)) for key, value in (params or {}).items()])
+            connection.executemany(f"INSERT INTO summaries VALUES (?, {', '.join('?' * len(SUMMARY_COLUMNS))})",
+                                   [(run_id, *row) for row in summaries])
+        log.info(f"Catalogued {experiment} {name} as run {run_id}")
+        return run_id
+
+    def contains(self, experiment, name, result_key):
+        """Whether a run of `experiment` named `name` with result key `result_key` is recorded."""
+        return len(self.query("SELECT 1 FROM runs WHERE experiment IS ? AND name = ? AND result_key = ?",
+                              (experiment, str(name), result_key))) > 0
+
+    def query(self, sql, args=()):
+        """DataFrame of the rows of an SQL query on the catalog."""
+        connection = self._connect()
+        try:
+            return pd.read_sql_query(sql, connection, params=args)
+        finally:
+            connection.close()
+
+    def _filter(self, experiment, params):
+        clauses, args = [], []
+        if experiment is not None:
+            clauses.append("runs.experiment = ?")
+            args.append(experiment)
+        for key, value in params.items():
+            text, number = _param_value(value)
+            match = "num = ?" if number is not None else "value = ?"
+            clauses.append(f"EXISTS (SELECT 1 FROM params WHERE params.run_id = runs.run_id "
+                           f"AND params.name = ? AND params.{match})")
+            args.extend([key, number if number is not None else text])
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def runs(self, experiment=None, params=None, **kwargs):
+        """
+        Runs matching all the given parameters, e.g. runs(DailyGrowthNoise=0.1), with one column per parameter.
+
+        :param params: dict of parameters, for names that are not valid keywords
+        """
+        where, args = self._filter(experiment, {**(params or {}), **kwargs})
+        runs = self.query(f"SELECT * FROM runs{where} ORDER BY run_id", args)
+        values = self.query(f"SELECT run_id, name, value FROM params "
+                            f"WHERE run_id IN (SELECT run_id FROM runs{where})", args)
+        if len(values) == 0:
+            return runs
+        values["value"] = [json.loads(v) for v in values.value]
+        wide = values.pivot(index="run_id", columns="name", values="value").add_prefix("param_")
+        return runs.merge(wide, left_on="run_id", right_index=True, how="left")
+
+    def summaries(self, variable="CMReduction", experiment=None, params=None, **kwargs):
+        """Summaries of `variable` in the runs matching the given parameters, one row per run and element."""
+        where, args = self._filter(experiment, {**(params or {}), **kwargs})
+        columns = ", ".join(f"summaries.{c}" for c in SUMMARY_COLUMNS)
+        return self.query(f"SELECT runs.run_id, runs.experiment, runs.name, runs.model_class, {columns} "
+                          f"FROM runs JOIN summaries ON summaries.run_id = runs.run_id{where} "
+                          f"{'AND' if where else 'WHERE'} summaries.variable = ? "
+                          f"ORDER BY runs.run_id, summaries.rowid", args + [variable])
@@ -0,0 +1,144 @@
+"""
+K-fold cross-validation over regions.
+
+The final days of every region in a fold are held out, and each model is scored by the log pointwise
+predictive density of the held-out new cases and deaths. The data is preprocessed once; every
+(model, fold) combination runs as a job of the core-budget scheduler and writes only its scores and
+CMReduction draws, which the driver collects into one table.
+"""
+import json
+import logging
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from scipy.special import logsumexp
+
+from epimodel.pymc3_models.cm_effect.catalog import DEFAULT_CATALOG, ResultsCatalog, params_key
+from epimodel.pymc3_models.cm_effect.datapreprocessor import DataPreprocessor
+from epimodel.pymc3_models.cm_effect.factory import MODEL_REGISTRY, mask_region
+from epimodel.pymc3_models.cm_effect.forward import nb_logpmf
+from epimodel.pymc3_models.cm_effect.instrumentation import run_record
+from epimodel.pymc3_models.cm_effect.scheduler import SamplingJob, run_jobs
+
+log = logging.getLogger(__name__)
+
+CV_FOLDS = [['DE', 'HU', 'FI', 'IE', 'RS', 'BE'],
+            ['DK', 'GR', 'NO', 'FR', 'RO', 'MA'],
+            ['ES', 'CZ', 'NL', 'CH', 'PT', 'AT'],
+            ['IL', 'SE', 'IT', 'MX', 'GB', 'PL']]
+
+CV_MODEL_TYPES = ["combined", "combined_v3", "combined_no_noise", "combined_icl", "combined_dif",
+                  "combined_additive"]
+
+
+def holdout_fold(data, fold_regions, days=14):
+    """Mask the final days of each region of the fold, returning region -> (first held-out case day, death day)."""
+    return {region: mask_region(data, region, days) for region in fold_regions}
+
+
+def heldout_scores(trace, data, heldout):
+    """
+    Log pointwise predictive density of the held-out new cases and deaths, one row per region and observation,
+    under the negative binomial likelihood the models are fitted with.
+    """
+    phi = np.asarray(trace["Phi"] if "Phi" in trace.varnames else trace["Phi_1"])
+    nDs = len(data.Ds)
+
+    rows = []
+    for region, (c_s, d_s) in heldout.items():
+        r = data.Rs.index(region)
+        for observation, name, observed, start in [("cases", "ExpectedCases", data.NewCases, c_s),
+                                                   ("deaths", "ExpectedDeaths", data.NewDeaths, d_s)]:
+            if name not in trace.varnames or start >= nDs:
+                continue
+            days = np.arange(start, nDs)
+            y = observed.data[r, days]
+            days = days[~np.isnan(y)]
+            y = y[~np.isnan(y)]
+
+            mu = np.asarray(trace[name])[:, r, days]
+            log_lik = nb_logpmf(y, mu, phi[:, None])
+            lppd = logsumexp(log_lik, axis=0) - np.log(log_lik.shape[0])
+            rows.append(dict(region=region, observation=observation, n_days=len(days), lppd=np.sum(lppd),
+                             mean_lppd=np.mean(lppd) if len(days) > 0 else np.nan))
+    return rows
+
+
+def score_path(out_dir, model_type, fold):
+    return os.path.join(out_dir, f"scores_{model_type}_fold_{fold}.json")
+
+
+def run_fold(data_file, model_type, fold, out_dir, n_samples=2000, chains=4, target_accept=0.95, max_treedepth=10,
+             catalog=None):
+    """
+    Sample `model_type` with the regions of `fold` held out, writing scores and CMReduction draws. The sampler
+    settings default to those of the original cross-validation runs, i.e. pm.sample's max_treedepth of 10 rather
+    than the 12 of BaseCMModel.run.
+
+    :param catalog: path of a ResultsCatalog to record the run in, if given
+    """
+    with open(data_file, "rb") as f:
+        data = pickle.load(f)
+    heldout = holdout_fold(data, CV_FOLDS[fold])
+
+    with run_record(f"{model_type}_fold_{fold}") as record:
+        with MODEL_REGISTRY[model_type][0](data, None) as model:
+            model.build_model()
+        model.run(n_samples, chains=chains, cores=int(os.environ.get("EPIMODEL_CORES", chains)),
+                  target_accept=target_accept, max_treedepth=max_treedepth)
+
+    rows = heldout_scores(model.trace, data, heldout)
+    for row in rows:
+        row.update(model=model_type, fold=fold)
+    trace_path = os.path.join(out_dir, f"cm_reduction_{model_type}_fold_{fold}.npz")
+    np.savez_compressed(trace_path, CMReduction=model.trace["CMReduction"])
+    with open(score_path(out_dir, model_type, fold), "w") as f:
+        json.dump(rows, f)
+
+    if catalog is not None:
+        params = dict(model_type=model_type, fold=fold, heldout=CV_FOLDS[fold], N=n_samples, chains=chains,
+                      target_accept=target_accept, max_treedepth=max_treedepth)
+        ResultsCatalog(catalog).record("crossval", f"{model_type}_fold_{fold}", model, params=params,
+                                       result_key=params_key(params), trace_path=trace_path,
+                                       outputs=[score_path(out_dir, model_type, fold)], timings=record.walls())
+
+
+def run_crossval(data_path="notebooks/final_data/data_final.csv", model_types=CV_MODEL_TYPES, folds=None,
+                 out_dir="cv", n_samples=2000, chains=4, threads_per_chain=1, n_cores=None, catalog=DEFAULT_CATALOG):
+    """
+    Run every (model, fold) combination within a budget of `n_cores` cores.
+
+    :param catalog: path of the ResultsCatalog the runs are recorded in, None to disable
+
+    :return: DataFrame of held-out scores, one row per model, fold, region and observation
+    """
+    folds = range(len(CV_FOLDS)) if folds is None else folds
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    dp = DataPreprocessor(min_confirmed=100, drop_HS=True)
+    data_file = os.path.join(out_dir, "data.pkl")
+    with open(data_file, "wb") as f:
+        pickle.dump(dp.preprocess_data(data_path), f)
+
+    jobs = [SamplingJob(f"{model_type}_fold_{fold}", run_fold, args=(data_file, model_type, fold, out_dir),
+                        kwargs=dict(n_samples=n_samples, chains=chains, catalog=catalog), chains=chains,
+                        threads_per_chain=threads_per_chain)
+            for model_type in model_types for fold in folds]
+    exitcodes = run_jobs(jobs, n_cores=n_cores)
+
+    rows = []
+    for model_type in model_types:
+        for fold in folds:
+            if exitcodes.get(f"{model_type}_fold_{fold}") != 0:
+                log.warning(f"{model_type} fold {fold} failed")
+                continue
+            with open(score_path(out_dir, model_type, fold)) as f:
+                rows.extend(json.load(f))
+
+    scores = pd.DataFrame(rows, columns=["model", "fold", "region", "observation", "n_days", "lppd",
+                                         "mean_lppd"])
+    scores.to_csv(os.path.join(out_dir, "scores.csv"), index=False)
+    return scores
@@ -1,4 +1,5 @@
 import copy
+import hashlib
 
 import pandas as pd
 import numpy as np
@@ -14,6 +15,9 @@ from matplotlib.ticker import PercentFormatter
 import os
 import logging
 
+from epimodel.pymc3_models.cm_effect.instrumentation import instrumented, stage
+from epimodel.pymc3_models.cm_effect.npi_statistics import NPIStatistics
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -691,10 +695,12 @@ class DataPreprocessor():
             "confirmed_mask": self.min_num_active_mask,
         }
 
+    @instrumented("preprocess_data")
     def preprocess_data(self, data_path, last_day=None, schools_unis="default"):
         # load data
-        df = pd.read_csv(data_path, parse_dates=["Date"], infer_datetime_format=True).set_index(
-            ["Country Code", "Date"])
+        with stage("read_csv"):
+            df = pd.read_csv(data_path, parse_dates=["Date"], infer_datetime_format=True).set_index(
+                ["Country Code", "Date"])
 
         if last_day is None:
             Ds = list(df.index.levels[1])
@@ -927,6 +933,28 @@ class PreprocessedData(object):
         #     if c == "Stay Home Order":
         #         self.CMs[i] = "Stay Home Order (with exemptions)"
 
+    def fingerprint(self):
+        """Hash of all data arrays, their masks and labels, used to key cached computations."""
+        h = hashlib.sha1()
+        for x in [self.Active, self.Confirmed, self.Deaths, self.NewDeaths, self.NewCases]:
+            h.update(np.ascontiguousarray(np.ma.getdata(x)).tobytes())
+            h.update(np.ascontiguousarray(np.ma.getmaskarray(x)).tobytes())
+        h.update(np.ascontiguousarray(self.ActiveCMs).tobytes())
+        h.update(repr((list(self.CMs), list(self.Rs), [str(d) for d in self.Ds])).encode())
+        return h.hexdigest()
+
+    def mask_overlay(self):
+        """
+        Copy sharing the data arrays of this object but with its own masks, so that masking days (mask_region,
+        mask_reopenings, model construction) leaves this object unchanged. ActiveCMs is shared as well, and
+        must be replaced rather than modified in place.
+        """
+        overlay = copy.copy(self)
+        for name in ["Active", "Confirmed", "Deaths", "NewDeaths", "NewCases"]:
+            x = getattr(self, name)
+            setattr(overlay, name, np.ma.MaskedArray(np.ma.getdata(x), mask=np.ma.getmaskarray(x).copy()))
+        return overlay
+
     def reduce_regions_from_index(self, reduced_regions_indx):
         self.Active = self.Active[reduced_regions_indx, :]
         self.Confirmed = self.Confirmed[reduced_regions_indx, :]
@@ -979,6 +1007,26 @@ class PreprocessedData(object):
                             self.ActiveCMs[r, f_i, :] = 0
                             print(f"Region {self.Rs[r]} has feature {f} removed, since it is too early")
 
+    def npi_statistics(self, observed_deaths=True):
+        """
+        NPIStatistics of ActiveCMs, cached until ActiveCMs or the NewDeaths mask change.
+
+        :param observed_deaths: count only the days with observed deaths, otherwise all days
+        """
+        observed = np.ma.getmaskarray(self.NewDeaths) == False
+        h = hashlib.sha1()
+        h.update(np.ascontiguousarray(self.ActiveCMs).tobytes())
+        h.update(repr(self.ActiveCMs.shape).encode())
+        if observed_deaths:
+            h.update(np.packbits(observed).tobytes())
+        key = (observed_deaths, h.hexdigest())
+
+        cache = getattr(self, "npi_statistics_cache", None)
+        if cache is None or cache[0] != key:
+            cache = (key, NPIStatistics(self.ActiveCMs, observed if observed_deaths else None))
+            self.npi_statistics_cache = cache
+        return cache[1]
+
     def coactivation_plot(self, cm_plot_style, newfig=True, skip_yticks=False):
         if newfig:
             plt.figure(figsize=(2, 3), dpi=300)
@@ -986,11 +1034,7 @@ class PreprocessedData(object):
         nRs, nCMs, nDs = self.ActiveCMs.shape
         plt.title("Frequency $i$ Active Given $j$ Active", fontsize=8)
         ax = plt.gca()
-        mat = np.zeros((nCMs, nCMs))
-        for cm in range(nCMs):
-            mask = self.ActiveCMs[:, cm, :] * (self.NewDeaths.mask == False)
-            for cm2 in range(nCMs):
-                mat[cm, cm2] = np.sum(mask * self.ActiveCMs[:, cm2, :]) / np.sum(mask)
+        mat = self.npi_statistics().coactivation
         im = plt.imshow(mat * 100, vmin=25, vmax=100, cmap="viridis", aspect="auto")
         ax.tick_params(axis="both", which="major", labelsize=8)
 
@@ -1035,8 +1079,7 @@ class PreprocessedData(object):
         nRs, nCMs, nDs = self.ActiveCMs.shape
 
         ax = plt.gca()
-        mask = np.reshape((self.NewDeaths.mask == False), (nRs, 1, nDs))
-        days_active = np.sum(np.sum(self.ActiveCMs * np.repeat(mask, nCMs, axis=1), axis=0), axis=1)
+        days_active = self.npi_statistics().days_active
         plt.barh(-np.arange(nCMs), days_active)
 
         plt.yticks(
@@ -1085,11 +1128,7 @@ class PreprocessedData(object):
         nRs, nCMs, nDs = self.ActiveCMs.shape
         plt.title("Frequency$[\phi_{i} = 1 | \phi_j = 1]$", fontsize=8)
         ax = plt.gca()
-        mat = np.zeros((nCMs, nCMs))
-        for cm in range(nCMs):
-            mask = self.ActiveCMs[:, cm, :]
-            for cm2 in range(nCMs):
-                mat[cm, cm2] = np.sum(mask * self.ActiveCMs[:, cm2, :]) / np.sum(mask)
+        mat = self.npi_statistics(observed_deaths=False).coactivation
         im = plt.imshow(mat * 100, vmin=0, vmax=100, cmap="viridis", aspect="auto")
         ax.tick_params(axis="both", which="major", labelsize=8)
 
@@ -1123,7 +1162,7 @@ class PreprocessedData(object):
         nRs, nCMs, nDs = self.ActiveCMs.shape
 
         ax = plt.gca()
-        days_active = np.sum(np.sum(self.ActiveCMs, axis=0), axis=1)
+        days_active = self.npi_statistics(observed_deaths=False).days_active
         plt.barh(-np.arange(nCMs), days_active)
 
         plt.yticks(
@@ -0,0 +1,158 @@
+"""
+Convergence diagnostics of the free variables of a sampled model.
+
+R-hat and effective sample size are computed for all elements of the selected variables at once, as arrays
+of shape [chains, draws, elements], following arviz's rank-normalised split R-hat and bulk ESS (Vehtari et
+al. 2019, https://arxiv.org/abs/1903.08008). The tail R-hat folds the draws around the median of all draws, as
+in the paper; arviz folds around the median of the split chains, which differs when the number of draws is
+odd. Results are cached on the model for its current trace.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+import pymc3 as pm
+from scipy import stats
+from scipy.fft import next_fast_len
+
+log = logging.getLogger(__name__)
+
+
+def free_varnames(model):
+    """Untransformed names of the free variables of `model`, in model order, or as recorded by a StoredModel."""
+    if hasattr(model, "free_variables"):
+        return list(model.free_variables)
+    return [pm.util.get_untransformed_name(v.name) if pm.util.is_transformed_name(v.name) else v.name
+            for v in model.free_RVs]
+
+
+def chain_values(trace, name):
+    """Draws of `name` as an array of shape [chains, draws, ...]."""
+    return np.stack(trace.get_values(name, combine=False))
+
+
+def _split_chains(x):
+    half = x.shape[1] // 2
+    return np.concatenate([x[:, :half], x[:, -half:]], axis=0)
+
+
+def _z_scale(x):
+    # rank normalise each element over all its chains and draws
+    n_chains, n_draws, n = x.shape
+    rank = stats.rankdata(x.reshape(-1, n), method="average", axis=0)
+    return stats.norm.ppf((rank - 0.5) / (n_chains * n_draws)).reshape(x.shape)
+
+
+def _rhat(x):
+    n_draws = x.shape[1]
+    between = n_draws * np.var(np.mean(x, axis=1), axis=0, ddof=1)
+    within = np.mean(np.var(x, axis=1, ddof=1), axis=0)
+    return np.sqrt((between / within + n_draws - 1) / n_draws)
+
+
+def rhat(x):
+    """Rank-normalised split R-hat of each element of x [chains, draws, elements]."""
+    if x.shape[0] < 2 or x.shape[1] < 4:
+        return np.full(x.shape[2], np.nan)
+    # the tail R-hat folds the draws around the median of all draws, including the middle draw of each chain
+    # that splitting drops when the number of draws is odd
+    folded = np.abs(x - np.median(x.reshape(-1, x.shape[2]), axis=0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.maximum(_rhat(_z_scale(_split_chains(x))), _rhat(_z_scale(_split_chains(folded))))
+
+
+def _autocov(x):
+    n = x.shape[1]
+    x = x - x.mean(axis=1, keepdims=True)
+    f = np.fft.rfft(x, n=next_fast_len(2 * n), axis=1)
+    return np.fft.irfft(f * np.conjugate(f), n=next_fast_len(2 * n), axis=1)[:, :n] / n
+
+
+def _ess(x, relative=False):
+    n_chains, n_draws, n = x.shape
+    acov = _autocov(x)
+    mean_var = np.mean(acov[:, 0], axis=0) * n_draws / (n_draws - 1.)
+    var_plus = mean_var * (n_draws - 1.) / n_draws
+    if n_chains > 1:
+        var_plus = var_plus + np.var(np.mean(x, axis=1), axis=0, ddof=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rho = 1. - (mean_var - np.mean(acov, axis=0)) / var_plus
+    rho[0] = 1.
+
+    # Geyer's initial positive sequence: sums of (even, odd) lag pairs, up to the first non-positive pair
+    n_pairs = max((n_draws - 1) // 2, 1)
+    pairs = rho[:2 * n_pairs].reshape(n_pairs, 2, n)
+    pair_sums = pairs.sum(axis=1)
+    non_positive = pair_sums <= 0
+    end = np.where(non_positive.any(axis=0), np.argmax(non_positive, axis=0), n_pairs - 1)
+
+    # Geyer's initial monotone sequence, on the pairs before the end
+    monotone = np.minimum.accumulate(pair_sums, axis=0)
+    summed = np.concatenate([np.zeros((1, n)), np.cumsum(monotone, axis=0)])[end, np.arange(n)]
+    end_even = pairs[end, 0, np.arange(n)]
+    end_sum = pair_sums[end, np.arange(n)]
+    tail = np.where((end_sum >= 0) | (end_even > 0), end_even, 0.)
+
+    tau = np.maximum(-1. + 2. * summed + tail, 1 / np.log10(n_chains * n_draws))
+    ess = (1. if relative else n_chains * n_draws) / tau
+    ess[np.isnan(rho).any(axis=0)] = np.nan
+    # constant elements
+    ess[np.ptp(x.reshape(-1, n), axis=0) < np.finfo(float).resolution] = x.shape[0] * x.shape[1]
+    return ess
+
+
+def ess(x, relative=False):
+    """Bulk effective sample size of each element of x [chains, draws, elements]."""
+    if x.shape[1] < 4:
+        return np.full(x.shape[2], np.nan)
+    return _ess(_z_scale(_split_chains(x)), relative=relative)
+
+
+def _labels(shape):
+    return [",".join(str(i) for i in index) for index in np.ndindex(*shape)] if shape else [""]
+
+
+def _compute(trace, varnames):
+    values = [chain_values(trace, name) for name in varnames]
+    shapes = [v.shape[2:] for v in values]
+    x = np.concatenate([v.reshape(v.shape[0], v.shape[1], -1) for v in values], axis=2).astype(float)
+
+    relative = ess(x, relative=True)
+    return pd.DataFrame(dict(
+        variable=[name for name, shape in zip(varnames, shapes) for _ in range(int(np.prod(shape)))],
+        element=[label for shape in shapes for label in _labels(shape)],
+        r_hat=rhat(x), ess=relative * x.shape[0] * x.shape[1], ess_relative=relative,
+    ))
+
+
+def diagnostics(model, varnames=None):
+    """
+    R-hat and bulk ESS of each element of `varnames` (default the free variables) in model.trace.
+
+    :return: DataFrame with columns variable, element (index within the variable), r_hat, ess and
+    ess_relative (ESS per draw), in the order of varnames
+    """
+    varnames = free_varnames(model) if varnames is None else list(varnames)
+
+    cache = getattr(model, "diagnostics_cache", None)
+    if cache is None or cache[0] is not model.trace:
+        cache = (model.trace, {})
+        model.diagnostics_cache = cache
+    missing = [name for name in varnames if name not in cache[1]]
+    if missing:
+        table = _compute(model.trace, missing)
+        for name, rows in table.groupby("variable", sort=False):
+            cache[1][name] = rows
+
+    return pd.concat([cache[1][name] for name in varnames], ignore_index=True)
+
+
+def drop_elements(table, skip_elements):
+    """
+    `table` (see diagnostics) without the elements in `skip_elements`, a dict of variable name -> flat indices
+    of its elements.
+    """
+    flat_index = table.groupby("variable", sort=False).cumcount()
+    skipped = [i in skip_elements.get(variable, ()) for variable, i in zip(table.variable, flat_index)]
+    return table[~np.array(skipped, dtype=bool)]
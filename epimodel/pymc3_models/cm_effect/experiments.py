@@ -0,0 +1,191 @@
+"""
+Declarative experiment specifications and a runner that shares work between them.
+
+An experiment is preprocessing (data file, preprocessor settings), a list of named data transforms, a model
+class with build_model arguments and sampler settings. The runner groups experiments into a graph of
+preprocessing -> transformed data -> built model nodes, computes each node once and frees it when no
+remaining experiment needs it.
+"""
+import copy
+import logging
+
+import numpy as np
+
+from epimodel.pymc3_models.cm_effect.datapreprocessor import DataPreprocessor
+from epimodel.pymc3_models.cm_effect.instrumentation import run_record
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DATA_PATH = "notebooks/double-entry-data/double_entry_final.csv"
+
+
+def drop_features(data, features):
+    indxs = [data.CMs.index(f) for f in features if f in data.CMs]
+    data.ActiveCMs = np.delete(data.ActiveCMs, indxs, axis=1)
+    data.CMs = [cm for i, cm in enumerate(data.CMs) if i not in indxs]
+
+
+def mask_reopenings(data, **kwargs):
+    data.mask_reopenings(**kwargs)
+
+
+def mask_region_ends(data, **kwargs):
+    data.mask_region_ends(**kwargs)
+
+
+def add_any_active(data, features, name="Any NPI Active"):
+    """Add a feature which is active whenever any of `features` is active."""
+    indxs = np.array([data.CMs.index(f) for f in features])
+    any_active = np.sum(data.ActiveCMs[:, indxs, :], axis=1, keepdims=True) > 0
+    data.ActiveCMs = np.concatenate([data.ActiveCMs, any_active], axis=1)
+    data.CMs = [*data.CMs, name]
+
+
+def count_active(data, features):
+    """Replace the first len(features) features by "Major i", active whenever more than i-1 of `features` are."""
+    indxs = np.array([data.CMs.index(f) for f in features])
+    n_active = np.sum(data.ActiveCMs[:, indxs, :], axis=1)
+    ActiveCMs = copy.deepcopy(data.ActiveCMs)
+    for i in range(len(features)):
+        ActiveCMs[:, i, :] = n_active > i
+    data.ActiveCMs = ActiveCMs
+    data.CMs = [f"Major {i + 1}" for i in range(len(features))]
+
+
+def delay_features(data, features, n_delay):
+    indxs = [data.CMs.index(f) for f in features]
+    active_cms = copy.deepcopy(data.ActiveCMs)
+    data.ActiveCMs[:, indxs, n_delay:] = active_cms[:, indxs, :-n_delay]
+    data.ActiveCMs[:, indxs, :n_delay] = 0
+
+
+def ignore_features(data, features):
+    for f in features:
+        data.ignore_feature(data.CMs.index(f))
+
+
+TRANSFORMS = {
+    "drop_features": drop_features,
+    "mask_reopenings": mask_reopenings,
+    "mask_region_ends": mask_region_ends,
+    "add_any_active": add_any_active,
+    "count_active": count_active,
+    "delay_features": delay_features,
+    "ignore_features": ignore_features,
+}
+
+
+class ExperimentSpec(object):
+    def __init__(self, name, model_class, data_path=DEFAULT_DATA_PATH, last_day="2020-05-30",
+                 schools_unis="whoops", drop=None, preprocessor_kwargs=None, transforms=(), build_kwargs=None,
+                 sample_kwargs=None):
+        """
+        :param model_class: BaseCMModel subclass
+        :param drop: features to drop, defaults to DataPreprocessor().drop_features. Dropping is done after
+        preprocessing, so that experiments differing only in the dropped features share the preprocessing.
+        :param transforms: list of (name, kwargs) pairs, with names from TRANSFORMS, applied in order
+        :param build_kwargs: passed to model.build_model
+        :param sample_kwargs: passed to model.run
+        """
+        self.name = name
+        self.model_class = model_class
+        self.data_path = data_path
+        self.last_day = last_day
+        self.schools_unis = schools_unis
+        self.drop = DataPreprocessor().drop_features if drop is None else drop
+        self.preprocessor_kwargs = preprocessor_kwargs if preprocessor_kwargs is not None else {}
+        self.transforms = [("drop_features", {"features": list(self.drop)}), *transforms]
+        self.build_kwargs = build_kwargs if build_kwargs is not None else {}
+        self.sample_kwargs = sample_kwargs if sample_kwargs is not None else dict(N=2000, tune=500, chains=4,
+                                                                                  cores=4)
+
+    def params(self):
+        """Flat dict of the settings, as recorded in the results catalog."""
+        return dict(model_class=self.model_class.__name__, data_path=self.data_path, last_day=self.last_day,
+                    schools_unis=self.schools_unis, **self.preprocessor_kwargs,
+                    transforms=[[name, kwargs] for name, kwargs in self.transforms], **self.build_kwargs,
+                    **self.sample_kwargs)
+
+    def preprocessing_key(self):
+        return repr((self.data_path, self.last_day, self.schools_unis, sorted(self.preprocessor_kwargs.items())))
+
+    def data_key(self):
+        return repr((self.preprocessing_key(), [(name, sorted(kwargs.items())) for name, kwargs in self.transforms]))
+
+    def model_key(self):
+        return repr((self.data_key(), self.model_class.__name__, sorted(self.build_kwargs.items())))
+
+    def __repr__(self):
+        return f"ExperimentSpec({self.name}, {self.model_class.__name__})"
+
+
+class ExperimentRunner(object):
+    def __init__(self, specs):
+        self.specs = {spec.name: spec for spec in specs}
+        self._cache = {}
+
+    def graph(self, names=None):
+        """Nested dict of preprocessing key -> data key -> model key -> experiment names."""
+        names = list(self.specs) if names is None else names
+        graph = {}
+        for name in names:
+            spec = self.specs[name]
+            models = graph.setdefault(spec.preprocessing_key(), {}).setdefault(spec.data_key(), {})
+            models.setdefault(spec.model_key(), []).append(name)
+        return graph
+
+    def _get(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        else:
+            log.info(f"Reusing {key}")
+        return self._cache[key]
+
+    def preprocessed_data(self, spec):
+        def compute():
+            dp = DataPreprocessor(**spec.preprocessor_kwargs)
+            dp.drop_features = []
+            return dp.preprocess_data(spec.data_path, last_day=spec.last_day, schools_unis=spec.schools_unis)
+
+        return self._get(spec.preprocessing_key(), compute)
+
+    def data(self, spec):
+        def compute():
+            data = copy.deepcopy(self.preprocessed_data(spec))
+            for name, kwargs in spec.transforms:
+                TRANSFORMS[name](data, **kwargs)
+            return data
+
+        return self._get(spec.data_key(), compute)
+
+    def model(self, spec):
+        def compute():
+            # models mask data in place, so each one gets its own copy
+            with spec.model_class(copy.deepcopy(self.data(spec)), None) as model:
+                model.build_model(**spec.build_kwargs)
+            return model
+
+        return self._get(spec.model_key(), compute)
+
+    def run(self, names=None, save=None):
+        """
+        Sample the experiments `names` (default all), traversing the graph so that shared nodes are computed
+        once, and calling save(name, model, timings) after each experiment, with timings the wall seconds of
+        each stage of the experiment. Building a model shared with earlier experiments is timed only in the
+        first of them.
+        """
+        graph = self.graph(names)
+        for preprocessing_key, data_nodes in graph.items():
+            for data_key, model_nodes in data_nodes.items():
+                for model_key, experiment_names in model_nodes.items():
+                    for name in experiment_names:
+                        spec = self.specs[name]
+                        log.info(f"Running experiment {name}")
+                        with run_record(f"experiment_{name}", spec=repr(spec)) as record:
+                            model = self.model(spec)
+                            model.run(**spec.sample_kwargs)
+                        if save is not None:
+                            save(name, model, record.walls())
+                    self._cache.pop(model_key, None)
+                self._cache.pop(data_key, None)
+            self._cache.pop(preprocessing_key, None)
@@ -0,0 +1,295 @@
+"""
+Registry of the model variants used in the sensitivity analyses, and a factory that builds them lazily.
+
+A model is described by a ModelSpec (model name, data configuration, attributes set before building and
+build_model arguments). Specs have keys, so a set of runs can be deduplicated before anything is built, and
+the factory caches preprocessed data and built models per configuration.
+
+Features can be left out in two ways. "delete" removes the feature from the data, so every leave-out has its
+own graph. "mask" zeroes the feature's ActiveCMs column, keeping the [R, C, D] shape: the left-out coefficient
+no longer affects the likelihood, and all leave-outs of a model share the model built on the full data, which
+only has its ActiveCMs data swapped. Masking requires independent priors on the features, see
+MASK_LEAVOUT_TYPES.
+"""
+import copy
+import hashlib
+import inspect
+import logging
+import numbers
+
+import numpy as np
+import pymc3 as pm
+
+from epimodel.pymc3_models.cm_effect import models
+from epimodel.pymc3_models.cm_effect.datapreprocessor import DataPreprocessor
+from epimodel.pymc3_models.cm_effect.instrumentation import stage
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DATA_PATH = "notebooks/double-entry-data/double_entry_final.csv"
+
+# model name -> (model class, noise attributes the model takes)
+MODEL_REGISTRY = {
+    "combined": (models.CMCombined_Final, ["DailyGrowthNoise"]),
+    "active": (models.CMActive_Final, ["DailyGrowthNoise"]),
+    "death": (models.CMDeath_Final, ["DailyGrowthNoise"]),
+    "combined_v3": (models.CMCombined_Final_V3, ["DailyGrowthNoise"]),
+    "combined_icl": (models.CMCombined_Final_ICL, ["DailyGrowthNoise"]),
+    "combined_dif": (models.CMCombined_Final_DifEffects, ["DailyGrowthNoise", "RegionVariationNoise"]),
+    "combined_no_noise": (models.CMCombined_Final_NoNoise, []),
+    "combined_additive": (models.CMCombined_Additive, ["DailyGrowthNoise"]),
+}
+
+
+# values of the build_model argument cm_prior each model type implements, for the types that take it
+CM_PRIORS = {model_type: ["normal", "half_normal"] for model_type in MODEL_REGISTRY}
+CM_PRIORS["combined"] = ["normal", "half_normal", "icl"]
+
+
+def takes_attribute(model_type, attr):
+    return attr in MODEL_REGISTRY[model_type][1]
+
+
+def build_kwargs_error(model_type, build_kwargs):
+    """Why `build_kwargs` cannot be passed to build_model of `model_type`, or None if they can."""
+    parameters = inspect.signature(MODEL_REGISTRY[model_type][0].build_model).parameters
+    unknown = [name for name in build_kwargs if name not in parameters]
+    if unknown:
+        return f"{model_type} build_model takes no argument {', '.join(unknown)}"
+    if "cm_prior" in build_kwargs and build_kwargs["cm_prior"] not in CM_PRIORS[model_type]:
+        return f"{model_type} does not implement cm_prior={build_kwargs['cm_prior']!r}, only {CM_PRIORS[model_type]}"
+    for name in ["cm_prior_sigma", "cm_prior_conc"]:
+        value = build_kwargs.get(name, 1)
+        if not isinstance(value, numbers.Real) or isinstance(value, bool) or value <= 0:
+            return f"{name} must be a positive number, not {value!r}"
+    return None
+
+
+def value_key(value):
+    if isinstance(value, np.ndarray):
+        return hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest()
+    return repr(value)
+
+
+def mask_region(d, region, days=14):
+    i = d.Rs.index(region)
+    c_s = np.nonzero(np.cumsum(d.NewCases.data[i, :] > 0) == days + 1)[0][0]
+    d_s = np.nonzero(np.cumsum(d.NewDeaths.data[i, :] > 0) == days + 1)[0]
+    if len(d_s) > 0:
+        d_s = d_s[0]
+    else:
+        d_s = len(d.Ds)
+
+    # mask the right days
+    d.Active.mask[i, c_s:] = True
+    d.Confirmed.mask[i, c_s:] = True
+    d.Deaths.mask[i, d_s:] = True
+    d.NewDeaths.mask[i, d_s:] = True
+    d.NewCases.mask[i, c_s:] = True
+
+    return c_s, d_s
+
+
+LEAVOUT_MODES = ["delete", "mask"]
+
+# model types that can leave out a feature by masking it. In combined_additive the features' effects share a
+# Dirichlet prior, and a feature that is never active reduces growth everywhere, so it must be deleted.
+MASK_LEAVOUT_TYPES = [model_type for model_type in MODEL_REGISTRY if model_type != "combined_additive"]
+
+
+def leavout_cm(data, cm_leavouts, i, mode="delete"):
+    """
+    Copy of `data` without feature i, see LEAVOUT_MODES. In "mask" mode CMs keeps every feature, including the
+    left-out one.
+    """
+    if mode not in LEAVOUT_MODES:
+        raise ValueError(f"Unknown leave-out mode {mode}, expected one of {LEAVOUT_MODES}")
+
+    data_cm_leavout = data.mask_overlay()
+    print('CM left out: ' + cm_leavouts[i])
+    if cm_leavouts[i] == 'None':
+        pass
+    elif mode == "delete":
+        data_cm_leavout.ActiveCMs = np.delete(data.ActiveCMs, i, 1)
+        data_cm_leavout.CMs = [cm for j, cm in enumerate(data.CMs) if j != i]
+    else:
+        # ActiveCMs may be shared with other copies of the data, so replace rather than modify it
+        data_cm_leavout.ActiveCMs = data.ActiveCMs.copy()
+        data_cm_leavout.ActiveCMs[:, i, :] = 0
+    return data_cm_leavout
+
+
+class DataSpec(object):
+    def __init__(self, data_path=DEFAULT_DATA_PATH, last_day="2020-05-30", preprocessor_attrs=None,
+                 mask_reopenings=True, min_deaths=None, heldout_region=None, cm_leavout=None,
+                 cm_leavout_mode="delete"):
+        """
+        :param preprocessor_attrs: DataPreprocessor attributes, e.g. min_confirmed or N_smooth
+        :param min_deaths: if given, regions with fewer deaths are removed
+        :param heldout_region: region whose final days are masked, see mask_region
+        :param cm_leavout: index of a feature to leave out
+        :param cm_leavout_mode: "delete" or "mask", see leavout_cm
+        """
+        if cm_leavout_mode not in LEAVOUT_MODES:
+            raise ValueError(f"Unknown leave-out mode {cm_leavout_mode}, expected one of {LEAVOUT_MODES}")
+
+        self.data_path = data_path
+        self.last_day = last_day
+        self.preprocessor_attrs = dict(drop_HS=True)
+        if preprocessor_attrs is not None:
+            self.preprocessor_attrs.update(preprocessor_attrs)
+        self.mask_reopenings = mask_reopenings
+        self.min_deaths = min_deaths
+        self.heldout_region = heldout_region
+        self.cm_leavout = cm_leavout
+        self.cm_leavout_mode = cm_leavout_mode
+
+    def preprocessing_key(self):
+        return repr((self.data_path, self.last_day, sorted(self.preprocessor_attrs.items())))
+
+    def key(self):
+        return repr((self.preprocessing_key(), self.mask_reopenings, self.min_deaths, self.heldout_region,
+                     self.cm_leavout, self.cm_leavout_mode))
+
+    def params(self):
+        """Flat dict of the settings, as recorded in the results catalog."""
+        return dict(data_path=self.data_path, last_day=self.last_day, **self.preprocessor_attrs,
+                    mask_reopenings=self.mask_reopenings, min_deaths=self.min_deaths,
+                    heldout_region=self.heldout_region, cm_leavout=self.cm_leavout,
+                    cm_leavout_mode=self.cm_leavout_mode)
+
+    def masks_cm(self):
+        return self.cm_leavout is not None and self.cm_leavout_mode == "mask"
+
+    def graph_spec(self):
+        """Spec of the data the model graph is built from: without a masked leave-out, which only swaps data."""
+        if not self.masks_cm():
+            return self
+        spec = copy.copy(self)
+        spec.cm_leavout = None
+        spec.cm_leavout_mode = "delete"
+        return spec
+
+
+class ModelSpec(object):
+    def __init__(self, model_type, data_spec, daily_growth_noise=None, region_var_noise=None, attrs=None,
+                 build_kwargs=None):
+        """
+        :param model_type: name in MODEL_REGISTRY
+        :param daily_growth_noise, region_var_noise: set on the model if it takes them and they are not None
+        :param attrs: other model attributes set before build_model, e.g. delay distributions
+        :param build_kwargs: build_model arguments, checked against the model type, see build_kwargs_error
+        """
+        if model_type not in MODEL_REGISTRY:
+            raise ValueError(f"Unknown model type {model_type}, expected one of {list(MODEL_REGISTRY)}")
+        error = build_kwargs_error(model_type, build_kwargs if build_kwargs is not None else {})
+        if error is not None:
+            raise ValueError(error)
+        if data_spec.masks_cm() and model_type not in MASK_LEAVOUT_TYPES:
+            raise ValueError(f"{model_type} cannot leave out features in mask mode, expected one of "
+                             f"{MASK_LEAVOUT_TYPES}")
+
+        self.model_type = model_type
+        self.data_spec = data_spec
+        self.attrs = {}
+        if daily_growth_noise is not None and takes_attribute(model_type, "DailyGrowthNoise"):
+            self.attrs["DailyGrowthNoise"] = daily_growth_noise
+        if region_var_noise is not None and takes_attribute(model_type, "RegionVariationNoise"):
+            self.attrs["RegionVariationNoise"] = region_var_noise
+        if attrs is not None:
+            self.attrs.update(attrs)
+        self.build_kwargs = build_kwargs if build_kwargs is not None else {}
+
+    @property
+    def model_class(self):
+        return MODEL_REGISTRY[self.model_type][0]
+
+    def graph_spec(self):
+        """Spec of the model whose graph this spec uses, see DataSpec.graph_spec."""
+        data_spec = self.data_spec.graph_spec()
+        if data_spec is self.data_spec:
+            return self
+        spec = copy.copy(self)
+        spec.data_spec = data_spec
+        return spec
+
+    def params(self):
+        """Flat dict of the model type, data settings, attributes and build_model arguments."""
+        return dict(model_type=self.model_type, **self.data_spec.params(), **self.attrs, **self.build_kwargs)
+
+    def key(self):
+        return repr((self.model_type, self.data_spec.key(),
+                     sorted((name, value_key(value)) for name, value in self.attrs.items()),
+                     sorted(self.build_kwargs.items())))
+
+    def __repr__(self):
+        return f"ModelSpec({self.model_type}, attrs={list(self.attrs)}, build_kwargs={self.build_kwargs})"
+
+
+class ModelFactory(object):
+    def __init__(self):
+        self._preprocessed = {}
+        self._data = {}
+        self._models = {}
+
+    def data(self, data_spec):
+        key = data_spec.key()
+        if key not in self._data:
+            preprocessing_key = data_spec.preprocessing_key()
+            if preprocessing_key not in self._preprocessed:
+                dp = DataPreprocessor(**data_spec.preprocessor_attrs)
+                self._preprocessed[preprocessing_key] = dp.preprocess_data(data_spec.data_path,
+                                                                           data_spec.last_day)
+
+            data = self._preprocessed[preprocessing_key].mask_overlay()
+            if data_spec.mask_reopenings:
+                data.mask_reopenings()
+            if data_spec.min_deaths is not None:
+                data.filter_region_min_deaths(data_spec.min_deaths)
+            if data_spec.heldout_region is not None:
+                mask_region(data, data_spec.heldout_region)
+            if data_spec.cm_leavout is not None:
+                data = leavout_cm(data, data.CMs, data_spec.cm_leavout, data_spec.cm_leavout_mode)
+            self._data[key] = data
+        return self._data[key]
+
+    def set_data(self, data_spec, data):
+        """Use `data` for `data_spec`, e.g. data derived in another process."""
+        self._data[data_spec.key()] = data
+
+    def build(self, spec, data):
+        # models mask days of the data they are given, so each gets its own masks
+        with stage("model_init"):
+            model = spec.model_class(data.mask_overlay())
+        with model, stage("build_model"):
+            for name, value in spec.attrs.items():
+                setattr(model, name, value)
+            model.build_model(**spec.build_kwargs)
+        model.build_kwargs = dict(spec.build_kwargs)
+        return model
+
+    def model(self, spec):
+        """
+        Built model for `spec`, cached per spec and data configuration. Specs with a masked leave-out get the
+        model of their graph spec, with ActiveCMs set to their data, in the graph and in model.d.
+        """
+        graph_spec = spec.graph_spec()
+        graph_data = self.data(graph_spec.data_spec)
+        key = (graph_spec.key(), graph_data.fingerprint())
+        if key not in self._models:
+            self._models[key] = self.build(graph_spec, graph_data)
+        model = self._models[key]
+
+        data = self.data(spec.data_spec)
+        if not np.array_equal(model.ActiveCMs.get_value(borrow=True), data.ActiveCMs):
+            pm.set_data({"ActiveCMs": data.ActiveCMs}, model=model)
+        # model.d keeps the masks the model set on it
+        model.d.ActiveCMs = data.ActiveCMs
+        model.d.CMs = data.CMs
+        return model
+
+    def release(self, spec):
+        """Drop the built models of `spec`, and of the specs sharing its graph, from the cache."""
+        graph_key = spec.graph_spec().key()
+        for key in [key for key in self._models if key[0] == graph_key]:
+            del self._models[key]
@@ -0,0 +1,132 @@
+"""
+NumPy implementation of the CMCombined_Final forward model, vectorised over a batch of posterior draws.
+
+Used wherever the forward model has to be evaluated for thousands of draws (posterior predictive checks,
+held-out scoring, synthetic data) without going through theano. `draws` is anything indexable by variable
+name, e.g. a MultiTrace or a dict, holding arrays with the draws along the first axis.
+"""
+import numpy as np
+from scipy.special import gammaln
+
+from epimodel.pymc3_models.cm_effect.models import SI_ALPHA, SI_BETA
+
+
+def nb_logpmf(x, mu, alpha):
+    """Negative binomial log pmf, parameterised by mean `mu` and dispersion `alpha` as in pymc3."""
+    return (gammaln(x + alpha) - gammaln(x + 1) - gammaln(alpha)
+            + alpha * np.log(alpha / (mu + alpha)) + x * np.log(mu / (mu + alpha)))
+
+
+def delay_convolve(infected, delay_prob):
+    """Causal convolution of [..., nDs] trajectories with a delay distribution, truncated to nDs days."""
+    nDs = infected.shape[-1]
+    expected = np.zeros_like(infected)
+    for k, p in enumerate(np.ravel(delay_prob)[:nDs]):
+        if p != 0:
+            expected[..., k:] += p * infected[..., :nDs - k]
+    return expected
+
+
+class CombinedForwardModel(object):
+    def __init__(self, model, R_hyperprior_mean=3.25, serial_interval_mean=SI_ALPHA / SI_BETA,
+                 serial_interval_sigma=np.sqrt(SI_ALPHA / SI_BETA ** 2), conf_noise=None, deaths_noise=None,
+                 cm_prior_sigma=0.2):
+        """
+        :param model: CMCombined_Final instance, providing data, delay distributions and observed days
+        other parameters should match those passed to model.build_model (log_prior assumes cm_prior='normal')
+        """
+        self.ActiveCMs = np.asarray(model.d.ActiveCMs)[model.OR_indxs, :, :]
+        self.nORs = model.nORs
+        self.nDs = model.nDs
+
+        self.DelayProbCases = np.ravel(model.DelayProbCases)
+        self.DelayProbDeaths = np.ravel(model.DelayProbDeaths)
+
+        self.R_hyperprior_mean = R_hyperprior_mean
+        self.si_beta = serial_interval_mean / serial_interval_sigma ** 2
+        self.si_alpha = serial_interval_mean ** 2 / serial_interval_sigma ** 2
+        self.conf_noise = conf_noise
+        self.deaths_noise = deaths_noise
+        self.cm_prior_sigma = cm_prior_sigma
+
+        self.observed_cases_indx = model.all_observed_active
+        self.observed_deaths_indx = model.all_observed_deaths
+        self.NewCases = model.d.NewCases.data.reshape((self.nORs * self.nDs,))[self.observed_cases_indx]
+        self.NewDeaths = model.d.NewDeaths.data.reshape((self.nORs * self.nDs,))[self.observed_deaths_indx]
+
+    def expected_log_r(self, draws):
+        region_r = self.R_hyperprior_mean + np.asarray(draws["RegionLogR_noise"]) * np.reshape(
+            draws["HyperRVar"], (-1, 1))
+        growth_reduction = np.einsum("sc,rcd->srd", np.asarray(draws["CM_Alpha"]), self.ActiveCMs)
+        return np.log(region_r)[:, :, None] - growth_reduction
+
+    def expected_growth(self, expected_log_r):
+        return self.si_beta * (np.exp(expected_log_r / self.si_alpha) - 1)
+
+    def forward(self, draws):
+        """Deterministic trajectories of the model, each of shape [S, nORs, nDs]."""
+        expected_log_r = self.expected_log_r(draws)
+        expected_growth = self.expected_growth(expected_log_r)
+
+        infected_cases = np.exp(np.reshape(draws["InitialSizeCases_log"], (-1, self.nORs, 1))
+                                + np.cumsum(expected_growth + draws["GrowthCasesNoise"], axis=-1))
+        infected_deaths = np.exp(np.reshape(draws["InitialSizeDeaths_log"], (-1, self.nORs, 1))
+                                 + np.cumsum(expected_growth + draws["GrowthDeathsNoise"], axis=-1))
+
+        return {
+            "ExpectedLogR": expected_log_r,
+            "ExpectedGrowth": expected_growth,
+            "InfectedCases": infected_cases,
+            "InfectedDeaths": infected_deaths,
+            "ExpectedCases": delay_convolve(infected_cases, self.DelayProbCases),
+            "ExpectedDeaths": delay_convolve(infected_deaths, self.DelayProbDeaths),
+        }
+
+    def dispersion(self, draws, fixed_noise):
+        if fixed_noise is not None:
+            return fixed_noise
+        return np.reshape(draws["Phi_1"], (-1, 1))
+
+    def log_likelihood(self, draws, outputs=None):
+        """Per-observation log likelihoods, of shape [S, number of observed days]."""
+        if outputs is None:
+            outputs = self.forward(draws)
+
+        nS = outputs["ExpectedCases"].shape[0]
+        mu_cases = outputs["ExpectedCases"].reshape((nS, -1))[:, self.observed_cases_indx]
+        mu_deaths = outputs["ExpectedDeaths"].reshape((nS, -1))[:, self.observed_deaths_indx]
+
+        return {
+            "ObservedCases": nb_logpmf(self.NewCases, mu_cases, self.dispersion(draws, self.conf_noise)),
+            "ObservedDeaths": nb_logpmf(self.NewDeaths, mu_deaths, self.dispersion(draws, self.deaths_noise)),
+        }
+
+    def region_log_likelihood(self, draws, outputs=None):
+        """Total log likelihood of the observations of each region, of shape [S, nORs]."""
+        log_lik = self.log_likelihood(draws, outputs)
+        nS = log_lik["ObservedCases"].shape[0]
+
+        total = np.zeros((nS, self.nORs))
+        for name, indx in [("ObservedCases", self.observed_cases_indx), ("ObservedDeaths", self.observed_deaths_indx)]:
+            np.add.at(total.T, indx // self.nDs, log_lik[name].T)
+        return total
+
+    def log_prior(self, draws):
+        """
+        Log prior density of the parameters other than the growth noise, up to a constant, of shape [S]; -inf
+        where HyperRVar or Phi_1 is not positive.
+        """
+        def normal(x, sigma):
+            x = np.asarray(x)
+            return -0.5 * np.sum((x / sigma) ** 2, axis=tuple(range(1, x.ndim)))
+
+        def half_normal(x, sigma):
+            x = np.ravel(x)
+            return np.where(x > 0, -0.5 * (x / sigma) ** 2, -np.inf)
+
+        total = (normal(draws["CM_Alpha"], self.cm_prior_sigma) + normal(draws["RegionLogR_noise"], 1)
+                 + half_normal(draws["HyperRVar"], 0.5) + normal(draws["InitialSizeCases_log"], 50)
+                 + normal(draws["InitialSizeDeaths_log"], 50))
+        if self.conf_noise is None or self.deaths_noise is None:
+            total = total + half_normal(draws["Phi_1"], 5)
+        return total
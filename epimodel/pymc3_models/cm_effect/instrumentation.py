@@ -0,0 +1,213 @@
+"""
+Per-stage timing and resource records for the modelling pipeline.
+
+A run (e.g. one model of a sensitivity analysis) is recorded with run_record; code inside it marks its stages
+(CSV parse, preprocessing, model construction, sampling, trace statistics, ...) with stage. Each stage records
+wall time, CPU time including that of finished child processes (sampling chains), the peak RSS of this process
+so far, the peak RSS of the child processes run during the stage, and any extra fields such as gradient
+evaluation counts. Outside a run, stages record nothing. Each run is written as one JSON line, so the records of
+a whole suite can be aggregated with stage_table.
+
+RUSAGE_CHILDREN only gives the largest peak of all children finished so far, which an earlier, larger child
+(e.g. a compile, or the chains of the previous run) hides. So while a run is recorded, a thread polls the total
+RSS of the live descendants of this process every CHILD_POLL_INTERVAL seconds, on Linux, and each stage records
+the largest total polled while it was open. A child finishing within the stage with a higher peak than any
+before it still raises the stage's value, which catches children shorter than the poll interval.
+"""
+import contextlib
+import datetime
+import functools
+import json
+import logging
+import os
+import resource
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+# runs being recorded, innermost last
+_active_runs = []
+
+CHILD_POLL_INTERVAL = 0.2
+
+
+def _usage():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux; that of the children is the largest of all children finished so far
+    return dict(cpu=own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+                maxrss_mb=own.ru_maxrss / 1024, children_maxrss_mb=children.ru_maxrss / 1024)
+
+
+def descendant_rss(pid=None):
+    """Total RSS in bytes of the live descendant processes of `pid` (default this process), None without /proc."""
+    pid = os.getpid() if pid is None else pid
+    try:
+        entries = [int(entry) for entry in os.listdir("/proc") if entry.isdigit()]
+    except FileNotFoundError:
+        return None
+    children = {}
+    for entry in entries:
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # the command name in parentheses may contain spaces, the fields after it do not
+        children.setdefault(int(stat.rsplit(")", 1)[1].split()[1]), []).append(entry)
+
+    total = 0
+    stack = list(children.get(pid, []))
+    while stack:
+        child = stack.pop()
+        stack.extend(children.get(child, []))
+        try:
+            with open(f"/proc/{child}/statm") as f:
+                total += int(f.read().split()[1]) * resource.getpagesize()
+        except OSError:
+            continue
+    return total
+
+
+class ChildMemoryMonitor(threading.Thread):
+    """Thread polling descendant_rss into the peak of each stage open in `record`."""
+
+    def __init__(self, record, interval=CHILD_POLL_INTERVAL):
+        super().__init__(name=f"child-memory-{record.name}", daemon=True)
+        self.record = record
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def poll(self):
+        rss = descendant_rss()
+        if rss is not None:
+            for peak in list(self.record._child_peaks):
+                peak[0] = max(peak[0], rss)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.poll()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class RunRecord(object):
+    def __init__(self, name, **info):
+        self.name = name
+        self.info = info
+        self.stages = []
+        self._open_stages = []
+        # [peak bytes] of the child processes of each open stage, updated by ChildMemoryMonitor
+        self._child_peaks = []
+
+    def to_dict(self):
+        return dict(run=self.name, stages=self.stages, **self.info)
+
+    def walls(self):
+        """Wall seconds of each finished stage, summed over repeats."""
+        walls = {}
+        for s in self.stages:
+            walls[s["stage"]] = walls.get(s["stage"], 0) + s["wall"]
+        return walls
+
+
+@contextlib.contextmanager
+def run_record(name, path=None, **info):
+    """
+    Record the stages run inside this context, appending the record to the JSONL file `path` if given.
+
+    :param info: JSON serialisable fields describing the run, e.g. the model type
+    """
+    record = RunRecord(name, started=datetime.datetime.now().isoformat(), **info)
+    _active_runs.append(record)
+    monitor = ChildMemoryMonitor(record)
+    monitor.start()
+    try:
+        with stage("total"):
+            yield record
+    finally:
+        monitor.stop()
+        _active_runs.remove(record)
+        if path is not None:
+            with open(path, "a") as f:
+                f.write(json.dumps(record.to_dict(), default=str) + "\n")
+
+
+@contextlib.contextmanager
+def stage(name, **fields):
+    """
+    Record the enclosed code as stage `name` of the current run. Yields a dict of fields to record with the
+    stage, to which the code can add, e.g. the number of gradient evaluations.
+    """
+    fields = dict(fields)
+    if not _active_runs:
+        yield fields
+        return
+
+    record = _active_runs[-1]
+    parent = record._open_stages[-1] if record._open_stages else None
+    record._open_stages.append(name)
+    child_peak = [0]
+    record._child_peaks.append(child_peak)
+    start_wall = time.perf_counter()
+    start = _usage()
+    try:
+        yield fields
+    finally:
+        end = _usage()
+        record._open_stages.pop()
+        record._child_peaks.remove(child_peak)
+        children_mb = child_peak[0] / 2 ** 20
+        if end["children_maxrss_mb"] > start["children_maxrss_mb"]:
+            # a child finished within the stage with a higher peak than all children before it
+            children_mb = max(children_mb, end["children_maxrss_mb"])
+        record.stages.append(dict(stage=name, parent=parent, wall=time.perf_counter() - start_wall,
+                                  cpu=end["cpu"] - start["cpu"], maxrss_mb=end["maxrss_mb"],
+                                  children_maxrss_mb=children_mb, **fields))
+
+
+def instrumented(name):
+    """Decorator recording each call of the function as stage `name`."""
+
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return f(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def sampler_stats(trace):
+    """
+    Gradient evaluations (n_grad) and divergences of the post-tuning draws of a NUTS trace, which does not keep
+    the tuning draws; BaseCMModel.run counts the gradient evaluations of tuning as tune_n_grad.
+    """
+    if "tree_size" not in getattr(trace, "stat_names", ()):
+        return {}
+    tree_size = trace.get_sampler_stats("tree_size")
+    return dict(n_grad=int(np.sum(tree_size)), mean_tree_size=float(np.mean(tree_size)),
+                divergences=int(np.sum(trace.get_sampler_stats("diverging"))))
+
+
+def load_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def stage_table(path):
+    """DataFrame of all stages in the record file `path`, one row per run and stage, with the run fields."""
+    rows = []
+    for record in load_records(path):
+        stages = record.pop("stages")
+        for s in stages:
+            rows.append({**record, **s})
+    return pd.DataFrame(rows)
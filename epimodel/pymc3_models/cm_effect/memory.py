@@ -0,0 +1,52 @@
+"""
+Memory footprint of sampling a model.
+
+pymc3 records every unobserved variable, including Deterministics such as the [nORs, nDs] expected cases and
+deaths, for every tuning and sampling draw of every chain, in the main process. The trace therefore dominates
+the peak memory of a run, and its size is known once the model is built.
+"""
+import logging
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+MiB = 2 ** 20
+
+
+def recorded_sizes(model):
+    """Bytes recorded per draw for each variable stored in the trace."""
+    sizes = {}
+    for v in model.unobserved_RVs:
+        try:
+            value = v.tag.test_value
+        except AttributeError:
+            value = model.fastfn([v])(model.test_point)[0]
+        sizes[v.name] = int(np.size(value)) * np.dtype(v.dtype).itemsize
+    return sizes
+
+
+def estimate_memory(model, N, chains=4, tune=500, cores=None, process_overhead=300 * MiB, workspace_factor=4):
+    """
+    Predicted memory use of model.run(N, chains=chains, tune=tune, cores=cores).
+
+    :param process_overhead: memory of a python process with theano and a compiled model, counted for the main
+    process and each chain process
+    :param workspace_factor: intermediate arrays of one logp and gradient evaluation, as a multiple of the
+    values recorded per draw
+    :return: dict of bytes: per_draw, trace (all chains, tuning included, as held while sampling), stored
+    (the trace once tuning draws are discarded), processes, and peak
+    """
+    cores = chains if cores is None else min(cores, chains)
+    sizes = recorded_sizes(model)
+    per_draw = sum(sizes.values())
+
+    trace = chains * (tune + N) * per_draw
+    processes = (cores + 1) * process_overhead + cores * workspace_factor * per_draw
+    estimate = dict(per_draw=per_draw, trace=trace, stored=chains * N * per_draw, processes=processes,
+                    peak=trace + processes)
+
+    largest = sorted(sizes.items(), key=lambda item: -item[1])[:3]
+    log.info(f"{type(model).__name__}: estimated peak {estimate['peak'] / MiB:.0f} MiB, "
+             f"{per_draw / 1024:.0f} KiB per draw, largest {[name for name, _ in largest]}")
+    return estimate
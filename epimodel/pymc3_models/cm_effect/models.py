@@ -1,6 +1,8 @@
 import copy
 import logging
+import multiprocessing
 import os
+import time
 from datetime import datetime
 
 import seaborn as sns
@@ -13,6 +15,10 @@ import theano.tensor as T
 import theano.tensor.signal.conv as C
 from pymc3 import Model
 
+from epimodel.pymc3_models.cm_effect.instrumentation import instrumented, sampler_stats, stage
+from epimodel.pymc3_models.cm_effect.streaming import StreamingSummary
+from epimodel.pymc3_models.cm_effect.startpoints import find_start_point, perturbed_start_points
+
 log = logging.getLogger(__name__)
 sns.set_style("ticks")
 
@@ -43,22 +49,38 @@ SI_BETA = 1.188
 # SI_BETA = 1.556
 
 
-def save_fig_pdf(output_dir, figname):
-    datetime_str = datetime.now().strftime("%d-%m;%H-%M")
+@instrumented("save_fig_pdf")
+def save_fig_pdf(output_dir, figname, datetime_str=None, metadata=None):
+    """
+    Save the current figure as {output_dir}/{figname}_t{datetime_str}.pdf, datetime_str defaulting to now.
+
+    :param metadata: PDF metadata passed to plt.savefig, e.g. {"CreationDate": None} for reproducible files
+    """
+    datetime_str = datetime.now().strftime("%d-%m;%H-%M") if datetime_str is None else datetime_str
     if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
     log.info(f"Saving Plot at {os.path.abspath(output_dir)} at {datetime_str}")
-    plt.savefig(f"{output_dir}/{figname}_t{datetime_str}.pdf", bbox_inches='tight')
+    plt.savefig(f"{output_dir}/{figname}_t{datetime_str}.pdf", bbox_inches='tight', metadata=metadata)
 
 
 def produce_CIs(data):
-    means = np.median(data, axis=0)
-    li = np.percentile(data, 2.5, axis=0)
-    ui = np.percentile(data, 97.5, axis=0)
+    # one partition of the draws for all three quantiles
+    means, li, ui = np.percentile(data, [50, 2.5, 97.5], axis=0)
     err = np.array([means - li, ui - means])
     return means, li, ui, err
 
 
+def nb_random(mu, alpha, rng=None):
+    """
+    Negative binomial draws with mean `mu` and dispersion `alpha` (as in pymc3), sampled as a gamma-Poisson
+    mixture in one vectorised call. `alpha` broadcasts against `mu`; non-finite means give NaN draws.
+    """
+    rng = np.random if rng is None else rng
+    valid = np.isfinite(mu)
+    rate = rng.gamma(alpha, np.where(valid, mu, 1.) / alpha)
+    return np.where(valid, rng.poisson(rate), np.nan)
+
+
 def add_cms_to_plot(ax, ActiveCMs, country_indx, min_x, max_x, days, plot_style):
     ax2 = ax.twinx()
     plt.ylim([0, 1])
@@ -107,6 +129,258 @@ def add_cms_to_plot(ax, ActiveCMs, country_indx, min_x, max_x, days, plot_style)
     return ax2
 
 
+def region_prediction_summaries(model):
+    """
+    Medians and 95% intervals of the trajectories plotted by plot_region_predictions, for all regions at once:
+    dict of name -> (median, lower, upper), each [regions, days].
+    """
+    predicted_deaths = model.posterior_predictive("ExpectedDeaths")
+    failed = ~np.all(np.isfinite(predicted_deaths), axis=(0, 2))
+    if failed.any():
+        log.warning(f"Non-finite predicted deaths in {', '.join(np.array(model.d.Rs)[failed])}, "
+                    f"plotting their expected deaths instead")
+        predicted_deaths = produce_CIs(np.where(failed[None, :, None], model.trace.ExpectedDeaths, predicted_deaths))
+    else:
+        predicted_deaths = model.trajectory_CIs("ExpectedDeaths", predictive=True)
+
+    summaries = dict(
+        infected_cases=model.trajectory_CIs("InfectedCases"),
+        predicted_cases=model.trajectory_CIs("ExpectedCases", predictive=True),
+        infected_deaths=model.trajectory_CIs("InfectedDeaths"),
+        predicted_deaths=predicted_deaths,
+        growth=model.trajectory_CIs("ExpectedGrowth", exp=True),
+        growth_cases=model.trajectory_CIs("GrowthCases", exp=True),
+        growth_deaths=model.trajectory_CIs("GrowthDeaths", exp=True),
+    )
+    return {name: cis[:3] for name, cis in summaries.items()}
+
+
+def render_region_prediction_page(page, context):
+    """
+    Draw one page of plot_region_predictions, saving it if context["save_fig"].
+
+    :param page: list of (region index, region, {name: (median, lower, upper)} of region_prediction_summaries)
+    :param context: dict with the data and options shared by all pages, see render_region_predictions
+    """
+    days = context["days"]
+    observed = context["ObservedDaysIndx"]
+    plot_style = context["plot_style"]
+    n_regions = context["n_regions"]
+    ActiveCMs = context["ActiveCMs"]
+
+    for country_indx, region, summaries in page:
+        if country_indx % 5 == 0:
+            plt.figure(figsize=(12, 20), dpi=300)
+
+        plt.subplot(5, 3, 3 * (country_indx % 5) + 1)
+
+        means_ic, lu_ic, up_ic = summaries["infected_cases"]
+        means_ec, lu_ec, up_ec = summaries["predicted_cases"]
+        means_id, lu_id, up_id = summaries["infected_deaths"]
+        means_ed, lu_ed, up_ed = summaries["predicted_deaths"]
+
+        days_x = np.arange(len(days))
+
+        min_x = 25
+        max_x = len(days) - 1
+
+        newcases = context["NewCases"][country_indx, :]
+        deaths = context["NewDeaths"][country_indx, :]
+
+        ax = plt.gca()
+        plt.plot(
+            days_x,
+            means_ic,
+            label="Daily Infected - Cases",
+            zorder=1,
+            color="tab:purple",
+            alpha=0.25
+        )
+
+        plt.fill_between(
+            days_x, lu_ic, up_ic, alpha=0.15, color="tab:purple", linewidth=0
+        )
+
+        plt.plot(
+            days_x,
+            means_ec,
+            label="Predicted New Cases",
+            zorder=2,
+            color="tab:blue"
+        )
+
+        plt.fill_between(
+            days_x, lu_ec, up_ec, alpha=0.25, color="tab:blue", linewidth=0
+        )
+
+        plt.scatter(
+            observed,
+            newcases[observed],
+            label="Recorded New Cases",
+            marker="o",
+            s=10,
+            color="tab:green",
+            alpha=0.9,
+            zorder=3,
+        )
+
+        plt.scatter(
+            observed,
+            newcases[observed].data,
+            label="Heldout New Cases",
+            marker="o",
+            s=12,
+            edgecolor="tab:green",
+            facecolor="white",
+            linewidth=1,
+            alpha=0.9,
+            zorder=2,
+        )
+
+        plt.plot(
+            days_x,
+            means_id,
+            label="Daily Infected - Deaths",
+            zorder=1,
+            color="tab:orange",
+            alpha=0.25
+        )
+
+        plt.fill_between(
+            days_x, lu_id, up_id, alpha=0.15, color="tab:orange", linewidth=0
+        )
+
+        plt.plot(
+            days_x,
+            means_ed,
+            label="Predicted Deaths",
+            zorder=2,
+            color="tab:red"
+        )
+
+        plt.fill_between(
+            days_x, lu_ed, up_ed, alpha=0.25, color="tab:red", linewidth=0
+        )
+
+        plt.scatter(
+            observed,
+            deaths[observed],
+            label="Recorded Deaths",
+            marker="o",
+            s=10,
+            color="tab:gray",
+            alpha=0.9,
+            zorder=3,
+        )
+
+        plt.scatter(
+            observed,
+            deaths[observed].data,
+            label="Recorded Heldout Deaths",
+            marker="o",
+            s=12,
+            edgecolor="tab:gray",
+            facecolor="white",
+            linewidth=1,
+            alpha=0.9,
+            zorder=2,
+        )
+
+        ax.set_yscale("log")
+        plt.xlim([min_x, max_x])
+        plt.ylim([10 ** 0, 10 ** 6])
+        locs = np.arange(min_x, max_x, 7)
+        xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
+        plt.xticks(locs, xlabels, rotation=-30)
+        ax1 = add_cms_to_plot(ax, ActiveCMs, country_indx, min_x, max_x, days, plot_style)
+
+        plt.subplot(5, 3, 3 * (country_indx % 5) + 2)
+
+        ax2 = plt.gca()
+
+        means_g, lu_g, up_g = summaries["growth"]
+        means_agc, lu_agc, up_agc = summaries["growth_cases"]
+        means_agd, lu_agd, up_agd = summaries["growth_deaths"]
+
+        plt.plot(days_x, means_g, label="Predicted Growth", zorder=1, color="tab:gray")
+        plt.plot(days_x, means_agc, label="Corrupted Growth - Cases", zorder=1, color="tab:purple")
+        plt.plot(days_x, means_agd, label="Corrupted Growth - Deaths", zorder=1, color="tab:orange")
+
+        plt.fill_between(days_x, lu_g, up_g, alpha=0.25, color="tab:gray", linewidth=0)
+        plt.fill_between(days_x, lu_agc, up_agc, alpha=0.25, color="tab:purple", linewidth=0)
+        plt.fill_between(days_x, lu_agd, up_agd, alpha=0.25, color="tab:orange", linewidth=0)
+
+        plt.plot([min_x, max_x], [1, 1], "--", linewidth=0.5, color="lightgrey")
+
+        plt.ylim([0.5, 2])
+        plt.xlim([min_x, max_x])
+        plt.ylabel("Growth")
+        locs = np.arange(min_x, max_x, 7)
+        xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
+        plt.xticks(locs, xlabels, rotation=-30)
+        plt.title(f"Region {region}")
+        ax3 = add_cms_to_plot(ax2, ActiveCMs, country_indx, min_x, max_x, days, plot_style)
+
+        plt.subplot(5, 3, 3 * (country_indx % 5) + 3)
+        plt.xlim([min_x, max_x])
+
+        sns.despine(ax=ax)
+        sns.despine(ax=ax1)
+        sns.despine(ax=ax2)
+        sns.despine(ax=ax3)
+
+        if country_indx % 5 == 4 or country_indx == n_regions - 1:
+            plt.tight_layout()
+            if context["save_fig"]:
+                save_fig_pdf(
+                    context["output_dir"],
+                    f"CountryPredictionPlot{((country_indx + 1) / 5):.1f}",
+                    context["datetime_str"],
+                    context["metadata"],
+                )
+                if context["close"]:
+                    plt.close()
+
+        elif country_indx == 0:
+            ax.legend(prop={"size": 8}, loc="center left")
+            ax2.legend(prop={"size": 8}, loc="lower left")
+
+
+def _render_in_worker(page, context):
+    plt.switch_backend("Agg")
+    render_region_prediction_page(page, dict(context, close=True))
+
+
+def render_region_predictions(model, plot_style, save_fig=True, output_dir="./out", n_workers=1):
+    """
+    plot_region_predictions of the combined models: summarise all regions once, then draw pages of 5 regions.
+    With n_workers > 1 (and save_fig), pages are rendered in a pool of processes on the Agg backend, each
+    writing its own PDF. The pages share one timestamp and have no PDF creation date, so the files are the same
+    as when rendered one after another.
+    """
+    assert model.trace is not None
+    summaries = region_prediction_summaries(model)
+
+    pages = {}
+    for country_indx, region in zip(model.OR_indxs, model.ORs):
+        page = pages.setdefault(country_indx // 5, [])
+        page.append((country_indx, region, {name: tuple(x[country_indx] for x in summary)
+                                            for name, summary in summaries.items()}))
+
+    context = dict(days=model.d.Ds, ObservedDaysIndx=model.ObservedDaysIndx, NewCases=model.d.NewCases,
+                   NewDeaths=model.d.NewDeaths, ActiveCMs=model.d.ActiveCMs, n_regions=len(model.d.Rs),
+                   plot_style=plot_style, save_fig=save_fig, output_dir=output_dir,
+                   datetime_str=datetime.now().strftime("%d-%m;%H-%M"), metadata={"CreationDate": None},
+                   close=False)
+
+    if n_workers > 1 and save_fig:
+        with multiprocessing.Pool(min(n_workers, len(pages))) as pool:
+            pool.starmap(_render_in_worker, [(page, context) for page in pages.values()])
+    else:
+        for page in pages.values():
+            render_region_prediction_page(page, context)
+
+
 class BaseCMModel(Model):
     def __init__(
             self, data, cm_plot_style, name="", model=None
@@ -115,6 +389,12 @@ class BaseCMModel(Model):
         self.d = data
         self.plot_trace_vars = set()
         self.trace = None
+        self.summary = None
+        # build_model arguments, set by factory.ModelFactory
+        self.build_kwargs = {}
+        # (trace, {name: draws}) of posterior_predictive, (trace, {(name, exp, predictive): CIs}) of trajectory_CIs
+        self.predictive_cache = None
+        self.ci_cache = None
         self.heldout_day_labels = None
 
         if cm_plot_style is not None:
@@ -178,6 +458,27 @@ class BaseCMModel(Model):
 
         return v
 
+    def GrowthNoise(self, name, parameterisation="default"):
+        """
+        Create daily growth noise of shape (nORs, nDs) and sd DailyGrowthNoise, adding it to self as attribute.
+
+        "default" samples the daily noise directly. "random_walk" samples the standardised cumulative noise
+        (the deviation of log infections from their expected trajectory) and differences it. The prior is the
+        same; whether it samples faster is not established, see scripts/benchmark_growth_noise.py.
+        """
+        if parameterisation == "default":
+            v = pm.Normal(name, 0, self.DailyGrowthNoise, shape=(self.nORs, self.nDs))
+        elif parameterisation == "random_walk":
+            walk = pm.Flat(f"{name}Walk", shape=(self.nORs, self.nDs))
+            steps = T.concatenate([walk[:, :1], walk[:, 1:] - walk[:, :-1]], axis=1)
+            pm.Potential(f"{name}WalkPrior", T.sum(pm.Normal.dist(0, 1).logp(steps)))
+            v = pm.Deterministic(name, self.DailyGrowthNoise * steps)
+        else:
+            raise ValueError(f"Unknown growth noise parameterisation {parameterisation}")
+
+        self.__dict__[name] = v
+        return v
+
     def Det(self, name, exp, plot_trace=True):
         """Create a deterministic variable, adding it to self as attribute."""
         if name in self.__dict__:
@@ -266,11 +567,94 @@ class BaseCMModel(Model):
         if save_fig:
             save_fig_pdf(output_dir, f"CMCorr")
 
-    def run(self, N, chains=2, cores=2, **kwargs):
-        print(self.check_test_point())
-        with self.model:
-            self.trace = pm.sample(N, chains=chains, cores=cores, init="jitter+adapt_diag", target_accept=0.8,
-                                   max_treedepth=12, **kwargs)
+    def run(self, N, chains=2, cores=2, map_start=False, start_cache_dir="start_points", summarize=None,
+            summary_path=None, **kwargs):
+        """
+        Sample the model. With map_start, chains start from perturbed copies of a (cached) MAP estimate
+        rather than from jittered test points; it cannot be combined with a start passed on to pm.sample.
+
+        :param summarize: names of variables whose means, variances and quantiles are updated while sampling, in
+        self.summary (see streaming.StreamingSummary), and written to summary_path if given
+        """
+        with stage("check_test_point"):
+            test_point_logp = self.check_test_point()
+        print(test_point_logp)
+
+        init = "jitter+adapt_diag"
+        if map_start:
+            if "start" in kwargs:
+                raise ValueError("Pass either map_start or start, not both")
+            with stage("find_start_point"):
+                start = find_start_point(self, start_cache_dir, test_point_logp=test_point_logp)
+            kwargs["start"] = perturbed_start_points(start, chains)
+            init = "adapt_diag"
+
+        kwargs.setdefault("target_accept", 0.8)
+        kwargs.setdefault("max_treedepth", 12)
+        with stage("sample", draws=N, chains=chains, cores=cores) as sample_stage:
+            start_wall = time.perf_counter()
+            tuning_end = []
+            tune_n_grad = [0]
+
+            callbacks = [kwargs.pop("callback")] if "callback" in kwargs else []
+            if summarize is not None:
+                self.summary = StreamingSummary(self, summarize, path=summary_path)
+                callbacks.append(self.summary)
+
+            def callback(trace, draw):
+                # the first draw after tuning of any chain ends the tuning phase
+                if not tuning_end and not draw.tuning:
+                    tuning_end.append(time.perf_counter())
+                # the trace drops the tuning draws, so their gradient evaluations are counted here
+                if draw.tuning and draw.stats:
+                    tune_n_grad[0] += sum(int(stats.get("tree_size", 0)) for stats in draw.stats)
+                for f in callbacks:
+                    f(trace=trace, draw=draw)
+
+            with self.model:
+                self.trace = pm.sample(N, chains=chains, cores=cores, init=init, callback=callback, **kwargs)
+            if tuning_end:
+                sample_stage["tune_wall"] = tuning_end[0] - start_wall
+            sample_stage["tune_n_grad"] = tune_n_grad[0]
+            sample_stage.update(sampler_stats(self.trace))
+
+    def posterior_predictive(self, name):
+        """
+        Posterior predictive draws of the observations whose expectation is `name` (ExpectedCases or
+        ExpectedDeaths), for all regions and days at once, [draws, regions, days]. The dispersion is the sampled
+        Phi_1 (Phi in the single-observation models). Cached for the current trace.
+        """
+        if self.predictive_cache is None or self.predictive_cache[0] is not self.trace:
+            self.predictive_cache = (self.trace, {})
+        draws = self.predictive_cache[1]
+        if name not in draws:
+            phi = self.trace["Phi_1"] if "Phi_1" in self.trace.varnames else self.trace["Phi"]
+            mu = np.asarray(self.trace[name], dtype=float) + 1e-3
+            if len(phi) != len(mu):
+                raise ValueError(f"{name} has {len(mu)} draws and the dispersion {len(phi)}; load traces saved with "
+                                 f"thinning storage policies with traceio.load_trace(path, align_draws=True)")
+            draws[name] = nb_random(mu, np.asarray(phi).reshape(-1, 1, 1))
+        return draws[name]
+
+    def trajectory_CIs(self, name, exp=False, predictive=False):
+        """
+        produce_CIs of trace[name] for all regions at once, cached for the current trace.
+
+        :param exp: of the exponential of the draws, e.g. for log growth rates
+        :param predictive: of the posterior_predictive draws of observations with expectation `name`
+        """
+        if self.ci_cache is None or self.ci_cache[0] is not self.trace:
+            self.ci_cache = (self.trace, {})
+        key = (name, exp, predictive)
+        if key not in self.ci_cache[1]:
+            values = self.posterior_predictive(name) if predictive else self.trace[name]
+            self.ci_cache[1][key] = produce_CIs(np.exp(values) if exp else values)
+        return self.ci_cache[1][key]
+
+    def region_CIs(self, name, country_indx, exp=False, predictive=False):
+        """trajectory_CIs of one region"""
+        means, li, ui, err = self.trajectory_CIs(name, exp, predictive)
+        return means[country_indx], li[country_indx], ui[country_indx], err[:, country_indx]
 
 
 class CMDeath_Final(BaseCMModel):
@@ -415,17 +799,10 @@ class CMDeath_Final(BaseCMModel):
 
             plt.subplot(5, 3, 3 * (country_indx % 5) + 1)
 
-            means_d, lu_id, up_id, err_d = produce_CIs(
-                self.trace.Infected[:, country_indx, :]
-            )
-
-            ec = self.trace.ExpectedDeaths[:, country_indx, :]
-            nS, nDs = ec.shape
-            dist = pm.NegativeBinomial.dist(mu=ec, alpha=np.repeat(np.array([self.trace.Phi]), nDs, axis=0).T)
-            ec_output = dist.random()
+            means_d, lu_id, up_id, err_d = self.region_CIs("Infected", country_indx)
 
-            means_expected_deaths, lu_ed, up_ed, err_expected_deaths = produce_CIs(
-                ec_output
+            means_expected_deaths, lu_ed, up_ed, err_expected_deaths = self.region_CIs(
+                "ExpectedDeaths", country_indx, predictive=True
             )
 
             days = self.d.Ds
@@ -498,15 +875,11 @@ class CMDeath_Final(BaseCMModel):
 
             ax2 = plt.gca()
 
-            means_growth, lu_g, up_g, err = produce_CIs(
-                np.exp(self.trace.ExpectedGrowth[:, country_indx, :])
-            )
+            means_growth, lu_g, up_g, err = self.region_CIs("ExpectedGrowth", country_indx, exp=True)
 
-            actual_growth, lu_ag, up_ag, err_act = produce_CIs(
-                np.exp(self.trace.Growth[:, country_indx, :])
-            )
+            actual_growth, lu_ag, up_ag, err_act = self.region_CIs("Growth", country_indx, exp=True)
 
-            med_growth = np.percentile(np.exp(self.trace.Growth[:, country_indx, :]), 50, axis=0)
+            med_growth = actual_growth
 
             plt.plot(days_x, med_growth, "--", label="Median Growth",
                      color="tab:blue")
@@ -538,9 +911,7 @@ class CMDeath_Final(BaseCMModel):
             # z1_mean, lu_z1, up_z1, err_1 = produce_CIs(self.trace.Z1[:, country_indx, :])
             # z2_mean, lu_z2, up_z2, err_2 = produce_CIs(self.trace.Z2[:, country_indx, :])
 
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                np.exp(self.trace.ExpectedLogR[:, country_indx, :])
-            )
+            means_id, lu_id, up_id, err_id = self.region_CIs("ExpectedLogR", country_indx, exp=True)
 
             plt.plot(days_x, means_id, color="tab:blue", label="R")
             plt.fill_between(
@@ -714,9 +1085,7 @@ class CMActive_Final(BaseCMModel):
 
             plt.subplot(5, 3, 3 * (country_indx % 5) + 1)
 
-            means_d, lu_id, up_id, err_d = produce_CIs(
-                self.trace.Infected[:, country_indx, :]
-            )
+            means_d, lu_id, up_id, err_d = self.region_CIs("Infected", country_indx)
 
             means_ea, lu_ea, up_ea, err_eea = produce_CIs(
                 self.trace.ExpectedCases[:, country_indx, :] * np.exp(
@@ -724,14 +1093,7 @@ class CMActive_Final(BaseCMModel):
                         size=(self.trace.ExpectedCases[:, country_indx, :].shape)))
             )
 
-            ec = self.trace.ExpectedCases[:, country_indx, :]
-            nS, nDs = ec.shape
-            dist = pm.NegativeBinomial.dist(mu=ec + 1e-3, alpha=np.repeat(np.array([self.trace.Phi]), nDs, axis=0).T)
-            ec_output = dist.random()
-
-            means_ea, lu_ea, up_ea, err_eea = produce_CIs(
-                ec_output
-            )
+            means_ea, lu_ea, up_ea, err_eea = self.region_CIs("ExpectedCases", country_indx, predictive=True)
 
             days = self.d.Ds
             days_x = np.arange(len(days))
@@ -803,15 +1165,11 @@ class CMActive_Final(BaseCMModel):
 
             ax2 = plt.gca()
 
-            means_growth, lu_g, up_g, err = produce_CIs(
-                np.exp(self.trace.ExpectedGrowth[:, country_indx, :])
-            )
+            means_growth, lu_g, up_g, err = self.region_CIs("ExpectedGrowth", country_indx, exp=True)
 
-            actual_growth, lu_ag, up_ag, err_act = produce_CIs(
-                np.exp(self.trace.Growth[:, country_indx, :])
-            )
+            actual_growth, lu_ag, up_ag, err_act = self.region_CIs("Growth", country_indx, exp=True)
 
-            med_growth = np.percentile(np.exp(self.trace.Growth[:, country_indx, :]), 50, axis=0)
+            med_growth = actual_growth
 
             plt.plot(days_x, med_growth, "--", label="Median Growth",
                      color="tab:blue")
@@ -840,7 +1198,7 @@ class CMActive_Final(BaseCMModel):
             plt.subplot(5, 3, 3 * (country_indx % 5) + 3)
             axis_scale = 1.5
             ax4 = plt.gca()
-            z1_mean, lu_z1, up_z1, err_1 = produce_CIs(self.trace.Z1[:, country_indx, :])
+            z1_mean, lu_z1, up_z1, err_1 = self.region_CIs("Z1", country_indx)
             # z2_mean, lu_z2, up_z2, err_2 = produce_CIs(self.trace.Z2[:, country_indx, :])
 
             plt.plot(days_x, z1_mean, color="tab:blue", label="Growth Noise")
@@ -956,7 +1314,7 @@ class CMCombined_Final(BaseCMModel):
 
     def build_model(self, R_hyperprior_mean=3.25, cm_prior_sigma=0.2, cm_prior='normal',
                     serial_interval_mean=SI_ALPHA / SI_BETA, serial_interval_sigma=np.sqrt(SI_ALPHA / SI_BETA ** 2),
-                    conf_noise=None, deaths_noise=None
+                    conf_noise=None, deaths_noise=None, growth_noise="default"
                     ):
         with self.model:
             if cm_prior == 'normal':
@@ -1004,9 +1362,8 @@ class CMCombined_Final(BaseCMModel):
                                            plot_trace=False
                                            )
 
-            self.GrowthCasesNoise = pm.Normal("GrowthCasesNoise", 0, self.DailyGrowthNoise, shape=(self.nORs, self.nDs))
-            self.GrowthDeathsNoise = pm.Normal("GrowthDeathsNoise", 0, self.DailyGrowthNoise,
-                                               shape=(self.nORs, self.nDs))
+            self.GrowthNoise("GrowthCasesNoise", growth_noise)
+            self.GrowthNoise("GrowthDeathsNoise", growth_noise)
 
             self.GrowthCases = pm.Deterministic("GrowthCases", self.ExpectedGrowth + self.GrowthCasesNoise)
             self.GrowthDeaths = pm.Deterministic("GrowthDeaths", self.ExpectedGrowth + self.GrowthDeathsNoise)
@@ -1086,44 +1443,45 @@ class CMCombined_Final(BaseCMModel):
                         self.all_observed_deaths]
                 )
 
-    def plot_region_predictions(self, plot_style, save_fig=True, output_dir="./out"):
-        assert self.trace is not None
+    def plot_region_predictions(self, plot_style, save_fig=True, output_dir="./out", n_workers=1):
+        """
+        Plot the predicted and observed cases, deaths and growth of each region, on pages of 5 regions.
 
-        for country_indx, region in zip(self.OR_indxs, self.ORs):
+        :param n_workers: processes rendering the saved pages in parallel, see render_region_predictions
+        """
+        render_region_predictions(self, plot_style, save_fig, output_dir, n_workers)
 
-            if country_indx % 5 == 0:
-                plt.figure(figsize=(12, 20), dpi=300)
+    def plot_subset_region_predictions(self, region_indxs, plot_style, n_rows=3, fig_height=11, save_fig=True,
+                                       output_dir="./out"):
+        assert self.trace is not None
 
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 1)
+        for i, country_indx in enumerate(region_indxs):
 
-            means_ic, lu_ic, up_ic, err_ic = produce_CIs(
-                self.trace.InfectedCases[:, country_indx, :]
-            )
+            region = self.d.Rs[country_indx]
 
-            ec = self.trace.ExpectedCases[:, country_indx, :]
-            nS, nDs = ec.shape
-            dist = pm.NegativeBinomial.dist(mu=ec + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-            # dist = pm.NegativeBinomial.dist(mu=ec, alpha=30)
-            ec_output = dist.random()
+            if i % n_rows == 0:
+                plt.figure(figsize=(10, fig_height), dpi=300)
 
-            means_ec, lu_ec, up_ec, err_ec = produce_CIs(
-                ec_output
-            )
+            plt.subplot(n_rows, 3, 3 * (i % n_rows) + 1)
 
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                self.trace.InfectedDeaths[:, country_indx, :]
-            )
+            means_ic, lu_ic, up_ic, err_ic = self.region_CIs("InfectedCases", country_indx)
 
-            ed = self.trace.ExpectedDeaths[:, country_indx, :]
-            nS, nDs = ed.shape
-            dist = pm.NegativeBinomial.dist(mu=ed + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
+            means_ec, lu_ec, up_ec, err_ec = self.region_CIs("ExpectedCases", country_indx, predictive=True)
 
-            dist = pm.NegativeBinomial.dist(mu=ed, alpha=30)
-            try:
-                ed_output = dist.random()
-            except:
+            ids = self.trace.InfectedDeaths[:, country_indx, :]
+            ed_output = self.posterior_predictive("ExpectedDeaths")[:, country_indx, :]
+            if not np.all(np.isfinite(ed_output)):
                 print(region)
-                ed_output = ed
+                ed_output = np.ones_like(ids) * 10 ** -5
+                ids = np.ones_like(ids) * 10 ** -5
+
+            # if np.isnan(self.d.Deaths.data[country_indx, -1]):
+            #     ed_output = np.ones_like(ids) * 10 ** -5
+            #     ids = np.ones_like(ids) * 10 ** -5
+
+            means_id, lu_id, up_id, err_id = produce_CIs(
+                ids
+            )
 
             means_ed, lu_ed, up_ed, err_ed = produce_CIs(
                 ed_output
@@ -1155,7 +1513,7 @@ class CMCombined_Final(BaseCMModel):
             plt.plot(
                 days_x,
                 means_ec,
-                label="Predicted New Cases",
+                label="Estimated New Cases",
                 zorder=2,
                 color="tab:blue"
             )
@@ -1167,25 +1525,24 @@ class CMCombined_Final(BaseCMModel):
             plt.scatter(
                 self.ObservedDaysIndx,
                 newcases[self.ObservedDaysIndx],
-                label="Recorded New Cases",
+                label="New Cases (Smoothed)",
                 marker="o",
                 s=10,
-                color="tab:green",
+                color="tab:blue",
                 alpha=0.9,
                 zorder=3,
             )
 
             plt.scatter(
                 self.ObservedDaysIndx,
-                newcases[self.ObservedDaysIndx].data,
-                label="Heldout New Cases",
+                newcases.data[self.ObservedDaysIndx],
+                label="New Cases (Smoothed)",
                 marker="o",
-                s=12,
-                edgecolor="tab:green",
-                facecolor="white",
-                linewidth=1,
+                s=10,
+                color="tab:blue",
                 alpha=0.9,
-                zorder=2,
+                zorder=4,
+                facecolor="white"
             )
 
             plt.plot(
@@ -1204,7 +1561,7 @@ class CMCombined_Final(BaseCMModel):
             plt.plot(
                 days_x,
                 means_ed,
-                label="Predicted Deaths",
+                label="Estimated New Deaths",
                 zorder=2,
                 color="tab:red"
             )
@@ -1216,103 +1573,84 @@ class CMCombined_Final(BaseCMModel):
             plt.scatter(
                 self.ObservedDaysIndx,
                 deaths[self.ObservedDaysIndx],
-                label="Recorded Deaths",
+                label="New Deaths (Smoothed)",
                 marker="o",
                 s=10,
-                color="tab:gray",
+                color="tab:red",
                 alpha=0.9,
                 zorder=3,
             )
 
             plt.scatter(
                 self.ObservedDaysIndx,
-                deaths[self.ObservedDaysIndx].data,
-                label="Recorded Heldout Deaths",
+                deaths.data[self.ObservedDaysIndx],
+                label="New Deaths (Smoothed)",
                 marker="o",
-                s=12,
-                edgecolor="tab:gray",
-                facecolor="white",
-                linewidth=1,
+                s=10,
+                color="tab:red",
                 alpha=0.9,
-                zorder=2,
+                zorder=4,
+                facecolor="white"
             )
 
             ax.set_yscale("log")
             plt.xlim([min_x, max_x])
+            tick_vals = np.arange(7)
             plt.ylim([10 ** 0, 10 ** 6])
+            plt.yticks(np.power(10.0, tick_vals),
+                       [f"${np.power(10.0, loc):.0f}$" if loc < 2 else f"$10^{loc}$" for loc in tick_vals])
             locs = np.arange(min_x, max_x, 7)
             xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
             plt.xticks(locs, xlabels, rotation=-30)
             ax1 = add_cms_to_plot(ax, self.d.ActiveCMs, country_indx, min_x, max_x, days, plot_style)
 
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 2)
+            plt.subplot(n_rows, 3, 3 * (i % n_rows) + 2)
 
             ax2 = plt.gca()
 
-            means_g, lu_g, up_g, err_g = produce_CIs(
-                np.exp(self.trace.ExpectedGrowth[:, country_indx, :])
-            )
-
-            means_agc, lu_agc, up_agc, err_agc = produce_CIs(
-                np.exp(self.trace.GrowthCases[:, country_indx, :])
-            )
-
-            means_agd, lu_agd, up_agd, err_agd = produce_CIs(
-                np.exp(self.trace.GrowthDeaths[:, country_indx, :])
-            )
+            means_g, lu_g, up_g, err_g = self.region_CIs("ExpectedLogR", country_indx, exp=True)
 
-            med_agc = np.percentile(np.exp(self.trace.GrowthCases[:, country_indx, :]), 50, axis=0)
-            med_agd = np.percentile(np.exp(self.trace.GrowthDeaths[:, country_indx, :]), 50, axis=0)
+            means_base, lu_base, up_base, err_base = self.region_CIs("RegionLogR", country_indx, exp=True)
 
-            plt.plot(days_x, means_g, label="Predicted Growth", zorder=1, color="tab:gray")
-            plt.plot(days_x, means_agc, label="Corrupted Growth - Cases", zorder=1, color="tab:purple")
-            # plt.plot(days_x, med_agc, "--", color="tab:purple")
-            plt.plot(days_x, means_agd, label="Corrupted Growth - Deaths", zorder=1, color="tab:orange")
+            plt.plot(days_x, means_g, zorder=1, color="tab:gray", label="$R_{t}$")
+            plt.plot([min_x, max_x], [means_base, means_base], "--", zorder=-1, label="$R_0$", color="tab:red",
+                     linewidth=0.75)
             # plt.plot(days_x, med_agd, "--", color="tab:orange")
 
             plt.fill_between(days_x, lu_g, up_g, alpha=0.25, color="tab:gray", linewidth=0)
-            plt.fill_between(days_x, lu_agc, up_agc, alpha=0.25, color="tab:purple", linewidth=0)
-            plt.fill_between(days_x, lu_agd, up_agd, alpha=0.25, color="tab:orange", linewidth=0)
-
-            plt.plot([min_x, max_x], [1, 1], "--", linewidth=0.5, color="lightgrey")
+            plt.fill_between(days_x, lu_base, up_base, alpha=0.15, color="tab:red", linewidth=0, zorder=-1)
 
-            plt.ylim([0.5, 2])
+            plt.ylim([0, 6])
             plt.xlim([min_x, max_x])
-            plt.ylabel("Growth")
+            plt.ylabel("R")
             locs = np.arange(min_x, max_x, 7)
             xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
             plt.xticks(locs, xlabels, rotation=-30)
-            plt.title(f"Region {region}")
+            plt.title(f"{self.d.RNames[region][0]}")
             ax3 = add_cms_to_plot(ax2, self.d.ActiveCMs, country_indx, min_x, max_x, days, plot_style)
 
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 3)
+            plt.subplot(n_rows, 3, 3 * (i % n_rows) + 3)
             axis_scale = 1.5
             ax4 = plt.gca()
+            z1c_m, lu_z1c, up_z1c, err_z1c = self.region_CIs("Z1C", country_indx)
+            z1d_m, lu_z1d, up_z1d, err_z1d = self.region_CIs("Z1D", country_indx)
 
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                np.exp(self.trace.ExpectedLogR[:, country_indx, :])
-            )
-            # z1C_mean, lu_z1C, up_z1C, err_1C = produce_CIs(self.trace.Z1C[:, country_indx, :])
-            # z1D_mean, lu_z1D, up_z1D, err_1D = produce_CIs(self.trace.Z1D[:, country_indx, :])
-            # # z2_mean, lu_z2, up_z2, err_2 = produce_CIs(self.trace.Z2[:, country_indx, :])
-            #
-            # plt.plot(days_x, z1C_mean, color="tab:purple", label="Growth Noise - Cases")
-            # plt.fill_between(
-            #     days_x, lu_z1C, up_z1C, alpha=0.25, color="tab:purple", linewidth=0
-            # )
-            # plt.plot(days_x, z1D_mean, color="tab:purple", label="Growth Noise - Deaths")
-            # plt.fill_between(
-            #     days_x, lu_z1D, up_z1D, alpha=0.25, color="tab:orange", linewidth=0
-            # )
-            #
-            # plt.xlim([min_x, max_x])
-            # plt.ylim([-2, 2])
-            # plt.xticks(locs, xlabels, rotation=-30)
-            # plt.ylabel("$Z$")
+            plt.plot(days_x, z1c_m, color="tab:purple", label="$\epsilon^{(C)}$")
+            plt.fill_between(days_x, lu_z1c, up_z1c, alpha=0.25, color="tab:purple", linewidth=0)
+            plt.plot(days_x, z1d_m, color="tab:orange", label="$\epsilon^{(D)}$")
+            plt.fill_between(days_x, lu_z1d, up_z1d, alpha=0.25, color="tab:orange", linewidth=0)
+            plt.xlim([min_x, max_x])
+            plt.ylim([-0.75, 0.75])
+            plt.plot([min_x, max_x], [0, 0], "--", linewidth=0.5, color="k")
+            plt.xticks(locs, xlabels, rotation=-30)
+            plt.ylabel("$\epsilon$")
 
             # ax4.twinx()
             # ax5 = plt.gca()
-            # plt.plot(self.ObservedDaysIndx, z2_mean, color="tab:orange", label="Death Noise")
+            #
+            # z2c_m, lu_z2c, up_z2c, err_z2c = produce_CIs(self.trace.ExpectedCases[:, country_indx, self.ObservedDaysIndx] - self.d.NewCases.data[country_indx, self.ObservedDaysIndx])
+            #
+            # plt.plot(self.ObservedDaysIndx, z2c_m, color="tab:orange", label="Cases Output Noise")
             # plt.fill_between(
             #     self.ObservedDaysIndx, lu_z2, up_z2, alpha=0.25, color="tab:orange", linewidth=0
             # )
@@ -1330,339 +1668,90 @@ class CMCombined_Final(BaseCMModel):
             sns.despine(ax=ax2)
             sns.despine(ax=ax3)
 
-            if country_indx % 5 == 4 or country_indx == len(self.d.Rs) - 1:
+            if i % n_rows == (n_rows - 1) or country_indx == len(self.d.Rs) - 1:
                 plt.tight_layout()
+                lines1, labels1 = ax.get_legend_handles_labels()
+                lines2, labels2 = ax2.get_legend_handles_labels()
+                lines3, labels3 = ax4.get_legend_handles_labels()
+                ax2.legend(lines1 + lines2 + lines3, labels1 + labels2 + labels3, prop={"size": 10}, loc=(0.55, 0.6),
+                           shadow=True,
+                           fancybox=True, ncol=5, bbox_to_anchor=(-1, -0.3))
+
                 if save_fig:
                     save_fig_pdf(
                         output_dir,
-                        f"CountryPredictionPlot{((country_indx + 1) / 5):.1f}",
+                        f"Fits{((country_indx + 1) / 5):.1f}"
                     )
 
-            elif country_indx == 0:
-                ax.legend(prop={"size": 8}, loc="center left")
-                ax2.legend(prop={"size": 8}, loc="lower left")
-                # ax4.legend(lines + lines2, labels + labels2, prop={"size": 8})
 
-    def plot_subset_region_predictions(self, region_indxs, plot_style, n_rows=3, fig_height=11, save_fig=True,
-                                       output_dir="./out"):
-        assert self.trace is not None
+class CMCombined_Final_DifDelays(BaseCMModel):
+    def __init__(
+            self, data, cm_plot_style=None, name="", model=None
+    ):
+        super().__init__(data, cm_plot_style, name=name, model=model)
 
-        for i, country_indx in enumerate(region_indxs):
+        # infection --> confirmed delay
+        self.DelayProbCasesShort = np.array([0., 0.04086903, 0.05623389, 0.07404812, 0.08464692,
+                                             0.08861931, 0.08750149, 0.08273123, 0.07575679, 0.06766597,
+                                             0.05910415, 0.05093048, 0.04321916, 0.03622008, 0.03000523,
+                                             0.02472037, 0.02016809, 0.01637281, 0.01318903, 0.01057912,
+                                             0.00844349, 0.0067064, 0.00529629, 0.00416558, 0.00327265,
+                                             0.00255511, 0.00200011, 0.00155583, 0.00120648, 0.00093964,
+                                             0.00072111, 0.00055606])
+        self.DelayProbCasesLong = np.array([0., 0.01690821, 0.02602795, 0.03772294, 0.0474657,
+                                            0.05484009, 0.05969648, 0.06231737, 0.06292536, 0.0619761,
+                                            0.05983904, 0.05677383, 0.05311211, 0.04914501, 0.04502909,
+                                            0.04085248, 0.03682251, 0.03290895, 0.02924259, 0.02585378,
+                                            0.02274018, 0.01993739, 0.01739687, 0.01511531, 0.01309569,
+                                            0.01130081, 0.00972391, 0.00832998, 0.00716289, 0.00610338,
+                                            0.00520349, 0.00443053])
 
-            region = self.d.Rs[country_indx]
+        self.DelayProbCases = np.stack([self.DelayProbCasesShort, self.DelayProbCasesLong]).reshape(
+            (2, 1, self.DelayProbCasesShort.size))
 
-            if i % n_rows == 0:
-                plt.figure(figsize=(10, fig_height), dpi=300)
+        self.DelayProbDeaths = np.array([0.00000000e+00, 2.24600347e-06, 3.90382088e-05, 2.34307085e-04,
+                                         7.83555003e-04, 1.91221622e-03, 3.78718437e-03, 6.45923913e-03,
+                                         9.94265709e-03, 1.40610714e-02, 1.86527920e-02, 2.34311421e-02,
+                                         2.81965055e-02, 3.27668001e-02, 3.68031574e-02, 4.03026198e-02,
+                                         4.30521951e-02, 4.50637136e-02, 4.63315047e-02, 4.68794406e-02,
+                                         4.67334059e-02, 4.59561441e-02, 4.47164503e-02, 4.29327455e-02,
+                                         4.08614522e-02, 3.85082076e-02, 3.60294203e-02, 3.34601703e-02,
+                                         3.08064505e-02, 2.81766028e-02, 2.56165924e-02, 2.31354369e-02,
+                                         2.07837267e-02, 1.86074383e-02, 1.65505661e-02, 1.46527043e-02,
+                                         1.29409383e-02, 1.13695920e-02, 9.93233881e-03, 8.66063386e-03,
+                                         7.53805464e-03, 6.51560047e-03, 5.63512264e-03, 4.84296166e-03,
+                                         4.14793478e-03, 3.56267297e-03, 3.03480656e-03, 2.59406730e-03,
+                                         2.19519042e-03, 1.85454286e-03, 1.58333238e-03, 1.33002321e-03,
+                                         1.11716435e-03, 9.35360376e-04, 7.87780158e-04, 6.58601602e-04,
+                                         5.48147154e-04, 4.58151351e-04, 3.85878963e-04, 3.21623249e-04,
+                                         2.66129174e-04, 2.21364768e-04, 1.80736566e-04, 1.52350196e-04])
+        self.DelayProbDeaths = self.DelayProbDeaths.reshape((1, self.DelayProbDeaths.size))
 
-            plt.subplot(n_rows, 3, 3 * (i % n_rows) + 1)
+        self.CMDelayCut = 30
+        self.DailyGrowthNoise = 0.2
 
-            means_ic, lu_ic, up_ic, err_ic = produce_CIs(
-                self.trace.InfectedCases[:, country_indx, :]
-            )
+        self.ObservedDaysIndx = np.arange(self.CMDelayCut, len(self.d.Ds))
+        self.OR_indxs = np.arange(len(self.d.Rs))
+        self.nORs = self.nRs
+        self.nODs = len(self.ObservedDaysIndx)
+        self.ORs = copy.deepcopy(self.d.Rs)
 
-            ec = self.trace.ExpectedCases[:, country_indx, :]
-            nS, nDs = ec.shape
-            dist = pm.NegativeBinomial.dist(mu=ec, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-            ec_output = dist.random()
+        testing_indx = self.d.CMs.index("Symptomatic Testing")
+        self.short_rs = np.nonzero(np.sum(data.ActiveCMs[:, testing_indx, :], axis=-1) > 1)[0]
+        self.long_rs = np.nonzero(np.sum(data.ActiveCMs[:, testing_indx, :], axis=-1) < 1)[0]
+        data.ActiveCMs[:, testing_indx, :] = 0
 
-            means_ec, lu_ec, up_ec, err_ec = produce_CIs(
-                ec_output
-            )
+        observed_active = []
+        for r in range(self.nRs):
+            for d in range(self.nDs):
+                # if its not masked, after the cut, and not before 100 confirmed
+                if self.d.NewCases.mask[r, d] == False and d > self.CMDelayCut and not np.isnan(
+                        self.d.Confirmed.data[r, d]) and d < (self.nDs - 7):
+                    observed_active.append(r * self.nDs + d)
+                else:
+                    self.d.NewCases.mask[r, d] = True
 
-            ed = self.trace.ExpectedDeaths[:, country_indx, :]
-            nS, nDs = ed.shape
-            dist = pm.NegativeBinomial.dist(mu=ed + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-
-            ids = self.trace.InfectedDeaths[:, country_indx, :]
-            try:
-                ed_output = dist.random()
-            except:
-                print("hi?")
-                print(region)
-                ed_output = np.ones_like(ids) * 10 ** -5
-                ids = np.ones_like(ids) * 10 ** -5
-
-            # if np.isnan(self.d.Deaths.data[country_indx, -1]):
-            #     ed_output = np.ones_like(ids) * 10 ** -5
-            #     ids = np.ones_like(ids) * 10 ** -5
-
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                ids
-            )
-
-            means_ed, lu_ed, up_ed, err_ed = produce_CIs(
-                ed_output
-            )
-
-            days = self.d.Ds
-            days_x = np.arange(len(days))
-
-            min_x = 25
-            max_x = len(days) - 1
-
-            newcases = self.d.NewCases[country_indx, :]
-            deaths = self.d.NewDeaths[country_indx, :]
-
-            ax = plt.gca()
-            plt.plot(
-                days_x,
-                means_ic,
-                label="Daily Infected - Cases",
-                zorder=1,
-                color="tab:purple",
-                alpha=0.25
-            )
-
-            plt.fill_between(
-                days_x, lu_ic, up_ic, alpha=0.15, color="tab:purple", linewidth=0
-            )
-
-            plt.plot(
-                days_x,
-                means_ec,
-                label="Estimated New Cases",
-                zorder=2,
-                color="tab:blue"
-            )
-
-            plt.fill_between(
-                days_x, lu_ec, up_ec, alpha=0.25, color="tab:blue", linewidth=0
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                newcases[self.ObservedDaysIndx],
-                label="New Cases (Smoothed)",
-                marker="o",
-                s=10,
-                color="tab:blue",
-                alpha=0.9,
-                zorder=3,
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                newcases.data[self.ObservedDaysIndx],
-                label="New Cases (Smoothed)",
-                marker="o",
-                s=10,
-                color="tab:blue",
-                alpha=0.9,
-                zorder=4,
-                facecolor="white"
-            )
-
-            plt.plot(
-                days_x,
-                means_id,
-                label="Daily Infected - Deaths",
-                zorder=1,
-                color="tab:orange",
-                alpha=0.25
-            )
-
-            plt.fill_between(
-                days_x, lu_id, up_id, alpha=0.15, color="tab:orange", linewidth=0
-            )
-
-            plt.plot(
-                days_x,
-                means_ed,
-                label="Estimated New Deaths",
-                zorder=2,
-                color="tab:red"
-            )
-
-            plt.fill_between(
-                days_x, lu_ed, up_ed, alpha=0.25, color="tab:red", linewidth=0
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                deaths[self.ObservedDaysIndx],
-                label="New Deaths (Smoothed)",
-                marker="o",
-                s=10,
-                color="tab:red",
-                alpha=0.9,
-                zorder=3,
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                deaths.data[self.ObservedDaysIndx],
-                label="New Deaths (Smoothed)",
-                marker="o",
-                s=10,
-                color="tab:red",
-                alpha=0.9,
-                zorder=4,
-                facecolor="white"
-            )
-
-            ax.set_yscale("log")
-            plt.xlim([min_x, max_x])
-            tick_vals = np.arange(7)
-            plt.ylim([10 ** 0, 10 ** 6])
-            plt.yticks(np.power(10.0, tick_vals),
-                       [f"${np.power(10.0, loc):.0f}$" if loc < 2 else f"$10^{loc}$" for loc in tick_vals])
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            plt.xticks(locs, xlabels, rotation=-30)
-            ax1 = add_cms_to_plot(ax, self.d.ActiveCMs, country_indx, min_x, max_x, days, plot_style)
-
-            plt.subplot(n_rows, 3, 3 * (i % n_rows) + 2)
-
-            ax2 = plt.gca()
-
-            means_g, lu_g, up_g, err_g = produce_CIs(
-                np.exp(self.trace.ExpectedLogR[:, country_indx, :])
-            )
-
-            means_base, lu_base, up_base, err_base = produce_CIs(
-                np.exp(self.trace.RegionLogR[:, country_indx])
-            )
-
-            plt.plot(days_x, means_g, zorder=1, color="tab:gray", label="$R_{t}$")
-            plt.plot([min_x, max_x], [means_base, means_base], "--", zorder=-1, label="$R_0$", color="tab:red",
-                     linewidth=0.75)
-            # plt.plot(days_x, med_agd, "--", color="tab:orange")
-
-            plt.fill_between(days_x, lu_g, up_g, alpha=0.25, color="tab:gray", linewidth=0)
-            plt.fill_between(days_x, lu_base, up_base, alpha=0.15, color="tab:red", linewidth=0, zorder=-1)
-
-            plt.ylim([0, 6])
-            plt.xlim([min_x, max_x])
-            plt.ylabel("R")
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            plt.xticks(locs, xlabels, rotation=-30)
-            plt.title(f"{self.d.RNames[region][0]}")
-            ax3 = add_cms_to_plot(ax2, self.d.ActiveCMs, country_indx, min_x, max_x, days, plot_style)
-
-            plt.subplot(n_rows, 3, 3 * (i % n_rows) + 3)
-            axis_scale = 1.5
-            ax4 = plt.gca()
-            z1c_m, lu_z1c, up_z1c, err_z1c = produce_CIs(self.trace.Z1C[:, country_indx, :])
-            z1d_m, lu_z1d, up_z1d, err_z1d = produce_CIs(self.trace.Z1D[:, country_indx, :])
-
-            plt.plot(days_x, z1c_m, color="tab:purple", label="$\epsilon^{(C)}$")
-            plt.fill_between(days_x, lu_z1c, up_z1c, alpha=0.25, color="tab:purple", linewidth=0)
-            plt.plot(days_x, z1d_m, color="tab:orange", label="$\epsilon^{(D)}$")
-            plt.fill_between(days_x, lu_z1d, up_z1d, alpha=0.25, color="tab:orange", linewidth=0)
-            plt.xlim([min_x, max_x])
-            plt.ylim([-0.75, 0.75])
-            plt.plot([min_x, max_x], [0, 0], "--", linewidth=0.5, color="k")
-            plt.xticks(locs, xlabels, rotation=-30)
-            plt.ylabel("$\epsilon$")
-
-            # ax4.twinx()
-            # ax5 = plt.gca()
-            #
-            # z2c_m, lu_z2c, up_z2c, err_z2c = produce_CIs(self.trace.ExpectedCases[:, country_indx, self.ObservedDaysIndx] - self.d.NewCases.data[country_indx, self.ObservedDaysIndx])
-            #
-            # plt.plot(self.ObservedDaysIndx, z2c_m, color="tab:orange", label="Cases Output Noise")
-            # plt.fill_between(
-            #     self.ObservedDaysIndx, lu_z2, up_z2, alpha=0.25, color="tab:orange", linewidth=0
-            # )
-            # y_lim = max(np.max(np.abs(up_z2)), np.max(np.abs(lu_z2)))
-            # plt.ylim([-1.5 * y_lim, 1.5 * y_lim])
-
-            plt.xlim([min_x, max_x])
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            lines, labels = ax4.get_legend_handles_labels()
-            # lines2, labels2 = ax5.get_legend_handles_labels()
-
-            sns.despine(ax=ax)
-            sns.despine(ax=ax1)
-            sns.despine(ax=ax2)
-            sns.despine(ax=ax3)
-
-            if i % n_rows == (n_rows - 1) or country_indx == len(self.d.Rs) - 1:
-                plt.tight_layout()
-                lines1, labels1 = ax.get_legend_handles_labels()
-                lines2, labels2 = ax2.get_legend_handles_labels()
-                lines3, labels3 = ax4.get_legend_handles_labels()
-                ax2.legend(lines1 + lines2 + lines3, labels1 + labels2 + labels3, prop={"size": 10}, loc=(0.55, 0.6),
-                           shadow=True,
-                           fancybox=True, ncol=5, bbox_to_anchor=(-1, -0.3))
-
-                if save_fig:
-                    save_fig_pdf(
-                        output_dir,
-                        f"Fits{((country_indx + 1) / 5):.1f}"
-                    )
-
-
-class CMCombined_Final_DifDelays(BaseCMModel):
-    def __init__(
-            self, data, cm_plot_style=None, name="", model=None
-    ):
-        super().__init__(data, cm_plot_style, name=name, model=model)
-
-        # infection --> confirmed delay
-        self.DelayProbCasesShort = np.array([0., 0.04086903, 0.05623389, 0.07404812, 0.08464692,
-                                             0.08861931, 0.08750149, 0.08273123, 0.07575679, 0.06766597,
-                                             0.05910415, 0.05093048, 0.04321916, 0.03622008, 0.03000523,
-                                             0.02472037, 0.02016809, 0.01637281, 0.01318903, 0.01057912,
-                                             0.00844349, 0.0067064, 0.00529629, 0.00416558, 0.00327265,
-                                             0.00255511, 0.00200011, 0.00155583, 0.00120648, 0.00093964,
-                                             0.00072111, 0.00055606])
-        self.DelayProbCasesLong = np.array([0., 0.01690821, 0.02602795, 0.03772294, 0.0474657,
-                                            0.05484009, 0.05969648, 0.06231737, 0.06292536, 0.0619761,
-                                            0.05983904, 0.05677383, 0.05311211, 0.04914501, 0.04502909,
-                                            0.04085248, 0.03682251, 0.03290895, 0.02924259, 0.02585378,
-                                            0.02274018, 0.01993739, 0.01739687, 0.01511531, 0.01309569,
-                                            0.01130081, 0.00972391, 0.00832998, 0.00716289, 0.00610338,
-                                            0.00520349, 0.00443053])
-
-        self.DelayProbCases = np.stack([self.DelayProbCasesShort, self.DelayProbCasesLong]).reshape(
-            (2, 1, self.DelayProbCasesShort.size))
-
-        self.DelayProbDeaths = np.array([0.00000000e+00, 2.24600347e-06, 3.90382088e-05, 2.34307085e-04,
-                                         7.83555003e-04, 1.91221622e-03, 3.78718437e-03, 6.45923913e-03,
-                                         9.94265709e-03, 1.40610714e-02, 1.86527920e-02, 2.34311421e-02,
-                                         2.81965055e-02, 3.27668001e-02, 3.68031574e-02, 4.03026198e-02,
-                                         4.30521951e-02, 4.50637136e-02, 4.63315047e-02, 4.68794406e-02,
-                                         4.67334059e-02, 4.59561441e-02, 4.47164503e-02, 4.29327455e-02,
-                                         4.08614522e-02, 3.85082076e-02, 3.60294203e-02, 3.34601703e-02,
-                                         3.08064505e-02, 2.81766028e-02, 2.56165924e-02, 2.31354369e-02,
-                                         2.07837267e-02, 1.86074383e-02, 1.65505661e-02, 1.46527043e-02,
-                                         1.29409383e-02, 1.13695920e-02, 9.93233881e-03, 8.66063386e-03,
-                                         7.53805464e-03, 6.51560047e-03, 5.63512264e-03, 4.84296166e-03,
-                                         4.14793478e-03, 3.56267297e-03, 3.03480656e-03, 2.59406730e-03,
-                                         2.19519042e-03, 1.85454286e-03, 1.58333238e-03, 1.33002321e-03,
-                                         1.11716435e-03, 9.35360376e-04, 7.87780158e-04, 6.58601602e-04,
-                                         5.48147154e-04, 4.58151351e-04, 3.85878963e-04, 3.21623249e-04,
-                                         2.66129174e-04, 2.21364768e-04, 1.80736566e-04, 1.52350196e-04])
-        self.DelayProbDeaths = self.DelayProbDeaths.reshape((1, self.DelayProbDeaths.size))
-
-        self.CMDelayCut = 30
-        self.DailyGrowthNoise = 0.2
-
-        self.ObservedDaysIndx = np.arange(self.CMDelayCut, len(self.d.Ds))
-        self.OR_indxs = np.arange(len(self.d.Rs))
-        self.nORs = self.nRs
-        self.nODs = len(self.ObservedDaysIndx)
-        self.ORs = copy.deepcopy(self.d.Rs)
-
-        testing_indx = self.d.CMs.index("Symptomatic Testing")
-        self.short_rs = np.nonzero(np.sum(data.ActiveCMs[:, testing_indx, :], axis=-1) > 1)[0]
-        self.long_rs = np.nonzero(np.sum(data.ActiveCMs[:, testing_indx, :], axis=-1) < 1)[0]
-        data.ActiveCMs[:, testing_indx, :] = 0
-
-        observed_active = []
-        for r in range(self.nRs):
-            for d in range(self.nDs):
-                # if its not masked, after the cut, and not before 100 confirmed
-                if self.d.NewCases.mask[r, d] == False and d > self.CMDelayCut and not np.isnan(
-                        self.d.Confirmed.data[r, d]) and d < (self.nDs - 7):
-                    observed_active.append(r * self.nDs + d)
-                else:
-                    self.d.NewCases.mask[r, d] = True
-
-        self.all_observed_active = np.array(observed_active)
+        self.all_observed_active = np.array(observed_active)
 
         observed_deaths = []
         for r in range(self.nRs):
@@ -1677,7 +1766,8 @@ class CMCombined_Final_DifDelays(BaseCMModel):
         self.all_observed_deaths = np.array(observed_deaths)
 
     def build_model(self, R_hyperprior_mean=3.25, cm_prior_sigma=0.2, cm_prior='normal',
-                    serial_interval_mean=SI_ALPHA / SI_BETA, conf_noise=None, deaths_noise=None
+                    serial_interval_mean=SI_ALPHA / SI_BETA, conf_noise=None, deaths_noise=None,
+                    growth_noise="default"
                     ):
         with self.model:
             if cm_prior == 'normal':
@@ -1723,21 +1813,29 @@ class CMCombined_Final_DifDelays(BaseCMModel):
                                            plot_trace=False
                                            )
 
-            self.Normal(
-                "GrowthCases",
-                self.ExpectedGrowth,
-                self.DailyGrowthNoise,
-                shape=(self.nORs, self.nDs),
-                plot_trace=False,
-            )
-
-            self.Normal(
-                "GrowthDeaths",
-                self.ExpectedGrowth,
-                self.DailyGrowthNoise,
-                shape=(self.nORs, self.nDs),
-                plot_trace=False,
-            )
+            if growth_noise == "default":
+                self.Normal(
+                    "GrowthCases",
+                    self.ExpectedGrowth,
+                    self.DailyGrowthNoise,
+                    shape=(self.nORs, self.nDs),
+                    plot_trace=False,
+                )
+            else:
+                self.Det("GrowthCases", self.ExpectedGrowth + self.GrowthNoise("GrowthCasesNoise", growth_noise),
+                         plot_trace=False)
+
+            if growth_noise == "default":
+                self.Normal(
+                    "GrowthDeaths",
+                    self.ExpectedGrowth,
+                    self.DailyGrowthNoise,
+                    shape=(self.nORs, self.nDs),
+                    plot_trace=False,
+                )
+            else:
+                self.Det("GrowthDeaths", self.ExpectedGrowth + self.GrowthNoise("GrowthDeathsNoise", growth_noise),
+                         plot_trace=False)
 
 
             self.InitialSizeCases_log = pm.Normal("InitialSizeCases_log", 0, 50, shape=(self.nORs,))
@@ -1806,293 +1904,44 @@ class CMCombined_Final_DifDelays(BaseCMModel):
             )[:, :self.nDs]
 
             self.ExpectedDeaths = pm.Deterministic("ExpectedDeaths", expected_deaths.reshape(
-                (self.nORs, self.nDs)))
-
-            # can use learned or fixed deaths noise
-            if deaths_noise is None:
-                if conf_noise is not None:
-                    # learn the output noise for this
-                    self.Phi = pm.HalfNormal("Phi_1", 5)
-
-                # effectively handle missing values ourselves
-                self.ObservedDeaths = pm.NegativeBinomial(
-                    "ObservedDeaths",
-                    mu=self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths],
-                    alpha=self.Phi,
-                    shape=(len(self.all_observed_deaths),),
-                    observed=self.d.NewDeaths.data.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
-                )
-            else:
-                # effectively handle missing values ourselves
-                self.ObservedDeaths = pm.NegativeBinomial(
-                    "ObservedDeaths",
-                    mu=self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths],
-                    alpha=deaths_noise,
-                    shape=(len(self.all_observed_deaths),),
-                    observed=self.d.NewDeaths.data.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
-                )
-
-            self.Det(
-                "Z2D",
-                self.ObservedDeaths - self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
-            )
-
-    def plot_region_predictions(self, plot_style, save_fig=True, output_dir="./out"):
-        assert self.trace is not None
-
-        for country_indx, region in zip(self.OR_indxs, self.ORs):
-
-            if country_indx % 5 == 0:
-                plt.figure(figsize=(12, 20), dpi=300)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 1)
-
-            means_ic, lu_ic, up_ic, err_ic = produce_CIs(
-                self.trace.InfectedCases[:, country_indx, :]
-            )
-
-            ec = self.trace.ExpectedCases[:, country_indx, :]
-            nS, nDs = ec.shape
-            dist = pm.NegativeBinomial.dist(mu=ec + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-            # dist = pm.NegativeBinomial.dist(mu=ec, alpha=30)
-            ec_output = dist.random()
-
-            means_ec, lu_ec, up_ec, err_ec = produce_CIs(
-                ec_output
-            )
-
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                self.trace.InfectedDeaths[:, country_indx, :]
-            )
-
-            ed = self.trace.ExpectedDeaths[:, country_indx, :]
-            nS, nDs = ed.shape
-            dist = pm.NegativeBinomial.dist(mu=ed + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-
-            dist = pm.NegativeBinomial.dist(mu=ed, alpha=30)
-            try:
-                ed_output = dist.random()
-            except:
-                print(region)
-                ed_output = ed
-
-            means_ed, lu_ed, up_ed, err_ed = produce_CIs(
-                ed_output
-            )
-
-            days = self.d.Ds
-            days_x = np.arange(len(days))
-
-            min_x = 25
-            max_x = len(days) - 1
-
-            newcases = self.d.NewCases[country_indx, :]
-            deaths = self.d.NewDeaths[country_indx, :]
-
-            ax = plt.gca()
-            plt.plot(
-                days_x,
-                means_ic,
-                label="Daily Infected - Cases",
-                zorder=1,
-                color="tab:purple",
-                alpha=0.25
-            )
-
-            plt.fill_between(
-                days_x, lu_ic, up_ic, alpha=0.15, color="tab:purple", linewidth=0
-            )
-
-            plt.plot(
-                days_x,
-                means_ec,
-                label="Predicted New Cases",
-                zorder=2,
-                color="tab:blue"
-            )
-
-            plt.fill_between(
-                days_x, lu_ec, up_ec, alpha=0.25, color="tab:blue", linewidth=0
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                newcases[self.ObservedDaysIndx],
-                label="Recorded New Cases",
-                marker="o",
-                s=10,
-                color="tab:green",
-                alpha=0.9,
-                zorder=3,
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                newcases[self.ObservedDaysIndx].data,
-                label="Heldout New Cases",
-                marker="o",
-                s=12,
-                edgecolor="tab:green",
-                facecolor="white",
-                linewidth=1,
-                alpha=0.9,
-                zorder=2,
-            )
-
-            plt.plot(
-                days_x,
-                means_id,
-                label="Daily Infected - Deaths",
-                zorder=1,
-                color="tab:orange",
-                alpha=0.25
-            )
-
-            plt.fill_between(
-                days_x, lu_id, up_id, alpha=0.15, color="tab:orange", linewidth=0
-            )
-
-            plt.plot(
-                days_x,
-                means_ed,
-                label="Predicted Deaths",
-                zorder=2,
-                color="tab:red"
-            )
-
-            plt.fill_between(
-                days_x, lu_ed, up_ed, alpha=0.25, color="tab:red", linewidth=0
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                deaths[self.ObservedDaysIndx],
-                label="Recorded Deaths",
-                marker="o",
-                s=10,
-                color="tab:gray",
-                alpha=0.9,
-                zorder=3,
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                deaths[self.ObservedDaysIndx].data,
-                label="Recorded Heldout Deaths",
-                marker="o",
-                s=12,
-                edgecolor="tab:gray",
-                facecolor="white",
-                linewidth=1,
-                alpha=0.9,
-                zorder=2,
-            )
-
-            ax.set_yscale("log")
-            plt.xlim([min_x, max_x])
-            plt.ylim([10 ** 0, 10 ** 6])
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            plt.xticks(locs, xlabels, rotation=-30)
-            ax1 = add_cms_to_plot(ax, self.d.ActiveCMs, country_indx, min_x, max_x, days, plot_style)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 2)
-
-            ax2 = plt.gca()
-
-            means_g, lu_g, up_g, err_g = produce_CIs(
-                np.exp(self.trace.ExpectedGrowth[:, country_indx, :])
-            )
-
-            means_agc, lu_agc, up_agc, err_agc = produce_CIs(
-                np.exp(self.trace.GrowthCases[:, country_indx, :])
-            )
-
-            means_agd, lu_agd, up_agd, err_agd = produce_CIs(
-                np.exp(self.trace.GrowthDeaths[:, country_indx, :])
-            )
-
-            med_agc = np.percentile(np.exp(self.trace.GrowthCases[:, country_indx, :]), 50, axis=0)
-            med_agd = np.percentile(np.exp(self.trace.GrowthDeaths[:, country_indx, :]), 50, axis=0)
-
-            plt.plot(days_x, means_g, label="Predicted Growth", zorder=1, color="tab:gray")
-            plt.plot(days_x, means_agc, label="Corrupted Growth - Cases", zorder=1, color="tab:purple")
-            # plt.plot(days_x, med_agc, "--", color="tab:purple")
-            plt.plot(days_x, means_agd, label="Corrupted Growth - Deaths", zorder=1, color="tab:orange")
-            # plt.plot(days_x, med_agd, "--", color="tab:orange")
-
-            plt.fill_between(days_x, lu_g, up_g, alpha=0.25, color="tab:gray", linewidth=0)
-            plt.fill_between(days_x, lu_agc, up_agc, alpha=0.25, color="tab:purple", linewidth=0)
-            plt.fill_between(days_x, lu_agd, up_agd, alpha=0.25, color="tab:orange", linewidth=0)
-
-            plt.plot([min_x, max_x], [1, 1], "--", linewidth=0.5, color="lightgrey")
-
-            plt.ylim([0.5, 2])
-            plt.xlim([min_x, max_x])
-            plt.ylabel("Growth")
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            plt.xticks(locs, xlabels, rotation=-30)
-            plt.title(f"Region {region}")
-            ax3 = add_cms_to_plot(ax2, self.d.ActiveCMs, country_indx, min_x, max_x, days, plot_style)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 3)
-            axis_scale = 1.5
-            ax4 = plt.gca()
-
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                np.exp(self.trace.ExpectedLogR[:, country_indx, :])
-            )
-            # z1C_mean, lu_z1C, up_z1C, err_1C = produce_CIs(self.trace.Z1C[:, country_indx, :])
-            # z1D_mean, lu_z1D, up_z1D, err_1D = produce_CIs(self.trace.Z1D[:, country_indx, :])
-            # # z2_mean, lu_z2, up_z2, err_2 = produce_CIs(self.trace.Z2[:, country_indx, :])
-            #
-            # plt.plot(days_x, z1C_mean, color="tab:purple", label="Growth Noise - Cases")
-            # plt.fill_between(
-            #     days_x, lu_z1C, up_z1C, alpha=0.25, color="tab:purple", linewidth=0
-            # )
-            # plt.plot(days_x, z1D_mean, color="tab:purple", label="Growth Noise - Deaths")
-            # plt.fill_between(
-            #     days_x, lu_z1D, up_z1D, alpha=0.25, color="tab:orange", linewidth=0
-            # )
-            #
-            # plt.xlim([min_x, max_x])
-            # plt.ylim([-2, 2])
-            # plt.xticks(locs, xlabels, rotation=-30)
-            # plt.ylabel("$Z$")
-
-            # ax4.twinx()
-            # ax5 = plt.gca()
-            # plt.plot(self.ObservedDaysIndx, z2_mean, color="tab:orange", label="Death Noise")
-            # plt.fill_between(
-            #     self.ObservedDaysIndx, lu_z2, up_z2, alpha=0.25, color="tab:orange", linewidth=0
-            # )
-            # y_lim = max(np.max(np.abs(up_z2)), np.max(np.abs(lu_z2)))
-            # plt.ylim([-1.5 * y_lim, 1.5 * y_lim])
+                (self.nORs, self.nDs)))
 
-            plt.xlim([min_x, max_x])
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            lines, labels = ax4.get_legend_handles_labels()
-            # lines2, labels2 = ax5.get_legend_handles_labels()
+            # can use learned or fixed deaths noise
+            if deaths_noise is None:
+                if conf_noise is not None:
+                    # learn the output noise for this
+                    self.Phi = pm.HalfNormal("Phi_1", 5)
 
-            sns.despine(ax=ax)
-            sns.despine(ax=ax1)
-            sns.despine(ax=ax2)
-            sns.despine(ax=ax3)
+                # effectively handle missing values ourselves
+                self.ObservedDeaths = pm.NegativeBinomial(
+                    "ObservedDeaths",
+                    mu=self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths],
+                    alpha=self.Phi,
+                    shape=(len(self.all_observed_deaths),),
+                    observed=self.d.NewDeaths.data.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
+                )
+            else:
+                # effectively handle missing values ourselves
+                self.ObservedDeaths = pm.NegativeBinomial(
+                    "ObservedDeaths",
+                    mu=self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths],
+                    alpha=deaths_noise,
+                    shape=(len(self.all_observed_deaths),),
+                    observed=self.d.NewDeaths.data.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
+                )
 
-            if country_indx % 5 == 4 or country_indx == len(self.d.Rs) - 1:
-                plt.tight_layout()
-                if save_fig:
-                    save_fig_pdf(
-                        output_dir,
-                        f"CountryPredictionPlot{((country_indx + 1) / 5):.1f}",
-                    )
+            self.Det(
+                "Z2D",
+                self.ObservedDeaths - self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
+            )
 
-            elif country_indx == 0:
-                ax.legend(prop={"size": 8}, loc="center left")
-                ax2.legend(prop={"size": 8}, loc="lower left")
-                # ax4.legend(lines + lines2, labels + labels2, prop={"size": 8})
+    def plot_region_predictions(self, plot_style, save_fig=True, output_dir="./out", n_workers=1):
+        """
+        Plot the predicted and observed cases, deaths and growth of each region, on pages of 5 regions.
+
+        :param n_workers: processes rendering the saved pages in parallel, see render_region_predictions
+        """
+        render_region_predictions(self, plot_style, save_fig, output_dir, n_workers)
 
     def plot_subset_region_predictions(self, region_indxs, plot_style, n_rows=3, fig_height=11, save_fig=True,
                                        output_dir="./out"):
@@ -2107,28 +1956,13 @@ class CMCombined_Final_DifDelays(BaseCMModel):
 
             plt.subplot(n_rows, 3, 3 * (i % n_rows) + 1)
 
-            means_ic, lu_ic, up_ic, err_ic = produce_CIs(
-                self.trace.InfectedCases[:, country_indx, :]
-            )
-
-            ec = self.trace.ExpectedCases[:, country_indx, :]
-            nS, nDs = ec.shape
-            dist = pm.NegativeBinomial.dist(mu=ec, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-            ec_output = dist.random()
-
-            means_ec, lu_ec, up_ec, err_ec = produce_CIs(
-                ec_output
-            )
+            means_ic, lu_ic, up_ic, err_ic = self.region_CIs("InfectedCases", country_indx)
 
-            ed = self.trace.ExpectedDeaths[:, country_indx, :]
-            nS, nDs = ed.shape
-            dist = pm.NegativeBinomial.dist(mu=ed + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
+            means_ec, lu_ec, up_ec, err_ec = self.region_CIs("ExpectedCases", country_indx, predictive=True)
 
             ids = self.trace.InfectedDeaths[:, country_indx, :]
-            try:
-                ed_output = dist.random()
-            except:
-                print("hi?")
+            ed_output = self.posterior_predictive("ExpectedDeaths")[:, country_indx, :]
+            if not np.all(np.isfinite(ed_output)):
                 print(region)
                 ed_output = np.ones_like(ids) * 10 ** -5
                 ids = np.ones_like(ids) * 10 ** -5
@@ -2266,13 +2100,9 @@ class CMCombined_Final_DifDelays(BaseCMModel):
 
             ax2 = plt.gca()
 
-            means_g, lu_g, up_g, err_g = produce_CIs(
-                np.exp(self.trace.ExpectedLogR[:, country_indx, :])
-            )
+            means_g, lu_g, up_g, err_g = self.region_CIs("ExpectedLogR", country_indx, exp=True)
 
-            means_base, lu_base, up_base, err_base = produce_CIs(
-                np.exp(self.trace.RegionLogR[:, country_indx])
-            )
+            means_base, lu_base, up_base, err_base = self.region_CIs("RegionLogR", country_indx, exp=True)
 
             plt.plot(days_x, means_g, zorder=1, color="tab:gray", label="$R_{t}$")
             plt.plot([min_x, max_x], [means_base, means_base], "--", zorder=-1, label="$R_0$", color="tab:red",
@@ -2294,8 +2124,8 @@ class CMCombined_Final_DifDelays(BaseCMModel):
             plt.subplot(n_rows, 3, 3 * (i % n_rows) + 3)
             axis_scale = 1.5
             ax4 = plt.gca()
-            z1c_m, lu_z1c, up_z1c, err_z1c = produce_CIs(self.trace.Z1C[:, country_indx, :])
-            z1d_m, lu_z1d, up_z1d, err_z1d = produce_CIs(self.trace.Z1D[:, country_indx, :])
+            z1c_m, lu_z1c, up_z1c, err_z1c = self.region_CIs("Z1C", country_indx)
+            z1d_m, lu_z1d, up_z1d, err_z1d = self.region_CIs("Z1D", country_indx)
 
             plt.plot(days_x, z1c_m, color="tab:purple", label="$\epsilon^{(C)}$")
             plt.fill_between(days_x, lu_z1c, up_z1c, alpha=0.25, color="tab:purple", linewidth=0)
@@ -2524,276 +2354,27 @@ class CMCombined_Final_V3(BaseCMModel):
             self.ExpectedDeaths = pm.Deterministic("ExpectedDeaths", expected_deaths.reshape(
                 (self.nORs, self.nDs)))
 
-            # effectively handle missing values ourselves
-            self.ObservedDeaths = pm.NegativeBinomial(
-                "ObservedDeaths",
-                mu=self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths],
-                alpha=self.Phi,
-                shape=(len(self.all_observed_deaths),),
-                observed=self.d.NewDeaths.data.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
-            )
-
-            self.Det(
-                "Z2D",
-                self.ObservedDeaths - self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
-            )
-
-    def plot_region_predictions(self, plot_style, save_fig=True, output_dir="./out"):
-        assert self.trace is not None
-
-        for country_indx, region in zip(self.OR_indxs, self.ORs):
-
-            if country_indx % 5 == 0:
-                plt.figure(figsize=(12, 20), dpi=300)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 1)
-
-            means_ic, lu_ic, up_ic, err_ic = produce_CIs(
-                self.trace.InfectedCases[:, country_indx, :]
-            )
-
-            ec = self.trace.ExpectedCases[:, country_indx, :]
-            nS, nDs = ec.shape
-            dist = pm.NegativeBinomial.dist(mu=ec + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-            # dist = pm.NegativeBinomial.dist(mu=ec, alpha=30)
-            ec_output = dist.random()
-
-            means_ec, lu_ec, up_ec, err_ec = produce_CIs(
-                ec_output
-            )
-
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                self.trace.InfectedDeaths[:, country_indx, :]
-            )
-
-            ed = self.trace.ExpectedDeaths[:, country_indx, :]
-            nS, nDs = ed.shape
-            dist = pm.NegativeBinomial.dist(mu=ed + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-
-            dist = pm.NegativeBinomial.dist(mu=ed, alpha=30)
-            try:
-                ed_output = dist.random()
-            except:
-                print(region)
-                ed_output = ed
-
-            means_ed, lu_ed, up_ed, err_ed = produce_CIs(
-                ed_output
-            )
-
-            days = self.d.Ds
-            days_x = np.arange(len(days))
-
-            min_x = 25
-            max_x = len(days) - 1
-
-            newcases = self.d.NewCases[country_indx, :]
-            deaths = self.d.NewDeaths[country_indx, :]
-
-            ax = plt.gca()
-            plt.plot(
-                days_x,
-                means_ic,
-                label="Daily Infected - Cases",
-                zorder=1,
-                color="tab:purple",
-                alpha=0.25
-            )
-
-            plt.fill_between(
-                days_x, lu_ic, up_ic, alpha=0.15, color="tab:purple", linewidth=0
-            )
-
-            plt.plot(
-                days_x,
-                means_ec,
-                label="Predicted New Cases",
-                zorder=2,
-                color="tab:blue"
-            )
-
-            plt.fill_between(
-                days_x, lu_ec, up_ec, alpha=0.25, color="tab:blue", linewidth=0
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                newcases[self.ObservedDaysIndx],
-                label="Recorded New Cases",
-                marker="o",
-                s=10,
-                color="tab:green",
-                alpha=0.9,
-                zorder=3,
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                newcases[self.ObservedDaysIndx].data,
-                label="Heldout New Cases",
-                marker="o",
-                s=12,
-                edgecolor="tab:green",
-                facecolor="white",
-                linewidth=1,
-                alpha=0.9,
-                zorder=2,
-            )
-
-            plt.plot(
-                days_x,
-                means_id,
-                label="Daily Infected - Deaths",
-                zorder=1,
-                color="tab:orange",
-                alpha=0.25
-            )
-
-            plt.fill_between(
-                days_x, lu_id, up_id, alpha=0.15, color="tab:orange", linewidth=0
-            )
-
-            plt.plot(
-                days_x,
-                means_ed,
-                label="Predicted Deaths",
-                zorder=2,
-                color="tab:red"
-            )
-
-            plt.fill_between(
-                days_x, lu_ed, up_ed, alpha=0.25, color="tab:red", linewidth=0
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                deaths[self.ObservedDaysIndx],
-                label="Recorded Deaths",
-                marker="o",
-                s=10,
-                color="tab:gray",
-                alpha=0.9,
-                zorder=3,
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                deaths[self.ObservedDaysIndx].data,
-                label="Recorded Heldout Deaths",
-                marker="o",
-                s=12,
-                edgecolor="tab:gray",
-                facecolor="white",
-                linewidth=1,
-                alpha=0.9,
-                zorder=2,
-            )
-
-            ax.set_yscale("log")
-            plt.xlim([min_x, max_x])
-            plt.ylim([10 ** 0, 10 ** 6])
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            plt.xticks(locs, xlabels, rotation=-30)
-            ax1 = add_cms_to_plot(ax, self.d.ActiveCMs, country_indx, min_x, max_x, days, plot_style)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 2)
-
-            ax2 = plt.gca()
-
-            means_g, lu_g, up_g, err_g = produce_CIs(
-                np.exp(self.trace.ExpectedGrowth[:, country_indx, :])
-            )
-
-            means_agc, lu_agc, up_agc, err_agc = produce_CIs(
-                np.exp(self.trace.GrowthCases[:, country_indx, :])
-            )
-
-            means_agd, lu_agd, up_agd, err_agd = produce_CIs(
-                np.exp(self.trace.GrowthDeaths[:, country_indx, :])
-            )
-
-            med_agc = np.percentile(np.exp(self.trace.GrowthCases[:, country_indx, :]), 50, axis=0)
-            med_agd = np.percentile(np.exp(self.trace.GrowthDeaths[:, country_indx, :]), 50, axis=0)
-
-            plt.plot(days_x, means_g, label="Predicted Growth", zorder=1, color="tab:gray")
-            plt.plot(days_x, means_agc, label="Corrupted Growth - Cases", zorder=1, color="tab:purple")
-            # plt.plot(days_x, med_agc, "--", color="tab:purple")
-            plt.plot(days_x, means_agd, label="Corrupted Growth - Deaths", zorder=1, color="tab:orange")
-            # plt.plot(days_x, med_agd, "--", color="tab:orange")
-
-            plt.fill_between(days_x, lu_g, up_g, alpha=0.25, color="tab:gray", linewidth=0)
-            plt.fill_between(days_x, lu_agc, up_agc, alpha=0.25, color="tab:purple", linewidth=0)
-            plt.fill_between(days_x, lu_agd, up_agd, alpha=0.25, color="tab:orange", linewidth=0)
-
-            plt.plot([min_x, max_x], [1, 1], "--", linewidth=0.5, color="lightgrey")
-
-            plt.ylim([0.5, 2])
-            plt.xlim([min_x, max_x])
-            plt.ylabel("Growth")
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            plt.xticks(locs, xlabels, rotation=-30)
-            plt.title(f"Region {region}")
-            ax3 = add_cms_to_plot(ax2, self.d.ActiveCMs, country_indx, min_x, max_x, days, plot_style)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 3)
-            axis_scale = 1.5
-            ax4 = plt.gca()
-
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                np.exp(self.trace.ExpectedLogR[:, country_indx, :])
-            )
-            # z1C_mean, lu_z1C, up_z1C, err_1C = produce_CIs(self.trace.Z1C[:, country_indx, :])
-            # z1D_mean, lu_z1D, up_z1D, err_1D = produce_CIs(self.trace.Z1D[:, country_indx, :])
-            # # z2_mean, lu_z2, up_z2, err_2 = produce_CIs(self.trace.Z2[:, country_indx, :])
-            #
-            # plt.plot(days_x, z1C_mean, color="tab:purple", label="Growth Noise - Cases")
-            # plt.fill_between(
-            #     days_x, lu_z1C, up_z1C, alpha=0.25, color="tab:purple", linewidth=0
-            # )
-            # plt.plot(days_x, z1D_mean, color="tab:purple", label="Growth Noise - Deaths")
-            # plt.fill_between(
-            #     days_x, lu_z1D, up_z1D, alpha=0.25, color="tab:orange", linewidth=0
-            # )
-            #
-            # plt.xlim([min_x, max_x])
-            # plt.ylim([-2, 2])
-            # plt.xticks(locs, xlabels, rotation=-30)
-            # plt.ylabel("$Z$")
-
-            # ax4.twinx()
-            # ax5 = plt.gca()
-            # plt.plot(self.ObservedDaysIndx, z2_mean, color="tab:orange", label="Death Noise")
-            # plt.fill_between(
-            #     self.ObservedDaysIndx, lu_z2, up_z2, alpha=0.25, color="tab:orange", linewidth=0
-            # )
-            # y_lim = max(np.max(np.abs(up_z2)), np.max(np.abs(lu_z2)))
-            # plt.ylim([-1.5 * y_lim, 1.5 * y_lim])
-
-            plt.xlim([min_x, max_x])
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            lines, labels = ax4.get_legend_handles_labels()
-            # lines2, labels2 = ax5.get_legend_handles_labels()
+            # effectively handle missing values ourselves
+            self.ObservedDeaths = pm.NegativeBinomial(
+                "ObservedDeaths",
+                mu=self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths],
+                alpha=self.Phi,
+                shape=(len(self.all_observed_deaths),),
+                observed=self.d.NewDeaths.data.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
+            )
 
-            sns.despine(ax=ax)
-            sns.despine(ax=ax1)
-            sns.despine(ax=ax2)
-            sns.despine(ax=ax3)
+            self.Det(
+                "Z2D",
+                self.ObservedDeaths - self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
+            )
 
-            if country_indx % 5 == 4 or country_indx == len(self.d.Rs) - 1:
-                plt.tight_layout()
-                if save_fig:
-                    save_fig_pdf(
-                        output_dir,
-                        f"CountryPredictionPlot{((country_indx + 1) / 5):.1f}",
-                    )
+    def plot_region_predictions(self, plot_style, save_fig=True, output_dir="./out", n_workers=1):
+        """
+        Plot the predicted and observed cases, deaths and growth of each region, on pages of 5 regions.
 
-            elif country_indx == 0:
-                ax.legend(prop={"size": 8}, loc="center left")
-                ax2.legend(prop={"size": 8}, loc="lower left")
-                # ax4.legend(lines + lines2, labels + labels2, prop={"size": 8})
+        :param n_workers: processes rendering the saved pages in parallel, see render_region_predictions
+        """
+        render_region_predictions(self, plot_style, save_fig, output_dir, n_workers)
 
     def plot_subset_region_predictions(self, region_indxs, plot_style, n_rows=3, fig_height=11, save_fig=True,
                                        output_dir="./out"):
@@ -2808,30 +2389,15 @@ class CMCombined_Final_V3(BaseCMModel):
 
             plt.subplot(n_rows, 3, 3 * (i % n_rows) + 1)
 
-            means_ic, lu_ic, up_ic, err_ic = produce_CIs(
-                self.trace.InfectedCases[:, country_indx, :]
-            )
-
-            ec = self.trace.ExpectedCases[:, country_indx, :]
-            nS, nDs = ec.shape
-            dist = pm.NegativeBinomial.dist(mu=ec, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-            ec_output = dist.random()
+            means_ic, lu_ic, up_ic, err_ic = self.region_CIs("InfectedCases", country_indx)
 
-            means_ec, lu_ec, up_ec, err_ec = produce_CIs(
-                ec_output
-            )
+            means_ec, lu_ec, up_ec, err_ec = self.region_CIs("ExpectedCases", country_indx, predictive=True)
 
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                self.trace.InfectedDeaths[:, country_indx, :]
-            )
+            means_id, lu_id, up_id, err_id = self.region_CIs("InfectedDeaths", country_indx)
 
             ed = self.trace.ExpectedDeaths[:, country_indx, :]
-            nS, nDs = ed.shape
-            dist = pm.NegativeBinomial.dist(mu=ed + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-
-            try:
-                ed_output = dist.random()
-            except:
+            ed_output = self.posterior_predictive("ExpectedDeaths")[:, country_indx, :]
+            if not np.all(np.isfinite(ed_output)):
                 print(region)
                 ed_output = ed
 
@@ -2936,13 +2502,9 @@ class CMCombined_Final_V3(BaseCMModel):
 
             ax2 = plt.gca()
 
-            means_g, lu_g, up_g, err_g = produce_CIs(
-                np.exp(self.trace.ExpectedLogR[:, country_indx, :])
-            )
+            means_g, lu_g, up_g, err_g = self.region_CIs("ExpectedLogR", country_indx, exp=True)
 
-            means_base, lu_base, up_base, err_base = produce_CIs(
-                np.exp(self.trace.RegionLogR[:, country_indx])
-            )
+            means_base, lu_base, up_base, err_base = self.region_CIs("RegionLogR", country_indx, exp=True)
 
             plt.plot(days_x, means_g, zorder=1, color="tab:gray", label="$R_{t}$")
             plt.plot([min_x, max_x], [means_base, means_base], "--", zorder=-1, label="$R_0$", color="tab:red",
@@ -2964,8 +2526,8 @@ class CMCombined_Final_V3(BaseCMModel):
             plt.subplot(n_rows, 3, 3 * (i % n_rows) + 3)
             axis_scale = 1.5
             ax4 = plt.gca()
-            z1c_m, lu_z1c, up_z1c, err_z1c = produce_CIs(self.trace.Z1C[:, country_indx, :])
-            z1d_m, lu_z1d, up_z1d, err_z1d = produce_CIs(self.trace.Z1D[:, country_indx, :])
+            z1c_m, lu_z1c, up_z1c, err_z1c = self.region_CIs("Z1C", country_indx)
+            z1d_m, lu_z1d, up_z1d, err_z1d = self.region_CIs("Z1D", country_indx)
 
             plt.plot(days_x, z1c_m, color="tab:purple", label="$\epsilon^{(C)}$")
             plt.fill_between(days_x, lu_z1c, up_z1c, alpha=0.25, color="tab:purple", linewidth=0)
@@ -3204,285 +2766,36 @@ class CMCombined_Final_NoNoise(BaseCMModel):
                     # learn the output noise for this
                     self.Phi = pm.HalfNormal("Phi_1", 5)
 
-                # effectively handle missing values ourselves
-                self.ObservedDeaths = pm.NegativeBinomial(
-                    "ObservedDeaths",
-                    mu=self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths],
-                    alpha=self.Phi,
-                    shape=(len(self.all_observed_deaths),),
-                    observed=self.d.NewDeaths.data.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
-                )
-            else:
-                # effectively handle missing values ourselves
-                self.ObservedDeaths = pm.NegativeBinomial(
-                    "ObservedDeaths",
-                    mu=self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths],
-                    alpha=deaths_noise,
-                    shape=(len(self.all_observed_deaths),),
-                    observed=self.d.NewDeaths.data.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
-                )
-
-            self.Det(
-                "Z2D",
-                self.ObservedDeaths - self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
-            )
-
-    def plot_region_predictions(self, plot_style, save_fig=True, output_dir="./out"):
-        assert self.trace is not None
-
-        for country_indx, region in zip(self.OR_indxs, self.ORs):
-
-            if country_indx % 5 == 0:
-                plt.figure(figsize=(12, 20), dpi=300)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 1)
-
-            means_ic, lu_ic, up_ic, err_ic = produce_CIs(
-                self.trace.InfectedCases[:, country_indx, :]
-            )
-
-            ec = self.trace.ExpectedCases[:, country_indx, :]
-            nS, nDs = ec.shape
-            dist = pm.NegativeBinomial.dist(mu=ec + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-            # dist = pm.NegativeBinomial.dist(mu=ec, alpha=30)
-            ec_output = dist.random()
-
-            means_ec, lu_ec, up_ec, err_ec = produce_CIs(
-                ec_output
-            )
-
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                self.trace.InfectedDeaths[:, country_indx, :]
-            )
-
-            ed = self.trace.ExpectedDeaths[:, country_indx, :]
-            nS, nDs = ed.shape
-            dist = pm.NegativeBinomial.dist(mu=ed + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-
-            dist = pm.NegativeBinomial.dist(mu=ed, alpha=30)
-            try:
-                ed_output = dist.random()
-            except:
-                print(region)
-                ed_output = ed
-
-            means_ed, lu_ed, up_ed, err_ed = produce_CIs(
-                ed_output
-            )
-
-            days = self.d.Ds
-            days_x = np.arange(len(days))
-
-            min_x = 25
-            max_x = len(days) - 1
-
-            newcases = self.d.NewCases[country_indx, :]
-            deaths = self.d.NewDeaths[country_indx, :]
-
-            ax = plt.gca()
-            plt.plot(
-                days_x,
-                means_ic,
-                label="Daily Infected - Cases",
-                zorder=1,
-                color="tab:purple",
-                alpha=0.25
-            )
-
-            plt.fill_between(
-                days_x, lu_ic, up_ic, alpha=0.15, color="tab:purple", linewidth=0
-            )
-
-            plt.plot(
-                days_x,
-                means_ec,
-                label="Predicted New Cases",
-                zorder=2,
-                color="tab:blue"
-            )
-
-            plt.fill_between(
-                days_x, lu_ec, up_ec, alpha=0.25, color="tab:blue", linewidth=0
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                newcases[self.ObservedDaysIndx],
-                label="Recorded New Cases",
-                marker="o",
-                s=10,
-                color="tab:green",
-                alpha=0.9,
-                zorder=3,
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                newcases[self.ObservedDaysIndx].data,
-                label="Heldout New Cases",
-                marker="o",
-                s=12,
-                edgecolor="tab:green",
-                facecolor="white",
-                linewidth=1,
-                alpha=0.9,
-                zorder=2,
-            )
-
-            plt.plot(
-                days_x,
-                means_id,
-                label="Daily Infected - Deaths",
-                zorder=1,
-                color="tab:orange",
-                alpha=0.25
-            )
-
-            plt.fill_between(
-                days_x, lu_id, up_id, alpha=0.15, color="tab:orange", linewidth=0
-            )
-
-            plt.plot(
-                days_x,
-                means_ed,
-                label="Predicted Deaths",
-                zorder=2,
-                color="tab:red"
-            )
-
-            plt.fill_between(
-                days_x, lu_ed, up_ed, alpha=0.25, color="tab:red", linewidth=0
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                deaths[self.ObservedDaysIndx],
-                label="Recorded Deaths",
-                marker="o",
-                s=10,
-                color="tab:gray",
-                alpha=0.9,
-                zorder=3,
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                deaths[self.ObservedDaysIndx].data,
-                label="Recorded Heldout Deaths",
-                marker="o",
-                s=12,
-                edgecolor="tab:gray",
-                facecolor="white",
-                linewidth=1,
-                alpha=0.9,
-                zorder=2,
-            )
-
-            ax.set_yscale("log")
-            plt.xlim([min_x, max_x])
-            plt.ylim([10 ** 0, 10 ** 6])
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            plt.xticks(locs, xlabels, rotation=-30)
-            ax1 = add_cms_to_plot(ax, self.d.ActiveCMs, country_indx, min_x, max_x, days, plot_style)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 2)
-
-            ax2 = plt.gca()
-
-            means_g, lu_g, up_g, err_g = produce_CIs(
-                np.exp(self.trace.ExpectedGrowth[:, country_indx, :])
-            )
-
-            means_agc, lu_agc, up_agc, err_agc = produce_CIs(
-                np.exp(self.trace.GrowthCases[:, country_indx, :])
-            )
-
-            means_agd, lu_agd, up_agd, err_agd = produce_CIs(
-                np.exp(self.trace.GrowthDeaths[:, country_indx, :])
-            )
-
-            med_agc = np.percentile(np.exp(self.trace.GrowthCases[:, country_indx, :]), 50, axis=0)
-            med_agd = np.percentile(np.exp(self.trace.GrowthDeaths[:, country_indx, :]), 50, axis=0)
-
-            plt.plot(days_x, means_g, label="Predicted Growth", zorder=1, color="tab:gray")
-            plt.plot(days_x, means_agc, label="Corrupted Growth - Cases", zorder=1, color="tab:purple")
-            # plt.plot(days_x, med_agc, "--", color="tab:purple")
-            plt.plot(days_x, means_agd, label="Corrupted Growth - Deaths", zorder=1, color="tab:orange")
-            # plt.plot(days_x, med_agd, "--", color="tab:orange")
-
-            plt.fill_between(days_x, lu_g, up_g, alpha=0.25, color="tab:gray", linewidth=0)
-            plt.fill_between(days_x, lu_agc, up_agc, alpha=0.25, color="tab:purple", linewidth=0)
-            plt.fill_between(days_x, lu_agd, up_agd, alpha=0.25, color="tab:orange", linewidth=0)
-
-            plt.plot([min_x, max_x], [1, 1], "--", linewidth=0.5, color="lightgrey")
-
-            plt.ylim([0.5, 2])
-            plt.xlim([min_x, max_x])
-            plt.ylabel("Growth")
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            plt.xticks(locs, xlabels, rotation=-30)
-            plt.title(f"Region {region}")
-            ax3 = add_cms_to_plot(ax2, self.d.ActiveCMs, country_indx, min_x, max_x, days, plot_style)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 3)
-            axis_scale = 1.5
-            ax4 = plt.gca()
-
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                np.exp(self.trace.ExpectedLogR[:, country_indx, :])
-            )
-            # z1C_mean, lu_z1C, up_z1C, err_1C = produce_CIs(self.trace.Z1C[:, country_indx, :])
-            # z1D_mean, lu_z1D, up_z1D, err_1D = produce_CIs(self.trace.Z1D[:, country_indx, :])
-            # # z2_mean, lu_z2, up_z2, err_2 = produce_CIs(self.trace.Z2[:, country_indx, :])
-            #
-            # plt.plot(days_x, z1C_mean, color="tab:purple", label="Growth Noise - Cases")
-            # plt.fill_between(
-            #     days_x, lu_z1C, up_z1C, alpha=0.25, color="tab:purple", linewidth=0
-            # )
-            # plt.plot(days_x, z1D_mean, color="tab:purple", label="Growth Noise - Deaths")
-            # plt.fill_between(
-            #     days_x, lu_z1D, up_z1D, alpha=0.25, color="tab:orange", linewidth=0
-            # )
-            #
-            # plt.xlim([min_x, max_x])
-            # plt.ylim([-2, 2])
-            # plt.xticks(locs, xlabels, rotation=-30)
-            # plt.ylabel("$Z$")
-
-            # ax4.twinx()
-            # ax5 = plt.gca()
-            # plt.plot(self.ObservedDaysIndx, z2_mean, color="tab:orange", label="Death Noise")
-            # plt.fill_between(
-            #     self.ObservedDaysIndx, lu_z2, up_z2, alpha=0.25, color="tab:orange", linewidth=0
-            # )
-            # y_lim = max(np.max(np.abs(up_z2)), np.max(np.abs(lu_z2)))
-            # plt.ylim([-1.5 * y_lim, 1.5 * y_lim])
-
-            plt.xlim([min_x, max_x])
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            lines, labels = ax4.get_legend_handles_labels()
-            # lines2, labels2 = ax5.get_legend_handles_labels()
-
-            sns.despine(ax=ax)
-            sns.despine(ax=ax1)
-            sns.despine(ax=ax2)
-            sns.despine(ax=ax3)
+                # effectively handle missing values ourselves
+                self.ObservedDeaths = pm.NegativeBinomial(
+                    "ObservedDeaths",
+                    mu=self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths],
+                    alpha=self.Phi,
+                    shape=(len(self.all_observed_deaths),),
+                    observed=self.d.NewDeaths.data.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
+                )
+            else:
+                # effectively handle missing values ourselves
+                self.ObservedDeaths = pm.NegativeBinomial(
+                    "ObservedDeaths",
+                    mu=self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths],
+                    alpha=deaths_noise,
+                    shape=(len(self.all_observed_deaths),),
+                    observed=self.d.NewDeaths.data.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
+                )
 
-            if country_indx % 5 == 4 or country_indx == len(self.d.Rs) - 1:
-                plt.tight_layout()
-                if save_fig:
-                    save_fig_pdf(
-                        output_dir,
-                        f"CountryPredictionPlot{((country_indx + 1) / 5):.1f}",
-                    )
+            self.Det(
+                "Z2D",
+                self.ObservedDeaths - self.ExpectedDeaths.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
+            )
 
-            elif country_indx == 0:
-                ax.legend(prop={"size": 8}, loc="center left")
-                ax2.legend(prop={"size": 8}, loc="lower left")
-                # ax4.legend(lines + lines2, labels + labels2, prop={"size": 8})
+    def plot_region_predictions(self, plot_style, save_fig=True, output_dir="./out", n_workers=1):
+        """
+        Plot the predicted and observed cases, deaths and growth of each region, on pages of 5 regions.
+
+        :param n_workers: processes rendering the saved pages in parallel, see render_region_predictions
+        """
+        render_region_predictions(self, plot_style, save_fig, output_dir, n_workers)
 
     def plot_subset_region_predictions(self, region_indxs, plot_style, n_rows=3, fig_height=11, save_fig=True,
                                        output_dir="./out"):
@@ -3497,28 +2810,13 @@ class CMCombined_Final_NoNoise(BaseCMModel):
 
             plt.subplot(n_rows, 3, 3 * (i % n_rows) + 1)
 
-            means_ic, lu_ic, up_ic, err_ic = produce_CIs(
-                self.trace.InfectedCases[:, country_indx, :]
-            )
-
-            ec = self.trace.ExpectedCases[:, country_indx, :]
-            nS, nDs = ec.shape
-            dist = pm.NegativeBinomial.dist(mu=ec, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-            ec_output = dist.random()
-
-            means_ec, lu_ec, up_ec, err_ec = produce_CIs(
-                ec_output
-            )
+            means_ic, lu_ic, up_ic, err_ic = self.region_CIs("InfectedCases", country_indx)
 
-            ed = self.trace.ExpectedDeaths[:, country_indx, :]
-            nS, nDs = ed.shape
-            dist = pm.NegativeBinomial.dist(mu=ed + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
+            means_ec, lu_ec, up_ec, err_ec = self.region_CIs("ExpectedCases", country_indx, predictive=True)
 
             ids = self.trace.InfectedDeaths[:, country_indx, :]
-            try:
-                ed_output = dist.random()
-            except:
-                print("hi?")
+            ed_output = self.posterior_predictive("ExpectedDeaths")[:, country_indx, :]
+            if not np.all(np.isfinite(ed_output)):
                 print(region)
                 ed_output = np.ones_like(ids) * 10 ** -5
                 ids = np.ones_like(ids) * 10 ** -5
@@ -3632,13 +2930,9 @@ class CMCombined_Final_NoNoise(BaseCMModel):
 
             ax2 = plt.gca()
 
-            means_g, lu_g, up_g, err_g = produce_CIs(
-                np.exp(self.trace.ExpectedLogR[:, country_indx, :])
-            )
+            means_g, lu_g, up_g, err_g = self.region_CIs("ExpectedLogR", country_indx, exp=True)
 
-            means_base, lu_base, up_base, err_base = produce_CIs(
-                np.exp(self.trace.RegionLogR[:, country_indx])
-            )
+            means_base, lu_base, up_base, err_base = self.region_CIs("RegionLogR", country_indx, exp=True)
 
             plt.plot(days_x, means_g, zorder=1, color="tab:gray", label="$R_{t}$")
             plt.plot([min_x, max_x], [means_base, means_base], "--", zorder=-1, label="$R_0$", color="tab:red",
@@ -3660,8 +2954,8 @@ class CMCombined_Final_NoNoise(BaseCMModel):
             plt.subplot(n_rows, 3, 3 * (i % n_rows) + 3)
             axis_scale = 1.5
             ax4 = plt.gca()
-            z1c_m, lu_z1c, up_z1c, err_z1c = produce_CIs(self.trace.Z1C[:, country_indx, :])
-            z1d_m, lu_z1d, up_z1d, err_z1d = produce_CIs(self.trace.Z1D[:, country_indx, :])
+            z1c_m, lu_z1c, up_z1c, err_z1c = self.region_CIs("Z1C", country_indx)
+            z1d_m, lu_z1d, up_z1d, err_z1d = self.region_CIs("Z1D", country_indx)
 
             plt.plot(days_x, z1c_m, color="tab:purple", label="$\epsilon^{(C)}$")
             plt.fill_between(days_x, lu_z1c, up_z1c, alpha=0.25, color="tab:purple", linewidth=0)
@@ -3781,7 +3075,7 @@ class CMCombined_Additive(BaseCMModel):
         self.all_observed_deaths = np.array(observed_deaths)
 
     def build_model(self, R_hyperprior_mean=3.25, cm_prior_conc=1,
-                    serial_interval_mean=SI_ALPHA / SI_BETA
+                    serial_interval_mean=SI_ALPHA / SI_BETA, growth_noise="default"
                     ):
         with self.model:
             self.AllBeta = pm.Dirichlet("AllBeta", cm_prior_conc * np.ones((self.nCMs + 1)), shape=(self.nCMs + 1,))
@@ -3824,21 +3118,29 @@ class CMCombined_Additive(BaseCMModel):
                                            plot_trace=False
                                            )
 
-            self.Normal(
-                "GrowthCases",
-                self.ExpectedGrowth,
-                self.DailyGrowthNoise,
-                shape=(self.nORs, self.nDs),
-                plot_trace=False,
-            )
-
-            self.Normal(
-                "GrowthDeaths",
-                self.ExpectedGrowth,
-                self.DailyGrowthNoise,
-                shape=(self.nORs, self.nDs),
-                plot_trace=False,
-            )
+            if growth_noise == "default":
+                self.Normal(
+                    "GrowthCases",
+                    self.ExpectedGrowth,
+                    self.DailyGrowthNoise,
+                    shape=(self.nORs, self.nDs),
+                    plot_trace=False,
+                )
+            else:
+                self.Det("GrowthCases", self.ExpectedGrowth + self.GrowthNoise("GrowthCasesNoise", growth_noise),
+                         plot_trace=False)
+
+            if growth_noise == "default":
+                self.Normal(
+                    "GrowthDeaths",
+                    self.ExpectedGrowth,
+                    self.DailyGrowthNoise,
+                    shape=(self.nORs, self.nDs),
+                    plot_trace=False,
+                )
+            else:
+                self.Det("GrowthDeaths", self.ExpectedGrowth + self.GrowthNoise("GrowthDeathsNoise", growth_noise),
+                         plot_trace=False)
 
             self.InitialSizeCases_log = pm.Normal("InitialSizeCases_log", 0, 50, shape=(self.nORs,))
             self.InfectedCases_log = pm.Deterministic("InfectedCases_log", T.reshape(self.InitialSizeCases_log, (
@@ -3892,262 +3194,13 @@ class CMCombined_Additive(BaseCMModel):
             )
 
 
-    def plot_region_predictions(self, plot_style, save_fig=True, output_dir="./out"):
-        assert self.trace is not None
-
-        for country_indx, region in zip(self.OR_indxs, self.ORs):
-
-            if country_indx % 5 == 0:
-                plt.figure(figsize=(12, 20), dpi=300)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 1)
-
-            means_ic, lu_ic, up_ic, err_ic = produce_CIs(
-                self.trace.InfectedCases[:, country_indx, :]
-            )
-
-            ec = self.trace.ExpectedCases[:, country_indx, :]
-            nS, nDs = ec.shape
-            dist = pm.NegativeBinomial.dist(mu=ec + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-            # dist = pm.NegativeBinomial.dist(mu=ec, alpha=30)
-            ec_output = dist.random()
-
-            means_ec, lu_ec, up_ec, err_ec = produce_CIs(
-                ec_output
-            )
-
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                self.trace.InfectedDeaths[:, country_indx, :]
-            )
-
-            ed = self.trace.ExpectedDeaths[:, country_indx, :]
-            nS, nDs = ed.shape
-            dist = pm.NegativeBinomial.dist(mu=ed + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-
-            dist = pm.NegativeBinomial.dist(mu=ed, alpha=30)
-            try:
-                ed_output = dist.random()
-            except:
-                print(region)
-                ed_output = ed
-
-            means_ed, lu_ed, up_ed, err_ed = produce_CIs(
-                ed_output
-            )
-
-            days = self.d.Ds
-            days_x = np.arange(len(days))
-
-            min_x = 25
-            max_x = len(days) - 1
-
-            newcases = self.d.NewCases[country_indx, :]
-            deaths = self.d.NewDeaths[country_indx, :]
-
-            ax = plt.gca()
-            plt.plot(
-                days_x,
-                means_ic,
-                label="Daily Infected - Cases",
-                zorder=1,
-                color="tab:purple",
-                alpha=0.25
-            )
-
-            plt.fill_between(
-                days_x, lu_ic, up_ic, alpha=0.15, color="tab:purple", linewidth=0
-            )
-
-            plt.plot(
-                days_x,
-                means_ec,
-                label="Predicted New Cases",
-                zorder=2,
-                color="tab:blue"
-            )
-
-            plt.fill_between(
-                days_x, lu_ec, up_ec, alpha=0.25, color="tab:blue", linewidth=0
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                newcases[self.ObservedDaysIndx],
-                label="Recorded New Cases",
-                marker="o",
-                s=10,
-                color="tab:green",
-                alpha=0.9,
-                zorder=3,
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                newcases[self.ObservedDaysIndx].data,
-                label="Heldout New Cases",
-                marker="o",
-                s=12,
-                edgecolor="tab:green",
-                facecolor="white",
-                linewidth=1,
-                alpha=0.9,
-                zorder=2,
-            )
-
-            plt.plot(
-                days_x,
-                means_id,
-                label="Daily Infected - Deaths",
-                zorder=1,
-                color="tab:orange",
-                alpha=0.25
-            )
-
-            plt.fill_between(
-                days_x, lu_id, up_id, alpha=0.15, color="tab:orange", linewidth=0
-            )
-
-            plt.plot(
-                days_x,
-                means_ed,
-                label="Predicted Deaths",
-                zorder=2,
-                color="tab:red"
-            )
-
-            plt.fill_between(
-                days_x, lu_ed, up_ed, alpha=0.25, color="tab:red", linewidth=0
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                deaths[self.ObservedDaysIndx],
-                label="Recorded Deaths",
-                marker="o",
-                s=10,
-                color="tab:gray",
-                alpha=0.9,
-                zorder=3,
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                deaths[self.ObservedDaysIndx].data,
-                label="Recorded Heldout Deaths",
-                marker="o",
-                s=12,
-                edgecolor="tab:gray",
-                facecolor="white",
-                linewidth=1,
-                alpha=0.9,
-                zorder=2,
-            )
-
-            ax.set_yscale("log")
-            plt.xlim([min_x, max_x])
-            plt.ylim([10 ** 0, 10 ** 6])
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            plt.xticks(locs, xlabels, rotation=-30)
-            ax1 = add_cms_to_plot(ax, self.d.ActiveCMs, country_indx, min_x, max_x, days, plot_style)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 2)
-
-            ax2 = plt.gca()
-
-            means_g, lu_g, up_g, err_g = produce_CIs(
-                np.exp(self.trace.ExpectedGrowth[:, country_indx, :])
-            )
-
-            means_agc, lu_agc, up_agc, err_agc = produce_CIs(
-                np.exp(self.trace.GrowthCases[:, country_indx, :])
-            )
-
-            means_agd, lu_agd, up_agd, err_agd = produce_CIs(
-                np.exp(self.trace.GrowthDeaths[:, country_indx, :])
-            )
-
-            med_agc = np.percentile(np.exp(self.trace.GrowthCases[:, country_indx, :]), 50, axis=0)
-            med_agd = np.percentile(np.exp(self.trace.GrowthDeaths[:, country_indx, :]), 50, axis=0)
-
-            plt.plot(days_x, means_g, label="Predicted Growth", zorder=1, color="tab:gray")
-            plt.plot(days_x, means_agc, label="Corrupted Growth - Cases", zorder=1, color="tab:purple")
-            # plt.plot(days_x, med_agc, "--", color="tab:purple")
-            plt.plot(days_x, means_agd, label="Corrupted Growth - Deaths", zorder=1, color="tab:orange")
-            # plt.plot(days_x, med_agd, "--", color="tab:orange")
-
-            plt.fill_between(days_x, lu_g, up_g, alpha=0.25, color="tab:gray", linewidth=0)
-            plt.fill_between(days_x, lu_agc, up_agc, alpha=0.25, color="tab:purple", linewidth=0)
-            plt.fill_between(days_x, lu_agd, up_agd, alpha=0.25, color="tab:orange", linewidth=0)
-
-            plt.plot([min_x, max_x], [1, 1], "--", linewidth=0.5, color="lightgrey")
-
-            plt.ylim([0.5, 2])
-            plt.xlim([min_x, max_x])
-            plt.ylabel("Growth")
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            plt.xticks(locs, xlabels, rotation=-30)
-            plt.title(f"Region {region}")
-            ax3 = add_cms_to_plot(ax2, self.d.ActiveCMs, country_indx, min_x, max_x, days, plot_style)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 3)
-            axis_scale = 1.5
-            ax4 = plt.gca()
-
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                np.exp(self.trace.ExpectedLogR[:, country_indx, :])
-            )
-            # z1C_mean, lu_z1C, up_z1C, err_1C = produce_CIs(self.trace.Z1C[:, country_indx, :])
-            # z1D_mean, lu_z1D, up_z1D, err_1D = produce_CIs(self.trace.Z1D[:, country_indx, :])
-            # # z2_mean, lu_z2, up_z2, err_2 = produce_CIs(self.trace.Z2[:, country_indx, :])
-            #
-            # plt.plot(days_x, z1C_mean, color="tab:purple", label="Growth Noise - Cases")
-            # plt.fill_between(
-            #     days_x, lu_z1C, up_z1C, alpha=0.25, color="tab:purple", linewidth=0
-            # )
-            # plt.plot(days_x, z1D_mean, color="tab:purple", label="Growth Noise - Deaths")
-            # plt.fill_between(
-            #     days_x, lu_z1D, up_z1D, alpha=0.25, color="tab:orange", linewidth=0
-            # )
-            #
-            # plt.xlim([min_x, max_x])
-            # plt.ylim([-2, 2])
-            # plt.xticks(locs, xlabels, rotation=-30)
-            # plt.ylabel("$Z$")
-
-            # ax4.twinx()
-            # ax5 = plt.gca()
-            # plt.plot(self.ObservedDaysIndx, z2_mean, color="tab:orange", label="Death Noise")
-            # plt.fill_between(
-            #     self.ObservedDaysIndx, lu_z2, up_z2, alpha=0.25, color="tab:orange", linewidth=0
-            # )
-            # y_lim = max(np.max(np.abs(up_z2)), np.max(np.abs(lu_z2)))
-            # plt.ylim([-1.5 * y_lim, 1.5 * y_lim])
-
-            plt.xlim([min_x, max_x])
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            lines, labels = ax4.get_legend_handles_labels()
-            # lines2, labels2 = ax5.get_legend_handles_labels()
-
-            sns.despine(ax=ax)
-            sns.despine(ax=ax1)
-            sns.despine(ax=ax2)
-            sns.despine(ax=ax3)
-
-            if country_indx % 5 == 4 or country_indx == len(self.d.Rs) - 1:
-                plt.tight_layout()
-                if save_fig:
-                    save_fig_pdf(
-                        output_dir,
-                        f"CountryPredictionPlot{((country_indx + 1) / 5):.1f}",
-                    )
+    def plot_region_predictions(self, plot_style, save_fig=True, output_dir="./out", n_workers=1):
+        """
+        Plot the predicted and observed cases, deaths and growth of each region, on pages of 5 regions.
 
-            elif country_indx == 0:
-                ax.legend(prop={"size": 8}, loc="center left")
-                ax2.legend(prop={"size": 8}, loc="lower left")
-                # ax4.legend(lines + lines2, labels + labels2, prop={"size": 8})
+        :param n_workers: processes rendering the saved pages in parallel, see render_region_predictions
+        """
+        render_region_predictions(self, plot_style, save_fig, output_dir, n_workers)
 
     def plot_subset_region_predictions(self, region_indxs, plot_style, n_rows=3, fig_height=11, save_fig=True,
                                        output_dir="./out"):
@@ -4162,28 +3215,13 @@ class CMCombined_Additive(BaseCMModel):
 
             plt.subplot(n_rows, 3, 3 * (i % n_rows) + 1)
 
-            means_ic, lu_ic, up_ic, err_ic = produce_CIs(
-                self.trace.InfectedCases[:, country_indx, :]
-            )
-
-            ec = self.trace.ExpectedCases[:, country_indx, :]
-            nS, nDs = ec.shape
-            dist = pm.NegativeBinomial.dist(mu=ec, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-            ec_output = dist.random()
-
-            means_ec, lu_ec, up_ec, err_ec = produce_CIs(
-                ec_output
-            )
+            means_ic, lu_ic, up_ic, err_ic = self.region_CIs("InfectedCases", country_indx)
 
-            ed = self.trace.ExpectedDeaths[:, country_indx, :]
-            nS, nDs = ed.shape
-            dist = pm.NegativeBinomial.dist(mu=ed + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
+            means_ec, lu_ec, up_ec, err_ec = self.region_CIs("ExpectedCases", country_indx, predictive=True)
 
             ids = self.trace.InfectedDeaths[:, country_indx, :]
-            try:
-                ed_output = dist.random()
-            except:
-                print("hi?")
+            ed_output = self.posterior_predictive("ExpectedDeaths")[:, country_indx, :]
+            if not np.all(np.isfinite(ed_output)):
                 print(region)
                 ed_output = np.ones_like(ids) * 10 ** -5
                 ids = np.ones_like(ids) * 10 ** -5
@@ -4323,13 +3361,9 @@ class CMCombined_Additive(BaseCMModel):
 
             ax2 = plt.gca()
 
-            means_g, lu_g, up_g, err_g = produce_CIs(
-                np.exp(self.trace.ExpectedLogR[:, country_indx, :])
-            )
+            means_g, lu_g, up_g, err_g = self.region_CIs("ExpectedLogR", country_indx, exp=True)
 
-            means_base, lu_base, up_base, err_base = produce_CIs(
-                np.exp(self.trace.RegionLogR[:, country_indx])
-            )
+            means_base, lu_base, up_base, err_base = self.region_CIs("RegionLogR", country_indx, exp=True)
 
             plt.plot(days_x, means_g, zorder=1, color="tab:gray", label="$R_{t}$")
             plt.plot([min_x, max_x], [means_base, means_base], "--", zorder=-1, label="$R_0$", color="tab:red",
@@ -4351,8 +3385,8 @@ class CMCombined_Additive(BaseCMModel):
             plt.subplot(n_rows, 3, 3 * (i % n_rows) + 3)
             axis_scale = 1.5
             ax4 = plt.gca()
-            z1c_m, lu_z1c, up_z1c, err_z1c = produce_CIs(self.trace.Z1C[:, country_indx, :])
-            z1d_m, lu_z1d, up_z1d, err_z1d = produce_CIs(self.trace.Z1D[:, country_indx, :])
+            z1c_m, lu_z1c, up_z1c, err_z1c = self.region_CIs("Z1C", country_indx)
+            z1d_m, lu_z1d, up_z1d, err_z1d = self.region_CIs("Z1D", country_indx)
 
             plt.plot(days_x, z1c_m, color="tab:purple", label="$\epsilon^{(C)}$")
             plt.fill_between(days_x, lu_z1c, up_z1c, alpha=0.25, color="tab:purple", linewidth=0)
@@ -4538,7 +3572,7 @@ class CMCombined_Final_DifEffects(BaseCMModel):
         self.all_observed_deaths = np.array(observed_deaths)
 
     def build_model(self, R_hyperprior_mean=3.25, cm_prior_sigma=0.2, cm_prior='normal',
-                    serial_interval_mean=SI_ALPHA / SI_BETA
+                    serial_interval_mean=SI_ALPHA / SI_BETA, growth_noise="default"
                     ):
         with self.model:
             if cm_prior == 'normal':
@@ -4590,21 +3624,29 @@ class CMCombined_Final_DifEffects(BaseCMModel):
                                            plot_trace=False
                                            )
 
-            self.Normal(
-                "GrowthCases",
-                self.ExpectedGrowth,
-                self.DailyGrowthNoise,
-                shape=(self.nORs, self.nDs),
-                plot_trace=False,
-            )
-
-            self.Normal(
-                "GrowthDeaths",
-                self.ExpectedGrowth,
-                self.DailyGrowthNoise,
-                shape=(self.nORs, self.nDs),
-                plot_trace=False,
-            )
+            if growth_noise == "default":
+                self.Normal(
+                    "GrowthCases",
+                    self.ExpectedGrowth,
+                    self.DailyGrowthNoise,
+                    shape=(self.nORs, self.nDs),
+                    plot_trace=False,
+                )
+            else:
+                self.Det("GrowthCases", self.ExpectedGrowth + self.GrowthNoise("GrowthCasesNoise", growth_noise),
+                         plot_trace=False)
+
+            if growth_noise == "default":
+                self.Normal(
+                    "GrowthDeaths",
+                    self.ExpectedGrowth,
+                    self.DailyGrowthNoise,
+                    shape=(self.nORs, self.nDs),
+                    plot_trace=False,
+                )
+            else:
+                self.Det("GrowthDeaths", self.ExpectedGrowth + self.GrowthNoise("GrowthDeathsNoise", growth_noise),
+                         plot_trace=False)
 
             self.InitialSizeCases_log = pm.Normal("InitialSizeCases_log", 0, 50, shape=(self.nORs,))
             self.InfectedCases_log = pm.Deterministic("InfectedCases_log", T.reshape(self.InitialSizeCases_log, (
@@ -4657,262 +3699,13 @@ class CMCombined_Final_DifEffects(BaseCMModel):
                 observed=self.d.NewDeaths.data.reshape((self.nORs * self.nDs,))[self.all_observed_deaths]
             )
 
-    def plot_region_predictions(self, plot_style, save_fig=True, output_dir="./out"):
-        assert self.trace is not None
-
-        for country_indx, region in zip(self.OR_indxs, self.ORs):
-
-            if country_indx % 5 == 0:
-                plt.figure(figsize=(12, 20), dpi=300)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 1)
-
-            means_ic, lu_ic, up_ic, err_ic = produce_CIs(
-                self.trace.InfectedCases[:, country_indx, :]
-            )
-
-            ec = self.trace.ExpectedCases[:, country_indx, :]
-            nS, nDs = ec.shape
-            dist = pm.NegativeBinomial.dist(mu=ec + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-            # dist = pm.NegativeBinomial.dist(mu=ec, alpha=30)
-            ec_output = dist.random()
-
-            means_ec, lu_ec, up_ec, err_ec = produce_CIs(
-                ec_output
-            )
-
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                self.trace.InfectedDeaths[:, country_indx, :]
-            )
-
-            ed = self.trace.ExpectedDeaths[:, country_indx, :]
-            nS, nDs = ed.shape
-            dist = pm.NegativeBinomial.dist(mu=ed + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-
-            dist = pm.NegativeBinomial.dist(mu=ed, alpha=30)
-            try:
-                ed_output = dist.random()
-            except:
-                print(region)
-                ed_output = ed
-
-            means_ed, lu_ed, up_ed, err_ed = produce_CIs(
-                ed_output
-            )
-
-            days = self.d.Ds
-            days_x = np.arange(len(days))
-
-            min_x = 25
-            max_x = len(days) - 1
-
-            newcases = self.d.NewCases[country_indx, :]
-            deaths = self.d.NewDeaths[country_indx, :]
-
-            ax = plt.gca()
-            plt.plot(
-                days_x,
-                means_ic,
-                label="Daily Infected - Cases",
-                zorder=1,
-                color="tab:purple",
-                alpha=0.25
-            )
-
-            plt.fill_between(
-                days_x, lu_ic, up_ic, alpha=0.15, color="tab:purple", linewidth=0
-            )
-
-            plt.plot(
-                days_x,
-                means_ec,
-                label="Predicted New Cases",
-                zorder=2,
-                color="tab:blue"
-            )
-
-            plt.fill_between(
-                days_x, lu_ec, up_ec, alpha=0.25, color="tab:blue", linewidth=0
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                newcases[self.ObservedDaysIndx],
-                label="Recorded New Cases",
-                marker="o",
-                s=10,
-                color="tab:green",
-                alpha=0.9,
-                zorder=3,
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                newcases[self.ObservedDaysIndx].data,
-                label="Heldout New Cases",
-                marker="o",
-                s=12,
-                edgecolor="tab:green",
-                facecolor="white",
-                linewidth=1,
-                alpha=0.9,
-                zorder=2,
-            )
-
-            plt.plot(
-                days_x,
-                means_id,
-                label="Daily Infected - Deaths",
-                zorder=1,
-                color="tab:orange",
-                alpha=0.25
-            )
-
-            plt.fill_between(
-                days_x, lu_id, up_id, alpha=0.15, color="tab:orange", linewidth=0
-            )
-
-            plt.plot(
-                days_x,
-                means_ed,
-                label="Predicted Deaths",
-                zorder=2,
-                color="tab:red"
-            )
-
-            plt.fill_between(
-                days_x, lu_ed, up_ed, alpha=0.25, color="tab:red", linewidth=0
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                deaths[self.ObservedDaysIndx],
-                label="Recorded Deaths",
-                marker="o",
-                s=10,
-                color="tab:gray",
-                alpha=0.9,
-                zorder=3,
-            )
-
-            plt.scatter(
-                self.ObservedDaysIndx,
-                deaths[self.ObservedDaysIndx].data,
-                label="Recorded Heldout Deaths",
-                marker="o",
-                s=12,
-                edgecolor="tab:gray",
-                facecolor="white",
-                linewidth=1,
-                alpha=0.9,
-                zorder=2,
-            )
-
-            ax.set_yscale("log")
-            plt.xlim([min_x, max_x])
-            plt.ylim([10 ** 0, 10 ** 6])
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            plt.xticks(locs, xlabels, rotation=-30)
-            ax1 = add_cms_to_plot(ax, self.d.ActiveCMs, country_indx, min_x, max_x, days, plot_style)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 2)
-
-            ax2 = plt.gca()
-
-            means_g, lu_g, up_g, err_g = produce_CIs(
-                np.exp(self.trace.ExpectedGrowth[:, country_indx, :])
-            )
-
-            means_agc, lu_agc, up_agc, err_agc = produce_CIs(
-                np.exp(self.trace.GrowthCases[:, country_indx, :])
-            )
-
-            means_agd, lu_agd, up_agd, err_agd = produce_CIs(
-                np.exp(self.trace.GrowthDeaths[:, country_indx, :])
-            )
-
-            med_agc = np.percentile(np.exp(self.trace.GrowthCases[:, country_indx, :]), 50, axis=0)
-            med_agd = np.percentile(np.exp(self.trace.GrowthDeaths[:, country_indx, :]), 50, axis=0)
-
-            plt.plot(days_x, means_g, label="Predicted Growth", zorder=1, color="tab:gray")
-            plt.plot(days_x, means_agc, label="Corrupted Growth - Cases", zorder=1, color="tab:purple")
-            # plt.plot(days_x, med_agc, "--", color="tab:purple")
-            plt.plot(days_x, means_agd, label="Corrupted Growth - Deaths", zorder=1, color="tab:orange")
-            # plt.plot(days_x, med_agd, "--", color="tab:orange")
-
-            plt.fill_between(days_x, lu_g, up_g, alpha=0.25, color="tab:gray", linewidth=0)
-            plt.fill_between(days_x, lu_agc, up_agc, alpha=0.25, color="tab:purple", linewidth=0)
-            plt.fill_between(days_x, lu_agd, up_agd, alpha=0.25, color="tab:orange", linewidth=0)
-
-            plt.plot([min_x, max_x], [1, 1], "--", linewidth=0.5, color="lightgrey")
-
-            plt.ylim([0.5, 2])
-            plt.xlim([min_x, max_x])
-            plt.ylabel("Growth")
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            plt.xticks(locs, xlabels, rotation=-30)
-            plt.title(f"Region {region}")
-            ax3 = add_cms_to_plot(ax2, self.d.ActiveCMs, country_indx, min_x, max_x, days, plot_style)
-
-            plt.subplot(5, 3, 3 * (country_indx % 5) + 3)
-            axis_scale = 1.5
-            ax4 = plt.gca()
-
-            means_id, lu_id, up_id, err_id = produce_CIs(
-                np.exp(self.trace.ExpectedLogR[:, country_indx, :])
-            )
-            # z1C_mean, lu_z1C, up_z1C, err_1C = produce_CIs(self.trace.Z1C[:, country_indx, :])
-            # z1D_mean, lu_z1D, up_z1D, err_1D = produce_CIs(self.trace.Z1D[:, country_indx, :])
-            # # z2_mean, lu_z2, up_z2, err_2 = produce_CIs(self.trace.Z2[:, country_indx, :])
-            #
-            # plt.plot(days_x, z1C_mean, color="tab:purple", label="Growth Noise - Cases")
-            # plt.fill_between(
-            #     days_x, lu_z1C, up_z1C, alpha=0.25, color="tab:purple", linewidth=0
-            # )
-            # plt.plot(days_x, z1D_mean, color="tab:purple", label="Growth Noise - Deaths")
-            # plt.fill_between(
-            #     days_x, lu_z1D, up_z1D, alpha=0.25, color="tab:orange", linewidth=0
-            # )
-            #
-            # plt.xlim([min_x, max_x])
-            # plt.ylim([-2, 2])
-            # plt.xticks(locs, xlabels, rotation=-30)
-            # plt.ylabel("$Z$")
-
-            # ax4.twinx()
-            # ax5 = plt.gca()
-            # plt.plot(self.ObservedDaysIndx, z2_mean, color="tab:orange", label="Death Noise")
-            # plt.fill_between(
-            #     self.ObservedDaysIndx, lu_z2, up_z2, alpha=0.25, color="tab:orange", linewidth=0
-            # )
-            # y_lim = max(np.max(np.abs(up_z2)), np.max(np.abs(lu_z2)))
-            # plt.ylim([-1.5 * y_lim, 1.5 * y_lim])
-
-            plt.xlim([min_x, max_x])
-            locs = np.arange(min_x, max_x, 7)
-            xlabels = [f"{days[ts].day}-{days[ts].month}" for ts in locs]
-            lines, labels = ax4.get_legend_handles_labels()
-            # lines2, labels2 = ax5.get_legend_handles_labels()
-
-            sns.despine(ax=ax)
-            sns.despine(ax=ax1)
-            sns.despine(ax=ax2)
-            sns.despine(ax=ax3)
-
-            if country_indx % 5 == 4 or country_indx == len(self.d.Rs) - 1:
-                plt.tight_layout()
-                if save_fig:
-                    save_fig_pdf(
-                        output_dir,
-                        f"CountryPredictionPlot{((country_indx + 1) / 5):.1f}",
-                    )
+    def plot_region_predictions(self, plot_style, save_fig=True, output_dir="./out", n_workers=1):
+        """
+        Plot the predicted and observed cases, deaths and growth of each region, on pages of 5 regions.
 
-            elif country_indx == 0:
-                ax.legend(prop={"size": 8}, loc="center left")
-                ax2.legend(prop={"size": 8}, loc="lower left")
-                # ax4.legend(lines + lines2, labels + labels2, prop={"size": 8})
+        :param n_workers: processes rendering the saved pages in parallel, see render_region_predictions
+        """
+        render_region_predictions(self, plot_style, save_fig, output_dir, n_workers)
 
     def plot_subset_region_predictions(self, region_indxs, plot_style, n_rows=3, fig_height=11, save_fig=True,
                                        output_dir="./out"):
@@ -4927,28 +3720,13 @@ class CMCombined_Final_DifEffects(BaseCMModel):
 
             plt.subplot(n_rows, 3, 3 * (i % n_rows) + 1)
 
-            means_ic, lu_ic, up_ic, err_ic = produce_CIs(
-                self.trace.InfectedCases[:, country_indx, :]
-            )
-
-            ec = self.trace.ExpectedCases[:, country_indx, :]
-            nS, nDs = ec.shape
-            dist = pm.NegativeBinomial.dist(mu=ec, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
-            ec_output = dist.random()
-
-            means_ec, lu_ec, up_ec, err_ec = produce_CIs(
-                ec_output
-            )
+            means_ic, lu_ic, up_ic, err_ic = self.region_CIs("InfectedCases", country_indx)
 
-            ed = self.trace.ExpectedDeaths[:, country_indx, :]
-            nS, nDs = ed.shape
-            dist = pm.NegativeBinomial.dist(mu=ed + 1e-3, alpha=np.repeat(np.array([self.trace.Phi_1]), nDs, axis=0).T)
+            means_ec, lu_ec, up_ec, err_ec = self.region_CIs("ExpectedCases", country_indx, predictive=True)
 
             ids = self.trace.InfectedDeaths[:, country_indx, :]
-            try:
-                ed_output = dist.random()
-            except:
-                print("hi?")
+            ed_output = self.posterior_predictive("ExpectedDeaths")[:, country_indx, :]
+            if not np.all(np.isfinite(ed_output)):
                 print(region)
                 ed_output = np.ones_like(ids) * 10 ** -5
                 ids = np.ones_like(ids) * 10 ** -5
@@ -5062,13 +3840,9 @@ class CMCombined_Final_DifEffects(BaseCMModel):
 
             ax2 = plt.gca()
 
-            means_g, lu_g, up_g, err_g = produce_CIs(
-                np.exp(self.trace.ExpectedLogR[:, country_indx, :])
-            )
+            means_g, lu_g, up_g, err_g = self.region_CIs("ExpectedLogR", country_indx, exp=True)
 
-            means_base, lu_base, up_base, err_base = produce_CIs(
-                np.exp(self.trace.RegionLogR[:, country_indx])
-            )
+            means_base, lu_base, up_base, err_base = self.region_CIs("RegionLogR", country_indx, exp=True)
 
             plt.plot(days_x, means_g, zorder=1, color="tab:gray", label="$R_{t}$")
             plt.plot([min_x, max_x], [means_base, means_base], "--", zorder=-1, label="$R_0$", color="tab:red",
@@ -5090,8 +3864,8 @@ class CMCombined_Final_DifEffects(BaseCMModel):
             plt.subplot(n_rows, 3, 3 * (i % n_rows) + 3)
             axis_scale = 1.5
             ax4 = plt.gca()
-            z1c_m, lu_z1c, up_z1c, err_z1c = produce_CIs(self.trace.Z1C[:, country_indx, :])
-            z1d_m, lu_z1d, up_z1d, err_z1d = produce_CIs(self.trace.Z1D[:, country_indx, :])
+            z1c_m, lu_z1c, up_z1c, err_z1c = self.region_CIs("Z1C", country_indx)
+            z1d_m, lu_z1d, up_z1d, err_z1d = self.region_CIs("Z1D", country_indx)
 
             plt.plot(days_x, z1c_m, color="tab:purple", label="$\epsilon^{(C)}$")
             plt.fill_between(days_x, lu_z1c, up_z1c, alpha=0.25, color="tab:purple", linewidth=0)
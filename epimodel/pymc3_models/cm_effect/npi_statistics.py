@@ -0,0 +1,59 @@
+"""
+Summary statistics of the NPI activations of a dataset, as plotted by PreprocessedData.summary_plot.
+
+All statistics are computed from ActiveCMs [regions, NPIs, days] with tensor contractions over regions and
+days, rather than loops over pairs of NPIs: coactivation is one [NPIs, NPIs] contraction, days active one
+reduction. The onset statistics compare the first active day of every pair of NPIs in every region at once.
+PreprocessedData.npi_statistics caches them for the current activations and masks.
+"""
+import logging
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def onset_days(active_cms):
+    """Index of the first active day of each NPI in each region, [regions, NPIs], NaN if never active."""
+    active = np.asarray(active_cms) > 0
+    return np.where(active.any(axis=2), np.argmax(active, axis=2), np.nan)
+
+
+class NPIStatistics(object):
+    def __init__(self, active_cms, observed=None):
+        """
+        :param active_cms: [regions, NPIs, days] activations
+        :param observed: [regions, days] indicator of the days counted, e.g. the days with observed deaths;
+        default all days. The onset statistics always use all days.
+
+        Attributes:
+        - days_active: [NPIs] region-days on which each NPI is active
+        - joint_days: [NPIs, NPIs] region-days on which both NPIs are active
+        - coactivation: [NPIs, NPIs] frequency of NPI j being active given NPI i is active (row i, column j),
+          NaN for NPIs never active
+        - onsets: [regions, NPIs] first active day, see onset_days
+        - onset_before: [NPIs, NPIs] fraction of the regions with both NPIs where i starts strictly before j
+        - onset_same_day: [NPIs, NPIs] fraction of the regions with both NPIs where they start on the same day
+        - onset_lag: [NPIs, NPIs] mean days from the onset of i to the onset of j, over the regions with both
+        """
+        active = np.asarray(active_cms, dtype=float)
+        nRs, nCMs, nDs = active.shape
+        observed = np.ones((nRs, nDs)) if observed is None else np.asarray(observed, dtype=float)
+        weighted = active * observed[:, None, :]
+
+        self.days_active = np.einsum("rcd->c", weighted)
+        self.joint_days = np.einsum("rid,rjd->ij", weighted, active, optimize=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.coactivation = self.joint_days / self.days_active[:, None]
+
+        self.onsets = onset_days(active)
+        started = np.isfinite(self.onsets).astype(float)
+        both = np.einsum("ri,rj->ij", started, started)
+        onsets = np.nan_to_num(self.onsets)
+        # [regions, NPIs, NPIs] onset of j minus onset of i, weighted to the pairs where both NPIs start
+        lags = onsets[:, None, :] - onsets[:, :, None]
+        pair_weights = started[:, :, None] * started[:, None, :]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.onset_before = np.einsum("rij,rij->ij", pair_weights, lags > 0) / both
+            self.onset_same_day = np.einsum("rij,rij->ij", pair_weights, lags == 0) / both
+            self.onset_lag = np.einsum("rij,rij->ij", pair_weights, lags) / both
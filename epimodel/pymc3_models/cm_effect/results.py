@@ -0,0 +1,145 @@
+"""
+Content-addressed store of sampling results.
+
+Results are keyed by a hash of everything that determines them: the data snapshot, the model class, the
+attributes set before building, the build_model arguments and the sampler settings. Each result is an .npz
+file of per-chain draws; manifest.jsonl records one line per stored result with its provenance.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pymc3 as pm
+
+from epimodel.pymc3_models.cm_effect.diagnostics import free_varnames
+from epimodel.pymc3_models.cm_effect.factory import value_key
+
+log = logging.getLogger(__name__)
+
+
+def result_key(data_fingerprint, model_class_name, attrs, build_kwargs, sampler_kwargs):
+    h = hashlib.sha1()
+    h.update(data_fingerprint.encode())
+    h.update(model_class_name.encode())
+    h.update(repr(sorted((name, value_key(value)) for name, value in attrs.items())).encode())
+    h.update(repr(sorted(build_kwargs.items())).encode())
+    h.update(repr(sorted(sampler_kwargs.items())).encode())
+    return h.hexdigest()
+
+
+def stored_varnames(model, trace, max_deterministic_size=1000):
+    """Untransformed free variables, and deterministics with at most `max_deterministic_size` values per draw."""
+    names = free_varnames(model)
+    for name in trace.varnames:
+        if name not in names and not pm.util.is_transformed_name(name) \
+                and np.prod(trace.get_values(name, chains=trace.chains[0])[0].shape) <= max_deterministic_size:
+            names.append(name)
+    return names
+
+
+class StoredTrace(object):
+    """Draws loaded from the store, indexable like a MultiTrace (trace["CMReduction"], trace.CMReduction)."""
+
+    def __init__(self, values):
+        # name -> array of shape [chains, draws, ...]
+        self._values = values
+
+    @property
+    def varnames(self):
+        return list(self._values.keys())
+
+    @property
+    def nchains(self):
+        return next(iter(self._values.values())).shape[0]
+
+    def __getitem__(self, name):
+        value = self._values[name]
+        return value.reshape((-1, *value.shape[2:]))
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name not in self._values:
+            raise AttributeError(name)
+        return self[name]
+
+    def __len__(self):
+        return next(iter(self._values.values())).shape[1]
+
+    def get_values(self, name, combine=True, chains=None):
+        value = self._values[name] if chains is None else self._values[name][np.atleast_1d(chains)]
+        return value.reshape((-1, *value.shape[2:])) if combine else list(value)
+
+    def to_dict(self):
+        """Per-chain draws, in the layout accepted by arviz functions."""
+        return dict(self._values)
+
+
+class StoredModel(object):
+    """
+    Stand-in for a model whose result is loaded from the store, so that its outputs can be saved and catalogued
+    without building it: the trace, the data, and the names of the free variables and the model class.
+    """
+
+    def __init__(self, trace, data, free_variables, model_class_name):
+        self.trace = trace
+        self.d = data
+        self.free_variables = free_variables
+        self.model_class_name = model_class_name
+
+
+class ResultStore(object):
+    def __init__(self, root="result_store"):
+        self.root = root
+        if not os.path.exists(root):
+            os.makedirs(root)
+
+    def path(self, key):
+        return os.path.join(self.root, f"{key}.npz")
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def load(self, key):
+        with np.load(self.path(key)) as f:
+            return StoredTrace({name: f[name] for name in f.files})
+
+    def info(self, key):
+        """The manifest record of `key`, the latest if it was stored more than once, or None."""
+        records = [record for record in self.manifest() if record["key"] == key]
+        return records[-1] if records else None
+
+    def load_model(self, key, data):
+        """StoredModel of `key` with the data `data`, or None if the manifest does not name its free variables."""
+        info = self.info(key)
+        if info is None or "free_variables" not in info:
+            return None
+        return StoredModel(self.load(key), data, info["free_variables"], info["model_class"])
+
+    def save(self, key, model, trace=None, info=None):
+        """Store the draws of `trace` (default model.trace) and append its provenance to the manifest."""
+        trace = model.trace if trace is None else trace
+        values = {name: np.stack(trace.get_values(name, combine=False)) for name in stored_varnames(model, trace)}
+
+        # write then rename, so that concurrent runs never read a partial file
+        tmp_path = f"{self.path(key)}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp_path, **values)
+        os.replace(tmp_path, self.path(key))
+
+        record = dict(key=key, created=datetime.datetime.now().isoformat(), model_class=type(model).__name__,
+                      chains=len(trace.chains), draws=len(trace), variables=list(values),
+                      free_variables=free_varnames(model))
+        if info is not None:
+            record.update(info)
+        # a single short write in append mode, so lines from concurrent runs do not interleave
+        with open(os.path.join(self.root, "manifest.jsonl"), "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+        log.info(f"Stored result {key}")
+
+    def manifest(self):
+        path = os.path.join(self.root, "manifest.jsonl")
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,229 @@
+"""
+Local scheduler for running several sampling jobs side by side on one machine.
+
+Each job declares how many chains it samples in parallel and how many BLAS/OpenMP threads each chain
+may use, and optionally how much memory it needs (see memory.estimate_memory). The scheduler places jobs on
+free cores of a fixed core budget, pins them to those cores and queues everything that does not fit the free
+cores or the remaining memory budget, so the machine is never oversubscribed. Smaller jobs may start ahead of a
+queued job that does not fit yet, but only for a limited number of scheduling rounds, after which the cores and
+memory freed by finishing jobs are kept for it.
+"""
+import contextlib
+import logging
+import multiprocessing
+import os
+import time
+
+log = logging.getLogger(__name__)
+
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"]
+
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+
+def available_memory():
+    """MemAvailable from /proc/meminfo in bytes, or None where it is not available."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def thread_env(n_threads):
+    """Environment variables limiting BLAS/OpenMP (and theano) to `n_threads` threads."""
+    env = {var: str(n_threads) for var in THREAD_ENV_VARS}
+    env["THEANO_FLAGS"] = ", ".join([f"{var}={n_threads}" for var in THREAD_ENV_VARS])
+    return env
+
+
+@contextlib.contextmanager
+def patched_environ(env):
+    old = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for key, value in old.items():
+            if value is None:
+                del os.environ[key]
+            else:
+                os.environ[key] = value
+
+
+class SamplingJob(object):
+    def __init__(self, name, target, args=(), kwargs=None, chains=4, cores=None, threads_per_chain=1,
+                 memory=None):
+        """
+        :param target: importable callable that builds and samples the model(s) of this job
+        :param chains: number of chains the job samples
+        :param cores: number of chains sampled in parallel, defaults to `chains`
+        :param threads_per_chain: BLAS/OpenMP threads available to each chain
+        :param memory: estimated peak memory of the job in bytes, if known
+        """
+        self.name = name
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs if kwargs is not None else {}
+        self.chains = chains
+        self.cores = chains if cores is None else cores
+        self.threads_per_chain = threads_per_chain
+        self.memory = memory
+        # unique within a scheduler, set when the job is submitted
+        self.job_id = None
+
+    @property
+    def n_cpus(self):
+        return self.cores * self.threads_per_chain
+
+    def env(self):
+        env = thread_env(self.threads_per_chain)
+        env["EPIMODEL_CHAINS"] = str(self.chains)
+        env["EPIMODEL_CORES"] = str(self.cores)
+        return env
+
+    def __repr__(self):
+        return f"SamplingJob({self.name}, chains={self.chains}, cores={self.cores}, threads={self.threads_per_chain})"
+
+
+def _run_job(job, cpus):
+    if cpus is not None and hasattr(os, "sched_setaffinity"):
+        # chain processes started by pymc3 inherit the affinity
+        os.sched_setaffinity(0, cpus)
+    job.target(*job.args, **job.kwargs)
+
+
+class CoreBudgetScheduler(object):
+    def __init__(self, n_cores=None, poll_interval=5, pin_cores=True, memory_budget=None, memory_fraction=0.9,
+                 max_wait_rounds=10):
+        """
+        :param memory_budget: bytes available to the jobs, defaults to `memory_fraction` of the memory available
+        now. Jobs with a memory estimate are only started while the estimates of the running jobs leave room for
+        them; jobs that need more than the whole budget are refused with exit code None.
+        :param max_wait_rounds: scheduling rounds the oldest queued job can wait while later jobs start ahead of it
+        """
+        cores = available_cores()
+        if n_cores is not None:
+            cores = cores[:n_cores]
+
+        self.n_cores = len(cores)
+        self.free_cores = cores
+
+        if memory_budget is None and available_memory() is not None:
+            memory_budget = int(memory_fraction * available_memory())
+        self.memory_budget = memory_budget
+        self.poll_interval = poll_interval
+        self.pin_cores = pin_cores
+        self.max_wait_rounds = max_wait_rounds
+
+        self.pending = []
+        self.running = {}
+        self.exitcodes = {}
+        # job id -> job, and job id -> round in which it was submitted
+        self.jobs = {}
+        self.submitted = {}
+        self.rounds = 0
+
+        # spawn, so that the thread settings are in place before numpy/theano are imported by the job
+        self._ctx = multiprocessing.get_context("spawn")
+
+    def _job_id(self, name):
+        job_id, n = name, 1
+        while job_id in self.jobs:
+            n += 1
+            job_id = f"{name}#{n}"
+        if n > 1:
+            log.warning(f"A job named {name} was already submitted, its results are under {job_id}")
+        return job_id
+
+    def submit(self, job):
+        """Queue `job`, returning its job id: the job name, with a suffix if that name was already submitted."""
+        job.job_id = self._job_id(job.name)
+        self.jobs[job.job_id] = job
+        self.submitted[job.job_id] = self.rounds
+        if job.n_cpus > self.n_cores:
+            job.cores = max(1, self.n_cores // job.threads_per_chain)
+            job.threads_per_chain = min(job.threads_per_chain, self.n_cores)
+            log.warning(f"{job.name} does not fit the budget of {self.n_cores} cores, reduced to {job}")
+        if not self.fits_memory_budget(job):
+            log.error(f"{job.name} needs {job.memory / 2 ** 30:.1f} GiB, more than the memory budget of "
+                      f"{self.memory_budget / 2 ** 30:.1f} GiB, not running it")
+            self.exitcodes[job.job_id] = None
+            return job.job_id
+        self.pending.append(job)
+        return job.job_id
+
+    def fits_memory_budget(self, job):
+        return job.memory is None or self.memory_budget is None or job.memory <= self.memory_budget
+
+    @property
+    def free_memory(self):
+        """Memory budget left by the estimates of the running jobs."""
+        if self.memory_budget is None:
+            return None
+        return self.memory_budget - sum(job.memory or 0 for _, job, _ in self.running.values())
+
+    def can_start(self, job):
+        if job.n_cpus > len(self.free_cores):
+            return False
+        return job.memory is None or self.free_memory is None or job.memory <= self.free_memory
+
+    def _start(self, job):
+        cpus = self.free_cores[:job.n_cpus]
+        self.free_cores = self.free_cores[job.n_cpus:]
+
+        with patched_environ(job.env()):
+            process = self._ctx.Process(target=_run_job, args=(job, cpus if self.pin_cores else None),
+                                        name=job.name)
+            process.start()
+
+        log.info(f"Started {job} on cores {cpus}")
+        self.running[job.job_id] = (process, job, cpus)
+
+    def _reap(self):
+        for job_id, (process, job, cpus) in list(self.running.items()):
+            if not process.is_alive():
+                process.join()
+                self.exitcodes[job_id] = process.exitcode
+                self.free_cores = sorted(self.free_cores + cpus)
+                del self.running[job_id]
+                log.info(f"Finished {job} with exit code {process.exitcode}")
+
+    def reserving(self):
+        """Whether the oldest queued job has waited too long to let later jobs start ahead of it."""
+        return bool(self.pending) and self.rounds - self.submitted[self.pending[0].job_id] >= self.max_wait_rounds
+
+    def _start_fitting(self):
+        # start queued jobs in order, letting smaller jobs fill cores and memory that the oldest job cannot use yet,
+        # until it has waited max_wait_rounds rounds; from then on the freed capacity is reserved for it
+        for job in list(self.pending):
+            if self.can_start(job):
+                self.pending.remove(job)
+                self._start(job)
+            elif job is self.pending[0] and self.reserving():
+                break
+
+    def run(self):
+        """Run all submitted jobs, returning a dict of job id (see submit) -> exit code."""
+        while self.pending or self.running:
+            self.rounds += 1
+            self._reap()
+            self._start_fitting()
+            if self.running:
+                time.sleep(self.poll_interval)
+
+        return self.exitcodes
+
+
+def run_jobs(jobs, n_cores=None, poll_interval=5, memory_budget=None):
+    scheduler = CoreBudgetScheduler(n_cores, poll_interval=poll_interval, memory_budget=memory_budget)
+    for job in jobs:
+        scheduler.submit(job)
+    return scheduler.run()
@@ -1,15 +1,19 @@
 import os
 
-os.environ["THEANO_FLAGS"] = "OMP_NUM_THREADS=1, MKL_NUM_THREADS=1, OPENBLAS_NUM_THREADS=1"
-os.environ["OMP_NUM_THREADS"] = "1"
-os.environ["MKL_NUM_THREADS"] = "1"
-os.environ["OPENBLAS_NUM_THREADS"] = "1"
+# default to single threaded BLAS, unless the job scheduler has already set the thread counts
+os.environ.setdefault("THEANO_FLAGS", "OMP_NUM_THREADS=1, MKL_NUM_THREADS=1, OPENBLAS_NUM_THREADS=1")
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
 print("setting environment variables properly now done.")
 
 ### imports
 import logging
 import numpy as np
-import copy
+import pandas as pd
+import functools
+import hashlib
+import socket
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
@@ -17,11 +21,27 @@ import warnings
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
 from epimodel.pymc3_models import cm_effect
-from epimodel.pymc3_models.cm_effect.datapreprocessor import DataPreprocessor
+from epimodel.pymc3_models.cm_effect.factory import (DataSpec, ModelSpec, ModelFactory, build_kwargs_error,
+                                                     takes_attribute, mask_region, leavout_cm, MASK_LEAVOUT_TYPES)
+from epimodel.pymc3_models.cm_effect.catalog import DEFAULT_CATALOG, ResultsCatalog
+from epimodel.pymc3_models.cm_effect.diagnostics import diagnostics, drop_elements
+from epimodel.pymc3_models.cm_effect.memory import estimate_memory
+from epimodel.pymc3_models.cm_effect.instrumentation import instrumented, load_records, run_record, stage
+from epimodel.pymc3_models.cm_effect.results import ResultStore, result_key
+from epimodel.pymc3_models.cm_effect.scheduler import SamplingJob, run_jobs
+from epimodel.pymc3_models.cm_effect.workqueue import enqueue
 import os
-import arviz as az
 import matplotlib.pyplot as plt
 
+# variables with one element per feature
+CM_VARIABLES = ["CM_Alpha", "CM_Alpha_t", "CMReduction"]
+
+
+def sampler_settings():
+    # chains and cores are set per job by the scheduler, see scheduler.SamplingJob
+    return dict(N=2000, tune=500, chains=int(os.environ.get("EPIMODEL_CHAINS", 4)),
+                cores=int(os.environ.get("EPIMODEL_CORES", 4)), map_start=True)
+
 
 def generate_out_dir(daily_growth_noise):
     out_dir = 'sensitivity_tests_longer'
@@ -37,965 +57,579 @@ def generate_out_dir(daily_growth_noise):
     return out_dir
 
 
+def savetxt_atomic(filename, x):
+    '''np.savetxt through a temporary file, so that readers (and other nodes) never see a partial file'''
+    tmp_path = f'{filename}.{socket.gethostname()}.{os.getpid()}.tmp'
+    np.savetxt(tmp_path, x)
+    os.replace(tmp_path, filename)
+
+
 def save_traces(model, model_type, filename):
     cm_trace = model.trace["CMReduction"]
-    np.savetxt(filename, cm_trace)
+    savetxt_atomic(filename, cm_trace)
 
     if model_type == 'combined_additive':
         cm_base_trace = model.trace["Beta_hat"]
-        np.savetxt(filename[0:len(filename) - 4] + '_base.txt', cm_base_trace)
+        savetxt_atomic(filename[0:len(filename) - 4] + '_base.txt', cm_base_trace)
 
     rhats = calc_trace_statistic(model, 'rhat')
     ess = calc_trace_statistic(model, 'ess')
 
-    np.savetxt(filename[:-4] + "rhats.txt", rhats)
-    np.savetxt(filename[:-4] + "ess.txt", ess)
+    savetxt_atomic(filename[:-4] + "rhats.txt", rhats)
+    savetxt_atomic(filename[:-4] + "ess.txt", ess)
 
 
-def mask_region(d, region, days=14):
-    i = d.Rs.index(region)
-    c_s = np.nonzero(np.cumsum(d.NewCases.data[i, :] > 0) == days + 1)[0][0]
-    d_s = np.nonzero(np.cumsum(d.NewDeaths.data[i, :] > 0) == days + 1)[0]
-    if len(d_s) > 0:
-        d_s = d_s[0]
-    else:
-        d_s = len(d.Ds)
+def save_masked_leavout(i, model, model_type, filename):
+    '''
+    save_traces for a leave-out in mask mode, dropping the left-out feature i, whose effect is the prior, from
+    CMReduction and from the R-hat and ESS of CM_VARIABLES
+    '''
+    savetxt_atomic(filename, np.delete(model.trace["CMReduction"], i, axis=1))
 
-    # mask the right days
-    d.Active.mask[i, c_s:] = True
-    d.Confirmed.mask[i, c_s:] = True
-    d.Deaths.mask[i, d_s:] = True
-    d.NewDeaths.mask[i, d_s:] = True
-    d.NewCases.mask[i, c_s:] = True
+    skip_elements = {name: [i] for name in CM_VARIABLES}
+    savetxt_atomic(filename[:-4] + "rhats.txt", calc_trace_statistic(model, 'rhat', skip_elements))
+    savetxt_atomic(filename[:-4] + "ess.txt", calc_trace_statistic(model, 'ess', skip_elements))
 
 
-def leavout_cm(data, cm_leavouts, i):
-    data_cm_leavout = copy.deepcopy(data)
-    print('CM left out: ' + cm_leavouts[i])
-    if cm_leavouts[i] == 'None':
-        pass
-    else:
-        data_cm_leavout.ActiveCMs = np.delete(data_cm_leavout.ActiveCMs, i, 1)
-        data_cm_leavout.CMs = np.delete(data_cm_leavout.CMs, i)
-    return data_cm_leavout
+def masked_elements(spec):
+    '''Elements of CM_VARIABLES sampled from their prior in a masked leave-out of `spec`, by variable'''
+    if not spec.data_spec.masks_cm():
+        return {}
+    return {name: [spec.data_spec.cm_leavout] for name in CM_VARIABLES}
+
+
+class SensitivityRunner(object):
+    '''
+    Collects the runs of one or more sensitivity analyses. Runs with the same model specification are sampled
+    once, and their outputs are all saved from that trace. Traces are looked up in, and added to, a ResultStore
+    in the directory `store` (None to disable). The stages of each model's run are appended to the JSONL file
+    `profile` (None to disable), see instrumentation.stage_table. Each model is recorded in the ResultsCatalog
+    `catalog` (None to disable) once its outputs are saved.
+    '''
+
+    def __init__(self, factory=None, store="result_store", profile="run_profile.jsonl", catalog=DEFAULT_CATALOG):
+        self.factory = ModelFactory() if factory is None else factory
+        self.store = ResultStore(store) if isinstance(store, str) else store
+        self.profile = profile
+        self.catalog = ResultsCatalog(catalog) if isinstance(catalog, str) else catalog
+        self.runs = []
+        self._memory = {}
+        # name of the analysis adding runs, recorded with them for dry_run
+        self.source = None
+
+    def add(self, spec, filename, save=None):
+        self.runs.append((spec, filename, save if save is not None else save_traces, self.source))
+
+    def plan(self):
+        '''list of (model spec, [(filename, save function)]), one entry per distinct model'''
+        plan = {}
+        for spec, filename, save, _ in self.runs:
+            plan.setdefault(spec.key(), (spec, []))[1].append((filename, save))
+        return list(plan.values())
+
+    def sources(self):
+        '''model spec key -> the source of its first run'''
+        sources = {}
+        for spec, _, _, source in self.runs:
+            sources.setdefault(spec.key(), source)
+        return sources
+
+    def dry_run(self, profile=None):
+        '''
+        The planned runs, without building or sampling any model (the data is preprocessed, to look up stored
+        results). Runs repeating an earlier run's model, or whose result is stored, are not sampled again. Times
+        are estimated from the run records in `profile` (default self.profile): those of the same result, else
+        the same spec, else the median of the same model type.
+
+        :return: DataFrame with one row per run: source, model_type, filename, duplicate_of, shares_graph,
+        cached, build_s, sample_s and core_hours (of the sampling left to do)
+        '''
+        history = timing_history(self.profile if profile is None else profile)
+        settings = sampler_settings()
+
+        rows = []
+        first_run = {}
+        built_graphs = set()
+        for i, (spec, filename, _, source) in enumerate(self.runs):
+            key = self.result_key(spec, settings)
+            duplicate_of = first_run.setdefault(spec.key(), i)
+            shares_graph = spec.graph_spec().key() in built_graphs and duplicate_of == i
+            built_graphs.add(spec.graph_spec().key())
+            cached = self.store is not None and key in self.store
+
+            build_s, sample_s = estimate_times(history, key, repr(spec), spec.model_type)
+            to_run = duplicate_of == i and not cached
+            core_hours = (build_s * (not shares_graph) + sample_s * settings['chains']) / 3600 if to_run else 0.
+            rows.append(dict(source=source, model_type=spec.model_type, filename=filename,
+                             duplicate_of=None if duplicate_of == i else duplicate_of, shares_graph=shares_graph,
+                             cached=cached, build_s=build_s, sample_s=sample_s, core_hours=core_hours))
+        return pd.DataFrame(rows, columns=['source', 'model_type', 'filename', 'duplicate_of', 'shares_graph',
+                                           'cached', 'build_s', 'sample_s', 'core_hours'])
+
+    def print_plan(self):
+        plan = self.plan()
+        print(f'{len(self.runs)} runs, {len(plan)} distinct models')
+        for spec, outputs in plan:
+            print(f'{spec}: {[filename for filename, _ in outputs]}')
+
+    def result_key(self, spec, settings):
+        # the number of cores does not change the result
+        settings = {name: value for name, value in settings.items() if name != 'cores'}
+        return result_key(self.factory.data(spec.data_spec).fingerprint(), spec.model_class.__name__, spec.attrs,
+                          spec.build_kwargs, settings)
+
+    def execute(self, sources=None):
+        '''
+        :param sources: model spec key -> source, recorded in the catalog; default those of the runs added
+        '''
+        plan = self.plan()
+        sources = self.sources() if sources is None else sources
+        # specs sharing a graph (masked leave-outs) run back-to-back on one model, released after the last
+        pending = {}
+        for spec, _ in plan:
+            pending[spec.graph_spec().key()] = pending.get(spec.graph_spec().key(), 0) + 1
+
+        for spec, outputs in plan:
+            print('Model: ' + str(spec.model_type))
+            with run_record(spec.model_type, self.profile, spec=repr(spec),
+                            outputs=[filename for filename, _ in outputs]) as record:
+                settings = sampler_settings()
+                key = self.result_key(spec, settings)
+                record.info['result_key'] = key
+
+                # stored results are loaded without building the model, unless stored without their free variables
+                fitted = not (self.store is not None and key in self.store)
+                if not fitted:
+                    print('Using stored result ' + key)
+                    with stage('load_result'):
+                        model = self.store.load_model(key, self.factory.data(spec.data_spec))
+                        if model is None:
+                            model = self.factory.model(spec)
+                            model.trace = self.store.load(key)
+                else:
+                    model = self.factory.model(spec)
+                    model.run(**settings)
+                    if self.store is not None:
+                        with stage('store_result'):
+                            self.store.save(key, model, info=dict(
+                                model_type=spec.model_type,
+                                data_fingerprint=self.factory.data(spec.data_spec).fingerprint(),
+                                attrs=list(spec.attrs), build_kwargs=spec.build_kwargs, sampler_settings=settings,
+                                outputs=[filename for filename, _ in outputs]))
+
+                with stage('save_outputs'):
+                    for filename, save in outputs:
+                        save(model, spec.model_type, filename)
+
+                run_name = os.path.splitext(os.path.basename(outputs[0][0]))[0]
+                # stored results are recorded when they were sampled, unless the catalog has not seen them
+                if self.catalog is not None and (fitted or not self.catalog.contains(sources.get(spec.key()),
+                                                                                     run_name, key)):
+                    with stage('catalog'):
+                        self.catalog.record(
+                            sources.get(spec.key()), run_name, model,
+                            params={**spec.params(), **{name: value for name, value in settings.items()
+                                                        if name != 'cores'}},
+                            result_key=key, trace_path=self.store.path(key) if self.store is not None else None,
+                            outputs=[filename for filename, _ in outputs], timings=record.walls(),
+                            skip_elements=masked_elements(spec))
+            pending[spec.graph_spec().key()] -= 1
+            if pending[spec.graph_spec().key()] == 0:
+                self.factory.release(spec)
+        self.runs = []
+
+    def memory_estimate(self, spec):
+        '''
+        Estimated peak memory in bytes of sampling `spec`, see memory.estimate_memory. The model is built to
+        measure it, once per model type, data shape and build_model arguments.
+        '''
+        graph_spec = spec.graph_spec()
+        data = self.factory.data(graph_spec.data_spec)
+        key = (spec.model_type, data.ActiveCMs.shape, repr(sorted(spec.build_kwargs.items())))
+        if key not in self._memory:
+            settings = sampler_settings()
+            self._memory[key] = estimate_memory(self.factory.model(graph_spec), settings['N'], settings['chains'],
+                                                settings['tune'], settings['cores'])['peak']
+            self.factory.release(graph_spec)
+        return self._memory[key]
+
+    def jobs(self, threads_per_chain=1, with_memory=True):
+        '''
+        The planned runs as SamplingJobs, one per model graph, so that masked leave-outs still share a model.
+        Each job carries its preprocessed data, so the data is preprocessed once here rather than in every job.
+
+        :param with_memory: give each job its memory estimate, for admission control by the scheduler
+        '''
+        groups = {}
+        for spec, outputs in self.plan():
+            groups.setdefault(spec.graph_spec().key(), []).append((spec, outputs))
+
+        all_sources = self.sources()
+        jobs = []
+        for graph_key, entries in groups.items():
+            data = {}
+            for spec, _ in entries:
+                for data_spec in [spec.data_spec, spec.data_spec.graph_spec()]:
+                    data[data_spec.key()] = (data_spec, self.factory.data(data_spec))
+            name = entries[0][0].model_type + '_' + hashlib.sha1(graph_key.encode()).hexdigest()[:12]
+            memory = max(self.memory_estimate(spec) for spec, _ in entries) if with_memory else None
+            sources = {spec.key(): all_sources.get(spec.key()) for spec, _ in entries}
+            jobs.append(SamplingJob(name, run_planned,
+                                    args=(entries, list(data.values()), self.store, self.profile, self.catalog,
+                                          sources),
+                                    chains=sampler_settings()['chains'], threads_per_chain=threads_per_chain,
+                                    memory=memory))
+        return jobs
+
+
+# stages before sampling, whose time is spent once per model graph
+BUILD_STAGES = ['model_init', 'build_model', 'check_test_point', 'find_start_point']
+
+
+def timing_history(profile):
+    '''build and sampling wall times of the sampled runs in the run record file `profile`'''
+    if profile is None or not os.path.exists(profile):
+        return pd.DataFrame(columns=['run', 'spec', 'result_key', 'build_s', 'sample_s'])
+
+    rows = []
+    for record in load_records(profile):
+        walls = {}
+        for s in record['stages']:
+            walls[s['stage']] = walls.get(s['stage'], 0) + s['wall']
+        if 'sample' in walls:
+            rows.append(dict(run=record['run'], spec=record.get('spec'), result_key=record.get('result_key'),
+                             build_s=sum(walls.get(name, 0) for name in BUILD_STAGES), sample_s=walls['sample']))
+    return pd.DataFrame(rows, columns=['run', 'spec', 'result_key', 'build_s', 'sample_s'])
+
+
+def estimate_times(history, result_key, spec, model_type):
+    '''(build, sampling) seconds of a run, from its most specific previous runs in history, or NaN'''
+    for matches in [history.result_key == result_key, history.spec == spec, history.run == model_type]:
+        if matches.any():
+            return history.build_s[matches].median(), history.sample_s[matches].median()
+    return np.nan, np.nan
+
+
+def run_planned(entries, data, store, profile, catalog=None, sources=None):
+    '''run (spec, outputs) entries of a SensitivityRunner plan, given their (data spec, data) pairs'''
+    runner = SensitivityRunner(store=store, profile=profile, catalog=catalog)
+    for data_spec, d in data:
+        runner.factory.set_data(data_spec, d)
+    for spec, outputs in entries:
+        for filename, save in outputs:
+            runner.add(spec, filename, save)
+    runner.execute(sources)
+
+
+def _runner(runner):
+    return SensitivityRunner() if runner is None else runner
+
+
+def _finish(plan, runner):
+    # when a runner is passed in, the runs are only planned and the caller executes them
+    if runner is None:
+        plan.execute()
 
 
 def region_holdout_sensitivity(model_types, regions_heldout=["NL", "PL", "PT", "CZ", "DE", "MX"],
                                daily_growth_noise=None, min_deaths=None, region_var_noise=0.1,
-                               data_path="notebooks/double-entry-data/double_entry_final.csv"):
-    dp = DataPreprocessor(drop_HS=True)
+                               data_path="notebooks/double-entry-data/double_entry_final.csv", runner=None):
+    plan = _runner(runner)
+    out_dir = generate_out_dir(daily_growth_noise)
 
     for region in regions_heldout:
-        data = dp.preprocess_data(data_path, "2020-05-30")
-        data.mask_reopenings()
-        if min_deaths is not None:
-            data.filter_region_min_deaths(min_deaths)
-        mask_region(data, region)
+        data_spec = DataSpec(data_path, min_deaths=min_deaths, heldout_region=region)
+        for model_type in model_types:
+            spec = ModelSpec(model_type, data_spec, daily_growth_noise, region_var_noise)
+            plan.add(spec, out_dir + '/regions_heldout_' + region + '_' + model_type + '.txt')
+
+    _finish(plan, runner)
+
+
+def run_region_holdout(data, region, model_type, daily_growth_noise, region_var_noise, data_path, min_deaths,
+                       filename):
+    '''one run of region_holdout_sweep, holding out region from the already preprocessed data'''
+    data_spec = DataSpec(data_path, min_deaths=min_deaths, heldout_region=region)
+    heldout = data.mask_overlay()
+    mask_region(heldout, region)
+
+    runner = SensitivityRunner()
+    runner.source = 'region_holdout_sweep'
+    runner.factory.set_data(data_spec, heldout)
+    runner.add(ModelSpec(model_type, data_spec, daily_growth_noise, region_var_noise), filename)
+    runner.execute()
 
+
+def region_holdout_sweep(model_types, regions_heldout=None, daily_growth_noise=None, min_deaths=None,
+                         region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv",
+                         n_cores=None, threads_per_chain=1, queue=None):
+    '''
+    region_holdout_sensitivity over many regions (default all) at once. The data is preprocessed once, each
+    held-out variant is a mask overlay of it, and the variants run concurrently within a budget of n_cores.
+
+    :param queue: if given, the runs are added to the work queue in this directory instead, see workqueue
+    :return: dict of job name -> exit code, or the number of jobs queued
+    '''
+    data_spec = DataSpec(data_path, min_deaths=min_deaths)
+    sizing = SensitivityRunner(store=None, profile=None, catalog=None)
+    data = sizing.factory.data(data_spec)
+    regions_heldout = data.Rs if regions_heldout is None else regions_heldout
+    out_dir = generate_out_dir(daily_growth_noise)
+    chains = sampler_settings()['chains']
+
+    jobs = []
+    for region in regions_heldout:
         for model_type in model_types:
-            print('Model: ' + str(model_type))
-            print('Heldout Region: ' + str(region))
-            if model_type == 'combined':
-                with cm_effect.models.CMCombined_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'active':
-                with cm_effect.models.CMActive_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'death':
-                with cm_effect.models.CMDeath_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_v3':
-                with cm_effect.models.CMCombined_Final_V3(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_icl':
-                with cm_effect.models.CMCombined_Final_ICL(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_dif':
-                with cm_effect.models.CMCombined_Final_DifEffects(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.RegionVariationNoise = region_var_noise
-                    model.build_model()
-            if model_type == 'combined_no_noise':
-                with cm_effect.models.CMCombined_Final_NoNoise(data) as model:
-                    model.build_model()
-            if model_type == 'combined_icl_no_noise':
-                with cm_effect.models.CMCombined_ICL_NoNoise(data) as model:
-                    model.build_model()
-            if model_type == 'combined_additive':
-                with cm_effect.models.CMCombined_Additive(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-
-            model.run(2000, tune=500, chains=4, cores=4)
-            out_dir = generate_out_dir(daily_growth_noise)
+            # holding out a region does not change the shape of the model, so the estimate is shared
+            memory = sizing.memory_estimate(ModelSpec(model_type, data_spec, daily_growth_noise, region_var_noise))
             filename = out_dir + '/regions_heldout_' + region + '_' + model_type + '.txt'
-            save_traces(model, model_type, filename)
+            jobs.append(SamplingJob(f'regions_heldout_{region}_{model_type}', run_region_holdout,
+                                    args=(data, region, model_type, daily_growth_noise, region_var_noise,
+                                          data_path, min_deaths, filename),
+                                    chains=chains, threads_per_chain=threads_per_chain, memory=memory))
+    if queue is not None:
+        return enqueue(jobs, queue)
+    return run_jobs(jobs, n_cores)
 
 
 def cm_leavout_sensitivity(model_types, daily_growth_noise=None, min_deaths=None,
-                           region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv"):
-    dp = DataPreprocessor(drop_HS=True)
-    data = dp.preprocess_data(data_path, "2020-05-30")
-    data.mask_reopenings()
-    if min_deaths is not None:
-        data.filter_region_min_deaths(min_deaths)
+                           region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv",
+                           cm_indices=slice(0, 5), mode='delete', runner=None):
+    '''
+    :param cm_indices: slice or list of the indices of the features to leave out, one at a time
+    :param mode: 'delete' to remove the feature, or 'mask' to zero it, so that all leave-outs of a model type
+    share one model. Model types whose features share a prior (combined_additive) are always run in 'delete'
+    mode, see factory.MASK_LEAVOUT_TYPES. Either way the saved CMReduction has no column for the left-out
+    feature.
+    '''
+    plan = _runner(runner)
+    out_dir = generate_out_dir(daily_growth_noise)
 
-    cm_leavouts = copy.deepcopy(data.CMs)
-    # cm_leavouts.append('None')
+    if isinstance(cm_indices, slice):
+        n_cms = len(plan.factory.data(DataSpec(data_path, min_deaths=min_deaths)).CMs)
+        cm_indices = range(n_cms)[cm_indices]
 
     for model_type in model_types:
-        for i in range(len(cm_leavouts)):
-            data_cm_leavout = leavout_cm(data, cm_leavouts, i)
-            print('Model: ' + str(model_type))
-            if model_type == 'combined':
-                with cm_effect.models.CMCombined_Final(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'active':
-                with cm_effect.models.CMActive_Final(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'death':
-                with cm_effect.models.CMDeath_Final(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_v3':
-                with cm_effect.models.CMCombined_Final_V3(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_icl':
-                with cm_effect.models.CMCombined_Final_ICL(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_dif':
-                with cm_effect.models.CMCombined_Final_DifEffects(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.RegionVariationNoise = region_var_noise
-                    model.build_model()
-            if model_type == 'combined_no_noise':
-                with cm_effect.models.CMCombined_Final_NoNoise(data_cm_leavout) as model:
-                    model.build_model()
-            if model_type == 'combined_icl_no_noise':
-                with cm_effect.models.CMCombined_ICL_NoNoise(data_cm_leavout) as model:
-                    model.build_model()
-            if model_type == 'combined_additive':
-                with cm_effect.models.CMCombined_Additive(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-
-            model.run(2000, tune=500, chains=4, cores=4)
-            out_dir = generate_out_dir(daily_growth_noise)
-            filename = out_dir + '/cm_leavout_' + model_type + '_' + str(i) + '.txt'
-            save_traces(model, model_type, filename)
+        model_mode = mode
+        if mode == 'mask' and model_type not in MASK_LEAVOUT_TYPES:
+            log.info(f'{model_type} cannot mask features, they are deleted instead')
+            model_mode = 'delete'
+        for i in cm_indices:
+            data_spec = DataSpec(data_path, min_deaths=min_deaths, cm_leavout=i, cm_leavout_mode=model_mode)
+            spec = ModelSpec(model_type, data_spec, daily_growth_noise, region_var_noise)
+            plan.add(spec, out_dir + '/cm_leavout_' + model_type + '_' + str(i) + '.txt',
+                     save=functools.partial(save_masked_leavout, i) if model_mode == 'mask' else None)
 
-def cm_leavout_sensitivity(model_types, daily_growth_noise=None, min_deaths=None,
-                           region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv"):
-    dp = DataPreprocessor(drop_HS=True)
-    data = dp.preprocess_data(data_path, "2020-05-30")
-    data.mask_reopenings()
-    if min_deaths is not None:
-        data.filter_region_min_deaths(min_deaths)
-
-    cm_leavouts = copy.deepcopy(data.CMs)[:5]
-    # cm_leavouts.append('None')
+    _finish(plan, runner)
 
-    for model_type in model_types:
-        for i in range(len(cm_leavouts)):
-            data_cm_leavout = leavout_cm(data, cm_leavouts, i)
-            print('Model: ' + str(model_type))
-            if model_type == 'combined':
-                with cm_effect.models.CMCombined_Final(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'active':
-                with cm_effect.models.CMActive_Final(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'death':
-                with cm_effect.models.CMDeath_Final(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_v3':
-                with cm_effect.models.CMCombined_Final_V3(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_icl':
-                with cm_effect.models.CMCombined_Final_ICL(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_dif':
-                with cm_effect.models.CMCombined_Final_DifEffects(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.RegionVariationNoise = region_var_noise
-                    model.build_model()
-            if model_type == 'combined_no_noise':
-                with cm_effect.models.CMCombined_Final_NoNoise(data_cm_leavout) as model:
-                    model.build_model()
-            if model_type == 'combined_icl_no_noise':
-                with cm_effect.models.CMCombined_ICL_NoNoise(data_cm_leavout) as model:
-                    model.build_model()
-            if model_type == 'combined_additive':
-                with cm_effect.models.CMCombined_Additive(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-
-            model.run(2000, tune=500, chains=4, cores=4)
-            out_dir = generate_out_dir(daily_growth_noise)
-            filename = out_dir + '/cm_leavout_' + model_type + '_' + str(i) + '.txt'
-            save_traces(model, model_type, filename)
 
 def cm_leavout_sensitivity2(model_types, daily_growth_noise=None, min_deaths=None,
-                           region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv"):
-    dp = DataPreprocessor(drop_HS=True)
-    data = dp.preprocess_data(data_path, "2020-05-30")
-    data.mask_reopenings()
-    if min_deaths is not None:
-        data.filter_region_min_deaths(min_deaths)
+                            region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv",
+                            mode='delete', runner=None):
+    '''features from the sixth onwards, complementing the default of cm_leavout_sensitivity'''
+    cm_leavout_sensitivity(model_types, daily_growth_noise, min_deaths, region_var_noise, data_path,
+                           cm_indices=slice(5, None), mode=mode, runner=runner)
 
-    cm_leavouts = copy.deepcopy(data.CMs)[5:]
-    # cm_leavouts.append('None')
 
-    for model_type in model_types:
-        for i in range(len(cm_leavouts)):
-            data_cm_leavout = leavout_cm(data, cm_leavouts, i+5)
-            print('Model: ' + str(model_type))
-            if model_type == 'combined':
-                with cm_effect.models.CMCombined_Final(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'active':
-                with cm_effect.models.CMActive_Final(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'death':
-                with cm_effect.models.CMDeath_Final(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_v3':
-                with cm_effect.models.CMCombined_Final_V3(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_icl':
-                with cm_effect.models.CMCombined_Final_ICL(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_dif':
-                with cm_effect.models.CMCombined_Final_DifEffects(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.RegionVariationNoise = region_var_noise
-                    model.build_model()
-            if model_type == 'combined_no_noise':
-                with cm_effect.models.CMCombined_Final_NoNoise(data_cm_leavout) as model:
-                    model.build_model()
-            if model_type == 'combined_icl_no_noise':
-                with cm_effect.models.CMCombined_ICL_NoNoise(data_cm_leavout) as model:
-                    model.build_model()
-            if model_type == 'combined_additive':
-                with cm_effect.models.CMCombined_Additive(data_cm_leavout) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-
-            model.run(2000, tune=500, chains=4, cores=4)
-            out_dir = generate_out_dir(daily_growth_noise)
-            filename = out_dir + '/cm_leavout_' + model_type + '_' + str(i+5) + '.txt'
-            save_traces(model, model_type, filename)
+def prior_build_kwargs(model_type, prior, sigma_wide):
+    '''
+    build_model arguments of `prior` for `model_type`, or None if the prior does not apply to it. Numeric priors
+    are Dirichlet concentrations of combined_additive, the named priors those of the other models.
+    '''
+    if prior == 'default':
+        return {}
+    if model_type == 'combined_additive':
+        kwargs = dict(cm_prior_conc=prior)
+    else:
+        kwargs = {
+            'wide': dict(cm_prior_sigma=sigma_wide),
+            'half_normal': dict(cm_prior='half_normal'),
+            'icl': dict(cm_prior='icl'),
+        }.get(prior)
+    if kwargs is None or build_kwargs_error(model_type, kwargs) is not None:
+        return None
+    return kwargs
+
 
 def cm_prior_sensitivity(model_types, priors=['half_normal', 'wide', "icl"], sigma_wide=10,
                          daily_growth_noise=None, min_deaths=None, region_var_noise=0.1,
-                         data_path="notebooks/double-entry-data/double_entry_final.csv"):
-    dp = DataPreprocessor(drop_HS=True)
-    data = dp.preprocess_data(data_path, "2020-05-30")
-    data.mask_reopenings()
-    if min_deaths is not None:
-        data.filter_region_min_deaths(min_deaths)
+                         data_path="notebooks/double-entry-data/double_entry_final.csv", runner=None):
+    plan = _runner(runner)
+    out_dir = generate_out_dir(daily_growth_noise)
+    data_spec = DataSpec(data_path, min_deaths=min_deaths)
 
     for model_type in model_types:
         for prior in priors:
-            print('Prior: ' + str(prior))
-            print('Model: ' + model_type)
-            if model_type == 'combined':
-                with cm_effect.models.CMCombined_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    if prior == 'default':
-                        model.build_model()
-                    if prior == 'wide':
-                        model.build_model(cm_prior_sigma=sigma_wide)
-                    if prior == 'half_normal':
-                        model.build_model(cm_prior='half_normal')
-                    if prior == 'icl':
-                        model.build_model(cm_prior='icl')
-            if model_type == 'active':
-                with cm_effect.models.CMActive_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    if prior == 'default':
-                        model.build_model()
-                    if prior == 'wide':
-                        model.build_model(cm_prior_sigma=sigma_wide)
-                    if prior == 'half_normal':
-                        model.build_model(cm_prior='half_normal')
-            if model_type == 'death':
-                with cm_effect.models.CMDeath_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    if prior == 'default':
-                        model.build_model()
-                    if prior == 'wide':
-                        model.build_model(cm_prior_sigma=sigma_wide)
-                    if prior == 'half_normal':
-                        model.build_model(cm_prior='half_normal')
-            if model_type == 'combined_v3':
-                with cm_effect.models.CMCombined_Final_V3(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    if prior == 'default':
-                        model.build_model()
-                    if prior == 'wide':
-                        model.build_model(cm_prior_sigma=sigma_wide)
-                    if prior == 'half_normal':
-                        model.build_model(cm_prior='half_normal')
-            if model_type == 'combined_icl':
-                with cm_effect.models.CMCombined_Final_ICL(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    if prior == 'default':
-                        model.build_model()
-                    if prior == 'wide':
-                        model.build_model(cm_prior_sigma=sigma_wide)
-                    if prior == 'half_normal':
-                        model.build_model(cm_prior='half_normal')
-            if model_type == 'combined_dif':
-                with cm_effect.models.CMCombined_Final_DifEffects(data) as model:
-                    model.RegionVariationNoise = region_var_noise
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    if prior == 'default':
-                        model.build_model()
-                    if prior == 'wide':
-                        model.build_model(cm_prior_sigma=sigma_wide)
-                    if prior == 'half_normal':
-                        model.build_model(cm_prior='half_normal')
-            if model_type == 'combined_no_noise':
-                with cm_effect.models.CMCombined_Final_NoNoise(data) as model:
-                    if prior == 'default':
-                        model.build_model()
-                    if prior == 'wide':
-                        model.build_model(cm_prior_sigma=sigma_wide)
-                    if prior == 'half_normal':
-                        model.build_model(cm_prior='half_normal')
-            if model_type == 'combined_icl_no_noise':
-                with cm_effect.models.CMCombined_ICL_NoNoise(data) as model:
-                    if prior == 'default':
-                        model.build_model()
-                    if prior == 'wide':
-                        model.build_model(cm_prior_sigma=sigma_wide)
-                    if prior == 'half_normal':
-                        model.build_model(cm_prior='half_normal')
-            if model_type == 'combined_additive':
-                with cm_effect.models.CMCombined_Additive(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    if prior == 5:
-                        model.build_model(cm_prior_conc=5)
-                    if prior == 10:
-                        model.build_model(cm_prior_conc=10)
-
-            model.run(2000, tune=500, chains=4, cores=4)
-            out_dir = generate_out_dir(daily_growth_noise)
-            filename = out_dir + '/cm_prior_' + model_type + '_' + str(prior) + '.txt'
-            save_traces(model, model_type, filename)
+            build_kwargs = prior_build_kwargs(model_type, prior, sigma_wide)
+            if build_kwargs is None:
+                log.info(f'Prior {prior} does not apply to {model_type}, skipped')
+                continue
+            spec = ModelSpec(model_type, data_spec, daily_growth_noise, region_var_noise,
+                             build_kwargs=build_kwargs)
+            plan.add(spec, out_dir + '/cm_prior_' + model_type + '_' + str(prior) + '.txt')
+
+    _finish(plan, runner)
 
 
 def data_mob_sensitivity(model_types, daily_growth_noise=None, min_deaths=None,
-                         region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv"):
-    dp = DataPreprocessor(drop_HS=True)
-    data_mob_no_work = dp.preprocess_data("notebooks/final_data/data_mob_no_work.csv")
-    data_mob = dp.preprocess_data("notebooks/final_data/data_mob.csv")
-
-    data_mobility_types = ['no_work', 'rec_work']
-
-    for data_mobility_type in data_mobility_types:
-        if data_mobility_type == 'no_work':
-            data = copy.deepcopy(data_mob_no_work)
-        if data_mobility_type == 'rec_work':
-            data = copy.deepcopy(data_mob)
-        if min_deaths is not None:
-            data.filter_region_min_deaths(min_deaths)
+                         region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv",
+                         runner=None):
+    plan = _runner(runner)
+    out_dir = generate_out_dir(daily_growth_noise)
+    data_mobility_paths = {'no_work': "notebooks/final_data/data_mob_no_work.csv",
+                           'rec_work': "notebooks/final_data/data_mob.csv"}
+
+    for data_mobility_type, mobility_path in data_mobility_paths.items():
+        data_spec = DataSpec(mobility_path, last_day=None, mask_reopenings=False, min_deaths=min_deaths)
         for model_type in model_types:
-            print('Model: ' + str(model_type))
-            print('Data Mobility Type: ' + str(data_mobility_type))
-            if model_type == 'combined':
-                with cm_effect.models.CMCombined_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'active':
-                with cm_effect.models.CMActive_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'death':
-                with cm_effect.models.CMDeath_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_v3':
-                with cm_effect.models.CMCombined_Final_V3(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_icl':
-                with cm_effect.models.CMCombined_Final_ICL(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_dif':
-                with cm_effect.models.CMCombined_Final_DifEffects(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.RegionVariationNoise = region_var_noise
-                    model.build_model()
-            if model_type == 'combined_no_noise':
-                with cm_effect.models.CMCombined_Final_NoNoise(data) as model:
-                    model.build_model()
-            if model_type == 'combined_icl_no_noise':
-                with cm_effect.models.CMCombined_ICL_NoNoise(data) as model:
-                    model.build_model()
-            if model_type == 'combined_additive':
-                with cm_effect.models.CMCombined_Additive(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-
-            model.run(2000, tune=500, chains=4, cores=4)
-            out_dir = generate_out_dir(daily_growth_noise)
-            filename = out_dir + '/data_mobility_' + data_mobility_type + '_' + model_type + '.txt'
-            save_traces(model, model_type, filename)
+            spec = ModelSpec(model_type, data_spec, daily_growth_noise, region_var_noise)
+            plan.add(spec, out_dir + '/data_mobility_' + data_mobility_type + '_' + model_type + '.txt')
+
+    _finish(plan, runner)
 
 
 def data_schools_open_sensitivity(model_types, daily_growth_noise=None, min_deaths=None,
-                                  region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv"):
-    dp = DataPreprocessor(drop_HS=True)
-    data = dp.preprocess_data("notebooks/final_data/data_SE_schools_open.csv")
-    if min_deaths is not None:
-        data.filter_region_min_deaths(min_deaths)
+                                  region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv",
+                                  runner=None):
+    plan = _runner(runner)
+    out_dir = generate_out_dir(daily_growth_noise)
+    data_spec = DataSpec("notebooks/final_data/data_SE_schools_open.csv", last_day=None, mask_reopenings=False,
+                         min_deaths=min_deaths)
 
     for model_type in model_types:
-        print('Model: ' + str(model_type))
-        if model_type == 'combined':
-            with cm_effect.models.CMCombined_Final(data) as model:
-                if daily_growth_noise is not None:
-                    model.DailyGrowthNoise = daily_growth_noise
-                model.build_model()
-        if model_type == 'active':
-            with cm_effect.models.CMActive_Final(data) as model:
-                if daily_growth_noise is not None:
-                    model.DailyGrowthNoise = daily_growth_noise
-                model.build_model()
-        if model_type == 'death':
-            with cm_effect.models.CMDeath_Final(data) as model:
-                if daily_growth_noise is not None:
-                    model.DailyGrowthNoise = daily_growth_noise
-                model.build_model()
-        if model_type == 'combined_v3':
-            with cm_effect.models.CMCombined_Final_V3(data) as model:
-                if daily_growth_noise is not None:
-                    model.DailyGrowthNoise = daily_growth_noise
-                model.build_model()
-        if model_type == 'combined_icl':
-            with cm_effect.models.CMCombined_Final_ICL(data) as model:
-                if daily_growth_noise is not None:
-                    model.DailyGrowthNoise = daily_growth_noise
-                model.build_model()
-        if model_type == 'combined_dif':
-            with cm_effect.models.CMCombined_Final_DifEffects(data) as model:
-                if daily_growth_noise is not None:
-                    model.DailyGrowthNoise = daily_growth_noise
-                model.RegionVariationNoise = region_var_noise
-                model.build_model()
-        if model_type == 'combined_no_noise':
-            with cm_effect.models.CMCombined_Final_NoNoise(data) as model:
-                model.build_model()
-        if model_type == 'combined_icl_no_noise':
-            with cm_effect.models.CMCombined_ICL_NoNoise(data) as model:
-                model.build_model()
-        if model_type == 'combined_additive':
-            with cm_effect.models.CMCombined_Additive(data) as model:
-                if daily_growth_noise is not None:
-                    model.DailyGrowthNoise = daily_growth_noise
-                model.build_model()
-
-        model.run(2000, tune=500, chains=4, cores=4)
-        out_dir = generate_out_dir(daily_growth_noise)
-        filename = out_dir + '/schools_open_' + model_type + '.txt'
-        save_traces(model, model_type, filename)
+        spec = ModelSpec(model_type, data_spec, daily_growth_noise, region_var_noise)
+        plan.add(spec, out_dir + '/schools_open_' + model_type + '.txt')
+
+    _finish(plan, runner)
 
 
 def daily_growth_noise_sensitivity(model_types, daily_growth_noise=[0.05, 0.1, 0.4],
                                    min_deaths=None, region_var_noise=0.1,
-                                   data_path="notebooks/double-entry-data/double_entry_final.csv"):
-    dp = DataPreprocessor(drop_HS=True)
-    data = dp.preprocess_data(data_path, "2020-05-30")
-    data.mask_reopenings()
-    if min_deaths is not None:
-        data.filter_region_min_deaths(min_deaths)
+                                   data_path="notebooks/double-entry-data/double_entry_final.csv", runner=None):
+    plan = _runner(runner)
+    out_dir = generate_out_dir(daily_growth_noise)
+    data_spec = DataSpec(data_path, min_deaths=min_deaths)
 
     for i in range(len(daily_growth_noise)):
         for model_type in model_types:
-            print('Daily Growth Noise: ' + str(daily_growth_noise[i]))
-            print('Model: ' + str(model_type))
-            if model_type == 'combined':
-                with cm_effect.models.CMCombined_Final(data) as model:
-                    model.DailyGrowthNoise = daily_growth_noise[i]
-                    model.build_model()
-            if model_type == 'active':
-                with cm_effect.models.CMActive_Final(data) as model:
-                    model.DailyGrowthNoise = daily_growth_noise[i]
-                    model.build_model()
-            if model_type == 'death':
-                with cm_effect.models.CMDeath_Final(data) as model:
-                    model.DailyGrowthNoise = daily_growth_noise[i]
-                    model.build_model()
-            if model_type == 'combined_v3':
-                with cm_effect.models.CMCombined_Final_V3(data) as model:
-                    model.DailyGrowthNoise = daily_growth_noise[i]
-                    model.build_model()
-            if model_type == 'combined_icl':
-                with cm_effect.models.CMCombined_Final_ICL(data) as model:
-                    model.DailyGrowthNoise = daily_growth_noise[i]
-                    model.build_model()
-            if model_type == 'combined_dif':
-                with cm_effect.models.CMCombined_Final_DifEffects(data) as model:
-                    model.DailyGrowthNoise = daily_growth_noise[i]
-                    model.RegionVariationNoise = region_var_noise
-                    model.build_model()
-            if model_type == 'combined_additive':
-                with cm_effect.models.CMCombined_Additive(data) as model:
-                    model.DailyGrowthNoise = daily_growth_noise[i]
-                    model.build_model()
-
-            model.run(2000, tune=500, chains=4, cores=4)
-            out_dir = generate_out_dir(daily_growth_noise)
-            filename = out_dir + '/growth_noise_' + model_type + '_' + str(i) + '.txt'
-            save_traces(model, model_type, filename)
+            if not takes_attribute(model_type, 'DailyGrowthNoise'):
+                print('Skipping ' + model_type + ', which has no daily growth noise')
+                continue
+            spec = ModelSpec(model_type, data_spec, daily_growth_noise[i], region_var_noise)
+            plan.add(spec, out_dir + '/growth_noise_' + model_type + '_' + str(i) + '.txt')
 
+    _finish(plan, runner)
 
-def min_num_confirmed_sensitivity(model_types, min_conf_cases=[10, 30, 300, 500],
-                                  daily_growth_noise=None, min_deaths=None,
-                                  region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv"):
-    dp = DataPreprocessor(drop_HS=True)
+
+def _preprocessor_sensitivity(model_types, name, values, attr, daily_growth_noise, min_deaths, region_var_noise,
+                              data_path, runner):
+    plan = _runner(runner)
+    out_dir = generate_out_dir(daily_growth_noise)
 
     for model_type in model_types:
-        for i in range(len(min_conf_cases)):
-            print('Model: ' + str(model_type))
-            print('Minimum number of confirmed cases: ' + str(min_conf_cases[i]))
-            dp.min_confirmed = min_conf_cases[i]
-            data = dp.preprocess_data(data_path, "2020-05-30")
-            data.mask_reopenings()
-            if min_deaths is not None:
-                data.filter_region_min_deaths(min_deaths)
-
-            if model_type == 'active':
-                with cm_effect.models.CMActive_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined':
-                with cm_effect.models.CMCombined_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_v3':
-                with cm_effect.models.CMCombined_Final_V3(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_icl':
-                with cm_effect.models.CMCombined_Final_ICL(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_dif':
-                with cm_effect.models.CMCombined_Final_DifEffects(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.RegionVariationNoise = region_var_noise
-                    model.build_model()
-            if model_type == 'combined_no_noise':
-                with cm_effect.models.CMCombined_Final_NoNoise(data) as model:
-                    model.build_model()
-            if model_type == 'combined_icl_no_noise':
-                with cm_effect.models.CMCombined_ICL_NoNoise(data) as model:
-                    model.build_model()
-            if model_type == 'combined_additive':
-                with cm_effect.models.CMCombined_Additive(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            model.run(2000, tune=500, chains=4, cores=4)
-            out_dir = generate_out_dir(daily_growth_noise)
-            filename = out_dir + '/min_confirmed_' + str(model_type) + '_' + str(min_conf_cases[i]) + '.txt'
-            save_traces(model, model_type, filename)
+        for value in values:
+            data_spec = DataSpec(data_path, preprocessor_attrs={attr: value}, min_deaths=min_deaths)
+            spec = ModelSpec(model_type, data_spec, daily_growth_noise, region_var_noise)
+            plan.add(spec, out_dir + '/' + name + '_' + str(model_type) + '_' + str(value) + '.txt')
+
+    _finish(plan, runner)
+
+
+def min_num_confirmed_sensitivity(model_types, min_conf_cases=[10, 30, 300, 500],
+                                  daily_growth_noise=None, min_deaths=None,
+                                  region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv",
+                                  runner=None):
+    _preprocessor_sensitivity(model_types, 'min_confirmed', min_conf_cases, 'min_confirmed', daily_growth_noise,
+                              min_deaths, region_var_noise, data_path, runner)
 
 
 def min_num_deaths_sensitivity(model_types, min_deaths_ths=[3, 5, 30, 50],
                                daily_growth_noise=None, min_deaths=None,
-                               region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv"):
-    dp = DataPreprocessor(drop_HS=True)
-
-    for model_type in model_types:
-        for i in range(len(min_deaths_ths)):
-            print('Model: ' + str(model_type))
-            print('Minimum number of death cases: ' + str(min_deaths_ths[i]))
-            dp.min_deaths = min_deaths_ths[i]
-            data = dp.preprocess_data(data_path, "2020-05-30")
-            data.mask_reopenings()
-            if min_deaths is not None:
-                data.filter_region_min_deaths(min_deaths)
-
-            if model_type == 'active':
-                with cm_effect.models.CMActive_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined':
-                with cm_effect.models.CMCombined_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_v3':
-                with cm_effect.models.CMCombined_Final_V3(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_icl':
-                with cm_effect.models.CMCombined_Final_ICL(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_dif':
-                with cm_effect.models.CMCombined_Final_DifEffects(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.RegionVariationNoise = region_var_noise
-                    model.build_model()
-            if model_type == 'combined_no_noise':
-                with cm_effect.models.CMCombined_Final_NoNoise(data) as model:
-                    model.build_model()
-            if model_type == 'combined_icl_no_noise':
-                with cm_effect.models.CMCombined_ICL_NoNoise(data) as model:
-                    model.build_model()
-            if model_type == 'combined_additive':
-                with cm_effect.models.CMCombined_Additive(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            model.run(2000, tune=500, chains=4, cores=4)
-            out_dir = generate_out_dir(daily_growth_noise)
-            filename = out_dir + '/min_deaths_' + str(model_type) + '_' + str(min_deaths_ths[i]) + '.txt'
-            save_traces(model, model_type, filename)
+                               region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv",
+                               runner=None):
+    _preprocessor_sensitivity(model_types, 'min_deaths', min_deaths_ths, 'min_deaths', daily_growth_noise,
+                              min_deaths, region_var_noise, data_path, runner)
 
 
 def smoothing_sensitivity(model_types, N_days=[1, 3, 7, 15],
                           daily_growth_noise=None, min_deaths=None,
-                          region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv"):
-    dp = DataPreprocessor(drop_HS=True)
+                          region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv",
+                          runner=None):
+    _preprocessor_sensitivity(model_types, 'smoothing', N_days, 'N_smooth', daily_growth_noise,
+                              min_deaths, region_var_noise, data_path, runner)
 
-    for model_type in model_types:
-        for i in range(len(N_days)):
-            print('Model: ' + str(model_type))
-            print('Minimum number of days: ' + str(N_days[i]))
-            dp.N_smooth = N_days[i]
-            data = dp.preprocess_data(data_path, "2020-05-30")
-            data.mask_reopenings()
-            if min_deaths is not None:
-                data.filter_region_min_deaths(min_deaths)
-
-            if model_type == 'active':
-                with cm_effect.models.CMActive_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined':
-                with cm_effect.models.CMCombined_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_v3':
-                with cm_effect.models.CMCombined_Final_V3(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_icl':
-                with cm_effect.models.CMCombined_Final_ICL(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            if model_type == 'combined_dif':
-                with cm_effect.models.CMCombined_Final_DifEffects(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.RegionVariationNoise = region_var_noise
-                    model.build_model()
-            if model_type == 'combined_no_noise':
-                with cm_effect.models.CMCombined_Final_NoNoise(data) as model:
-                    model.build_model()
-            if model_type == 'combined_icl_no_noise':
-                with cm_effect.models.CMCombined_ICL_NoNoise(data) as model:
-                    model.build_model()
-            if model_type == 'combined_additive':
-                with cm_effect.models.CMCombined_Additive(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model()
-            model.run(2000, tune=500, chains=4, cores=4)
-            out_dir = generate_out_dir(daily_growth_noise)
-            filename = out_dir + '/smoothing_' + str(model_type) + '_' + str(N_days[i]) + '.txt'
-            save_traces(model, model_type, filename)
-
-
-def calc_trace_statistic(model, stat_type):
-    if stat_type == 'rhat':
-        stat = az.rhat(model.trace)
-    if stat_type == 'ess':
-        stat = az.ess(model.trace, relative=True)
-    stat_all = []
-    stat_nums = []
-    for i in range(len(model.vars)):
-        var = model.vars[i]
-        if str(var)[-6:-1] == '_log_':
-            var = str(var)[0:-6]
-        if '_stickbreaking__' in str(var):
-            var = str(var)[0:-16]
-        if stat[str(var)].size > 1:
-            stat_all.append(stat[str(var)].to_dataframe().to_numpy().flatten())
-        else:
-            stat_nums.append(float(stat[str(var)]))
-    stat_all = np.concatenate(np.array(stat_all))
-    stat_all = np.concatenate([stat_all, stat_nums])
-    return stat_all
+
+@instrumented('calc_trace_statistic')
+def calc_trace_statistic(model, stat_type, skip_elements=None):
+    '''
+    R-hat ('rhat') or relative bulk ESS ('ess') of the free variables: the elements of the non-scalar variables
+    in model order, then the scalar variables. See diagnostics.diagnostics for the labelled table, which is
+    cached on the model, so computing both statistics only computes the diagnostics once.
+
+    :param skip_elements: dict of variable name -> flat indices of elements to leave out
+    '''
+    table = diagnostics(model)
+    if skip_elements is not None:
+        table = drop_elements(table, skip_elements)
+    column = {'rhat': 'r_hat', 'ess': 'ess_relative'}[stat_type]
+    sizes = table.groupby('variable', sort=False).size()
+    arrays = [table[column][table.variable == name] for name in sizes.index if sizes[name] > 1]
+    scalars = [table[column][table.variable == name] for name in sizes.index if sizes[name] == 1]
+    return np.concatenate([*arrays, *scalars])
+
+
+def save_stability(model, model_type, filename):
+    out_dir = os.path.dirname(filename)
+    savetxt_atomic(out_dir + '/rhats_' + model_type + '.txt', calc_trace_statistic(model, 'rhat'))
+    savetxt_atomic(out_dir + '/ess_' + model_type + '.txt', calc_trace_statistic(model, 'ess'))
+    save_traces(model, model_type, filename)
 
 
 def MCMC_stability(model_types, daily_growth_noise=None, min_deaths=None,
-                   region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv"):
-    dp = DataPreprocessor(drop_HS=True)
-    data = dp.preprocess_data(data_path, "2020-05-30")
-    data.mask_reopenings()
-    if min_deaths is not None:
-        data.filter_region_min_deaths(min_deaths)
+                   region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv", runner=None):
+    plan = _runner(runner)
+    out_dir = generate_out_dir(daily_growth_noise)
+    data_spec = DataSpec(data_path, min_deaths=min_deaths)
 
     for model_type in model_types:
-        print('Model: ' + str(model_type))
-        if model_type == 'combined':
-            with cm_effect.models.CMCombined_Final(data) as model:
-                if daily_growth_noise is not None:
-                    model.DailyGrowthNoise = daily_growth_noise
-                model.build_model()
-        if model_type == 'active':
-            with cm_effect.models.CMActive_Final(data) as model:
-                if daily_growth_noise is not None:
-                    model.DailyGrowthNoise = daily_growth_noise
-                model.build_model()
-        if model_type == 'death':
-            with cm_effect.models.CMDeath_Final(data) as model:
-                if daily_growth_noise is not None:
-                    model.DailyGrowthNoise = daily_growth_noise
-                model.build_model()
-        if model_type == 'combined_v3':
-            with cm_effect.models.CMCombined_Final_V3(data) as model:
-                if daily_growth_noise is not None:
-                    model.DailyGrowthNoise = daily_growth_noise
-                model.build_model()
-        if model_type == 'combined_icl':
-            with cm_effect.models.CMCombined_Final_ICL(data) as model:
-                if daily_growth_noise is not None:
-                    model.DailyGrowthNoise = daily_growth_noise
-                model.build_model()
-        if model_type == 'combined_dif':
-            with cm_effect.models.CMCombined_Final_DifEffects(data) as model:
-                if daily_growth_noise is not None:
-                    model.DailyGrowthNoise = daily_growth_noise
-                model.RegionVariationNoise = region_var_noise
-                model.build_model()
-        if model_type == 'combined_no_noise':
-            with cm_effect.models.CMCombined_Final_NoNoise(data) as model:
-                model.build_model()
-        if model_type == 'combined_icl_no_noise':
-            with cm_effect.models.CMCombined_ICL_NoNoise(data) as model:
-                model.build_model()
-        if model_type == 'combined_additive':
-            with cm_effect.models.CMCombined_Additive(data) as model:
-                if daily_growth_noise is not None:
-                    model.DailyGrowthNoise = daily_growth_noise
-                model.build_model()
-
-        model.run(2000, tune=500, chains=4, cores=4)
-        rhats = calc_trace_statistic(model, 'rhat')
-        ess = calc_trace_statistic(model, 'ess')
-
-        out_dir = generate_out_dir(daily_growth_noise)
-        np.savetxt(out_dir + '/rhats_' + model_type + '.txt', rhats)
-        np.savetxt(out_dir + '/ess_' + model_type + '.txt', ess)
-        filename = out_dir + '/default_' + model_type + '.txt'
-        save_traces(model, model_type, filename)
+        spec = ModelSpec(model_type, data_spec, daily_growth_noise, region_var_noise)
+        plan.add(spec, out_dir + '/default_' + model_type + '.txt', save=save_stability)
+
+    _finish(plan, runner)
 
 
 def R_hyperprior_mean_sensitivity(model_types, hyperprior_means=[2.5, 4.5],
                                   daily_growth_noise=None, min_deaths=None,
-                                  region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv"):
-    dp = DataPreprocessor(drop_HS=True)
-    data = dp.preprocess_data(data_path, "2020-05-30")
-    data.mask_reopenings()
-    if min_deaths is not None:
-        data.filter_region_min_deaths(min_deaths)
+                                  region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv",
+                                  runner=None):
+    plan = _runner(runner)
+    out_dir = generate_out_dir(daily_growth_noise)
+    data_spec = DataSpec(data_path, min_deaths=min_deaths)
 
     for i in range(len(hyperprior_means)):
         for model_type in model_types:
-            print('R Hyperprior mean: ' + str(hyperprior_means[i]))
-            print('Model: ' + str(model_type))
-            if model_type == 'combined':
-                with cm_effect.models.CMCombined_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model(R_hyperprior_mean=hyperprior_means[i])
-            if model_type == 'active':
-                with cm_effect.models.CMActive_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model(R_hyperprior_mean=hyperprior_means[i])
-            if model_type == 'death':
-                with cm_effect.models.CMDeath_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model(R_hyperprior_mean=hyperprior_means[i])
-            if model_type == 'combined_v3':
-                with cm_effect.models.CMCombined_Final_V3(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model(R_hyperprior_mean=hyperprior_means[i])
-            if model_type == 'combined_icl':
-                with cm_effect.models.CMCombined_Final_ICL(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model(R_hyperprior_mean=hyperprior_means[i])
-            if model_type == 'combined_dif':
-                with cm_effect.models.CMCombined_Final_DifEffects(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.RegionVariationNoise = region_var_noise
-                    model.build_model(R_hyperprior_mean=hyperprior_means[i])
-            if model_type == 'combined_no_noise':
-                with cm_effect.models.CMCombined_Final_NoNoise(data) as model:
-                    model.build_model(R_hyperprior_mean=hyperprior_means[i])
-            if model_type == 'combined_icl_no_noise':
-                with cm_effect.models.CMCombined_ICL_NoNoise(data) as model:
-                    model.build_model(R_hyperprior_mean=hyperprior_means[i])
-            if model_type == 'combined_additive':
-                with cm_effect.models.CMCombined_Additive(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model(R_hyperprior_mean=hyperprior_means[i])
-
-            model.run(2000, tune=500, chains=4, cores=4)
-            out_dir = generate_out_dir(daily_growth_noise)
-            filename = out_dir + '/R_hyperprior_' + model_type + '_' + str(i) + '.txt'
-            save_traces(model, model_type, filename)
+            spec = ModelSpec(model_type, data_spec, daily_growth_noise, region_var_noise,
+                             build_kwargs=dict(R_hyperprior_mean=hyperprior_means[i]))
+            plan.add(spec, out_dir + '/R_hyperprior_' + model_type + '_' + str(i) + '.txt')
+
+    _finish(plan, runner)
 
 
 def serial_interval_sensitivity(model_types, serial_interval=[4, 5, 6, 7, 8],
                                 daily_growth_noise=None, min_deaths=None,
-                                region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv"):
-    dp = DataPreprocessor(drop_HS=True)
-    data = dp.preprocess_data(data_path, "2020-05-30")
-    data.mask_reopenings()
-    if min_deaths is not None:
-        data.filter_region_min_deaths(min_deaths)
+                                region_var_noise=0.1, data_path="notebooks/double-entry-data/double_entry_final.csv",
+                                runner=None):
+    plan = _runner(runner)
+    out_dir = generate_out_dir(daily_growth_noise)
+    data_spec = DataSpec(data_path, min_deaths=min_deaths)
 
     for i in range(len(serial_interval)):
         for model_type in model_types:
-            print('Serial interval mean: ' + str(serial_interval[i]))
-            print('Model: ' + str(model_type))
-            if model_type == 'combined':
-                with cm_effect.models.CMCombined_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model(serial_interval_mean=serial_interval[i])
-            if model_type == 'active':
-                with cm_effect.models.CMActive_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model(serial_interval_mean=serial_interval[i])
-            if model_type == 'death':
-                with cm_effect.models.CMDeath_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model(serial_interval_mean=serial_interval[i])
-            if model_type == 'combined_v3':
-                with cm_effect.models.CMCombined_Final_V3(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model(serial_interval_mean=serial_interval[i])
-            if model_type == 'combined_icl':
-                with cm_effect.models.CMCombined_Final_ICL(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model(serial_interval_mean=serial_interval[i])
-            if model_type == 'combined_dif':
-                with cm_effect.models.CMCombined_Final_DifEffects(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.RegionVariationNoise = region_var_noise
-                    model.build_model(serial_interval_mean=serial_interval[i])
-            if model_type == 'combined_no_noise':
-                with cm_effect.models.CMCombined_Final_NoNoise(data) as model:
-                    model.build_model(serial_interval_mean=serial_interval[i])
-            if model_type == 'combined_icl_no_noise':
-                with cm_effect.models.CMCombined_ICL_NoNoise(data) as model:
-                    model.build_model(serial_interval_mean=serial_interval[i])
-            if model_type == 'combined_additive':
-                with cm_effect.models.CMCombined_Additive(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.build_model(serial_interval_mean=serial_interval[i])
-
-            model.run(2000, tune=500, chains=4, cores=4)
-            out_dir = generate_out_dir(daily_growth_noise)
-            filename = out_dir + '/serial_int_' + model_type + '_SI' + str(serial_interval[i]) + '.txt'
-            save_traces(model, model_type, filename)
+            spec = ModelSpec(model_type, data_spec, daily_growth_noise, region_var_noise,
+                             build_kwargs=dict(serial_interval_mean=serial_interval[i]))
+            plan.add(spec, out_dir + '/serial_int_' + model_type + '_SI' + str(serial_interval[i]) + '.txt')
+
+    _finish(plan, runner)
 
 
 ######## delay mean #############
@@ -1006,6 +640,7 @@ def gamma_mu_cov_to_shape_scale(mu, cov):
     return shape, scale
 
 
+@functools.lru_cache(maxsize=None)
 def calc_shifted_delay_mean_death(mean_shift):
     nRVs = int(9e7)
     shp1, scl1 = gamma_mu_cov_to_shape_scale(5.1 + mean_shift, 0.86)
@@ -1022,6 +657,7 @@ def calc_shifted_delay_mean_death(mean_shift):
     return delay_prob
 
 
+@functools.lru_cache(maxsize=None)
 def calc_shifted_delay_mean_conf(mean_shift):
     m = 5.25 + mean_shift
     r = 1.57
@@ -1041,245 +677,48 @@ def calc_shifted_delay_mean_conf(mean_shift):
     return delay_prob
 
 
-def vary_delay_mean(model, mean_shift, model_type):
-    '''to use for deaths model or active cases model'''
-    default_mean = np.trapz(model.DelayProb * (np.arange(len(model.DelayProb))))
-    print('Default mean: ' + str(default_mean))
-    if (mean_shift + default_mean) == default_mean:
-        pass
-    else:
-        if model_type == 'active':
-            delay_prob = calc_shifted_delay_mean_conf(mean_shift)
-        if model_type == 'death':
-            delay_prob = calc_shifted_delay_mean_death(mean_shift)
-        model.DelayProb = delay_prob
-    return model
-
-
-def vary_delay_mean_confirmed(model, mean_shift):
-    '''to use for combined model'''
-    default_mean = np.trapz(model.DelayProbCases * (np.arange(len(model.DelayProbCases[0]))))
-    print('Default mean conf: ' + str(default_mean))
-    if (mean_shift + default_mean) == default_mean:
-        pass
-    else:
-        delay_prob = calc_shifted_delay_mean_conf(mean_shift)
-        model.DelayProbCases = delay_prob
-    return model
-
-
-def vary_delay_mean_death(model, mean_shift):
-    '''to use for combined model'''
-    default_mean = np.trapz(model.DelayProbDeaths * (np.arange(len(model.DelayProbDeaths[0]))))
-    print('Default mean death: ' + str(default_mean))
-    if (mean_shift + default_mean) == default_mean:
-        pass
-    else:
-        delay_prob = calc_shifted_delay_mean_death(mean_shift)
-        model.DelayProbDeaths = delay_prob
-    return model
+def shifted_delay_attrs(delay, mean_shift):
+    '''
+    model attributes shifting the mean of a delay distribution. delay is 'cases' or 'deaths' for the combined
+    models and 'active' or 'death' for the models with a single delay.
+    '''
+    if mean_shift == 0:
+        return {}
+    if delay == 'cases':
+        return {'DelayProbCases': calc_shifted_delay_mean_conf(mean_shift)}
+    if delay == 'deaths':
+        return {'DelayProbDeaths': calc_shifted_delay_mean_death(mean_shift)}
+    if delay == 'active':
+        return {'DelayProb': calc_shifted_delay_mean_conf(mean_shift)}
+    if delay == 'death':
+        return {'DelayProb': calc_shifted_delay_mean_death(mean_shift)}
+    raise ValueError(f'Unknown delay {delay}')
 
 
 def delay_mean_sensitivity(model_types, mean_shift=[-2, -1, 1, 2], daily_growth_noise=None,
                            min_deaths=None, region_var_noise=0.1,
-                           data_path="notebooks/double-entry-data/double_entry_final.csv"):
+                           data_path="notebooks/double-entry-data/double_entry_final.csv", runner=None):
     '''
     mean_shift shifts the mean of the underlying distributions that will combine
     to form the delay distrobution. So the resulting total delay distribution
     will be shifted more than the specified mean_shift. 
     '''
-
-    samples = 1000
-    chains = 8
-    cores = 8
-
-    delay_probs_conf_combined = []
-    delay_probs_death_combined = []
-    delay_probs_death = []
-    delay_probs_active = []
-
-    delay_probs_conf_combined = []
-    delay_probs_death_combined = []
-    delay_probs_death = []
-    delay_probs_active = []
-
-    dp = DataPreprocessor(drop_HS=True)
-    data = dp.preprocess_data(data_path, "2020-05-30")
-    data.mask_reopenings()
-    if min_deaths is not None:
-        data.filter_region_min_deaths(min_deaths)
+    plan = _runner(runner)
     out_dir = generate_out_dir(daily_growth_noise)
+    data_spec = DataSpec(data_path, min_deaths=min_deaths)
 
     for model_type in model_types:
-        plt.figure()
-        if model_type == 'combined':
-            # for combined model vary confirmed and deaths delay
-            for i in range(len(mean_shift)):
-                print('Delay Mean Shift: ' + str(mean_shift[i]))
-                print('Model: ' + str(model_type))
-                with cm_effect.models.CMCombined_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model = vary_delay_mean_confirmed(model, mean_shift[i])
-                    delay_probs_conf_combined.append(model.DelayProbCases)
-                    model.build_model()
-                model.run(2000, tune=500, chains=4, cores=4)
-                filename = out_dir + '/delay_mean_confirmed_combined_' + str(i) + '.txt'
-                save_traces(model, model_type, filename)
-
-                with cm_effect.models.CMCombined_Final(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model = vary_delay_mean_death(model, mean_shift[i])
-                    delay_probs_death_combined.append(model.DelayProbDeaths)
-                    model.build_model()
-                model.run(2000, tune=500, chains=4, cores=4)
-                filename = out_dir + '/delay_mean_death_combined_' + str(i) + '.txt'
-                save_traces(model, model_type, filename)
-        elif model_type == 'combined_v3':
-            # for combined model vary confirmed and deaths delay
-            for i in range(len(mean_shift)):
-                print('Delay Mean Shift: ' + str(mean_shift[i]))
-                print('Model: ' + str(model_type))
-                with cm_effect.models.CMCombined_Final_V3(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model = vary_delay_mean_confirmed(model, mean_shift[i])
-                    # delay_probs_conf_combined.append(model.DelayProbCases) 
-                    model.build_model()
-                model.run(2000, tune=500, chains=4, cores=4)
-                filename = out_dir + '/delay_mean_confirmed_combined_v3_' + str(i) + '.txt'
-                save_traces(model, model_type, filename)
-
-                with cm_effect.models.CMCombined_Final_V3(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model = vary_delay_mean_death(model, mean_shift[i])
-                    # delay_probs_death_combined.append(model.DelayProbDeaths) 
-                    model.build_model()
-                model.run(2000, tune=500, chains=4, cores=4)
-                filename = out_dir + '/delay_mean_death_combined_v3_' + str(i) + '.txt'
-                save_traces(model, model_type, filename)
-        elif model_type == 'combined_icl':
-            # for combined model vary confirmed and deaths delay
-            for i in range(len(mean_shift)):
-                print('Delay Mean Shift: ' + str(mean_shift[i]))
-                print('Model: ' + str(model_type))
-                with cm_effect.models.CMCombined_Final_ICL(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model = vary_delay_mean_confirmed(model, mean_shift[i])
-                    # delay_probs_conf_combined.append(model.DelayProbCases) 
-                    model.build_model()
-                model.run(2000, tune=500, chains=4, cores=4)
-                filename = out_dir + '/delay_mean_confirmed_combined_icl_' + str(i) + '.txt'
-                save_traces(model, model_type, filename)
-
-                with cm_effect.models.CMCombined_Final_ICL(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model = vary_delay_mean_death(model, mean_shift[i])
-                    # delay_probs_death_combined.append(model.DelayProbDeaths) 
-                    model.build_model()
-                model.run(2000, tune=500, chains=4, cores=4)
-                filename = out_dir + '/delay_mean_death_combined_icl_' + str(i) + '.txt'
-                save_traces(model, model_type, filename)
-        elif model_type == 'combined_dif':
-            # for combined model vary confirmed and deaths delay
-            for i in range(len(mean_shift)):
-                print('Delay Mean Shift: ' + str(mean_shift[i]))
-                print('Model: ' + str(model_type))
-                with cm_effect.models.CMCombined_Final_DifEffects(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.RegionVariationNoise = region_var_noise
-                    model = vary_delay_mean_confirmed(model, mean_shift[i])
-                    # delay_probs_conf_combined.append(model.DelayProbCases) 
-                    model.build_model()
-                model.run(2000, tune=500, chains=4, cores=4)
-                filename = out_dir + '/delay_mean_confirmed_combined_dif_' + str(i) + '.txt'
-                save_traces(model, model_type, filename)
-
-                with cm_effect.models.CMCombined_Final_DifEffects(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model.RegionVariationNoise = region_var_noise
-                    model = vary_delay_mean_death(model, mean_shift[i])
-                    # delay_probs_death_combined.append(model.DelayProbDeaths) 
-                    model.build_model()
-                model.run(2000, tune=500, chains=4, cores=4)
-                filename = out_dir + '/delay_mean_death_combined_dif_' + str(i) + '.txt'
-                save_traces(model, model_type, filename)
-        elif model_type == 'combined_no_noise':
-            # for combined model vary confirmed and deaths delay
-            for i in range(len(mean_shift)):
-                print('Delay Mean Shift: ' + str(mean_shift[i]))
-                print('Model: ' + str(model_type))
-                with cm_effect.models.CMCombined_Final_NoNoise(data) as model:
-                    model = vary_delay_mean_confirmed(model, mean_shift[i])
-                    # delay_probs_conf_combined.append(model.DelayProbCases) 
-                    model.build_model()
-                model.run(2000, tune=500, chains=4, cores=4)
-                filename = out_dir + '/delay_mean_confirmed_combined_no_noise_' + str(i) + '.txt'
-                save_traces(model, model_type, filename)
-                with cm_effect.models.CMCombined_Final_NoNoise(data) as model:
-                    model = vary_delay_mean_death(model, mean_shift[i])
-                    # delay_probs_death_combined.append(model.DelayProbDeaths) 
-                    model.build_model()
-                model.run(2000, tune=500, chains=4, cores=4)
-                filename = out_dir + '/delay_mean_death_combined_no_noise_' + str(i) + '.txt'
-                save_traces(model, model_type, filename)
-        elif model_type == 'combined_additive':
-            # for combined model vary confirmed and deaths delay
-            for i in range(len(mean_shift)):
-                print('Delay Mean Shift: ' + str(mean_shift[i]))
-                print('Model: ' + str(model_type))
-                with cm_effect.models.CMCombined_Additive(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model = vary_delay_mean_confirmed(model, mean_shift[i])
-                    # delay_probs_conf_combined.append(model.DelayProbCases) 
-                    model.build_model()
-                model.run(2000, tune=500, chains=4, cores=4)
-                filename = out_dir + '/delay_mean_confirmed_combined_additive_' + str(i) + '.txt'
-                save_traces(model, model_type, filename)
-
-                with cm_effect.models.CMCombined_Additive(data) as model:
-                    if daily_growth_noise is not None:
-                        model.DailyGrowthNoise = daily_growth_noise
-                    model = vary_delay_mean_death(model, mean_shift[i])
-                    # delay_probs_death_combined.append(model.DelayProbDeaths) 
-                    model.build_model()
-                model.run(2000, tune=500, chains=4, cores=4)
-                filename = out_dir + '/delay_mean_death_combined_additive_' + str(i) + '.txt'
-                save_traces(model, model_type, filename)
-        else:
-            # for other models there is only one delay mean
-            for i in range(len(mean_shift)):
-                print('Delay Mean Shift: ' + str(mean_shift[i]))
-                print('Model: ' + str(model_type))
-                if model_type == 'active':
-                    with cm_effect.models.CMActive_Final(data) as model:
-                        # plt.plot(model.DelayProb, color='k', label='default')
-                        if daily_growth_noise is not None:
-                            model.DailyGrowthNoise = daily_growth_noise
-                        model = vary_delay_mean(model, mean_shift[i], model_type)
-                        delay_probs_active.append(model.DelayProb)
-                        model.build_model()
-                if model_type == 'death':
-                    with cm_effect.models.CMDeath_Final(data) as model:
-                        # plt.plot(model.DelayProb, color='k', label='default')
-                        if daily_growth_noise is not None:
-                            model.DailyGrowthNoise = daily_growth_noise
-                        model = vary_delay_mean(model, mean_shift[i], model_type)
-                        delay_probs_death.append(model.DelayProb)
-                        model.build_model()
-                if model_type == 'combined_icl_no_noise':
-                    with cm_effect.models.CMCombined_ICL_NoNoise(data) as model:
-                        # plt.plot(model.DelayProb, color='k', label='default')
-                        model = vary_delay_mean_death(model, mean_shift[i])
-                        delay_probs_death.append(model.DelayProbDeaths)
-                        model.build_model()
-                model.run(2000, tune=500, chains=4, cores=4)
-                filename = out_dir + '/delay_mean_' + model_type + '_' + str(i) + '.txt'
-                save_traces(model, model_type, filename)
+        for i in range(len(mean_shift)):
+            if model_type in ['active', 'death']:
+                # for other models there is only one delay mean
+                spec = ModelSpec(model_type, data_spec, daily_growth_noise, region_var_noise,
+                                 attrs=shifted_delay_attrs(model_type, mean_shift[i]))
+                plan.add(spec, out_dir + '/delay_mean_' + model_type + '_' + str(i) + '.txt')
+            else:
+                # for combined model vary confirmed and deaths delay
+                for delay, delay_name in [('cases', 'confirmed'), ('deaths', 'death')]:
+                    spec = ModelSpec(model_type, data_spec, daily_growth_noise, region_var_noise,
+                                     attrs=shifted_delay_attrs(delay, mean_shift[i]))
+                    plan.add(spec, out_dir + '/delay_mean_' + delay_name + '_' + model_type + '_' + str(i) + '.txt')
+
+    _finish(plan, runner)
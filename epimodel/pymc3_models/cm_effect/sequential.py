@@ -0,0 +1,292 @@
+"""
+Sequential updating of a CMCombined_Final posterior as new days of data arrive.
+
+The draws of the previous fit are used as particles. Their growth noise is extended with prior draws for the
+new days, they are reweighted by the likelihood of the new data relative to the old data, resampled, and
+rejuvenated with Metropolis moves on all other parameters and on the growth noise of every day, in blocks of
+days, so that the particles duplicated by resampling spread out again. A full NUTS rerun is only done when the effective sample
+size of the importance weights collapses. compare_to_refit measures the time and accuracy against a full rerun.
+"""
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from epimodel.pymc3_models.cm_effect.forward import CombinedForwardModel
+
+log = logging.getLogger(__name__)
+
+PARTICLE_VARS = ["CM_Alpha", "RegionLogR_noise", "HyperRVar", "InitialSizeCases_log", "InitialSizeDeaths_log",
+                 "GrowthCasesNoise", "GrowthDeathsNoise", "Phi_1"]
+NOISE_VARS = ["GrowthCasesNoise", "GrowthDeathsNoise"]
+STATIC_VARS = [name for name in PARTICLE_VARS if name not in NOISE_VARS]
+POSITIVE_VARS = ["HyperRVar", "Phi_1"]
+
+
+class ParticleTrace(object):
+    """Equally weighted particles, indexable like a MultiTrace (trace["CMReduction"], trace.CMReduction)."""
+
+    def __init__(self, values, ess=None, stats=None):
+        """
+        :param ess: effective sample size of the importance weights
+        :param stats: other diagnostics of the update, see sequential_update
+        """
+        self._values = values
+        self.ess = ess
+        self.stats = {} if stats is None else stats
+
+    @property
+    def varnames(self):
+        return list(self._values.keys())
+
+    def __getitem__(self, name):
+        return self._values[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name not in self._values:
+            raise AttributeError(name)
+        return self._values[name]
+
+    def __len__(self):
+        return len(next(iter(self._values.values())))
+
+
+def effective_sample_size(log_weights):
+    w = np.exp(log_weights - np.max(log_weights))
+    w /= np.sum(w)
+    return 1 / np.sum(w ** 2), w
+
+
+def systematic_resample(weights, rng):
+    n = len(weights)
+    positions = (rng.uniform() + np.arange(n)) / n
+    indx = np.searchsorted(np.cumsum(weights), positions)
+    return np.minimum(indx, n - 1)
+
+
+def extend_particles(particles, n_new_days, sigma, rng):
+    """Append `n_new_days` of growth noise drawn from its N(0, sigma) prior."""
+    extended = dict(particles)
+    for name in NOISE_VARS:
+        nS, nRs, _ = particles[name].shape
+        extended[name] = np.concatenate([particles[name], rng.normal(0, sigma, size=(nS, nRs, n_new_days))],
+                                        axis=-1)
+    return extended
+
+
+def pack(particles, names):
+    """
+    [S, n] matrix of the variables `names`, HyperRVar and Phi_1 on the log scale, and a boolean [n] vector
+    marking the log-scale columns.
+    """
+    columns, log_scale = [], []
+    for name in names:
+        value = np.asarray(particles[name], dtype=float).reshape(len(particles[name]), -1)
+        columns.append(np.log(value) if name in POSITIVE_VARS else value)
+        log_scale.extend([name in POSITIVE_VARS] * value.shape[1])
+    return np.concatenate(columns, axis=1), np.array(log_scale)
+
+
+def unpack(x, particles, names):
+    """Copy of `particles` with the variables `names` replaced by the columns of x, see pack."""
+    values = dict(particles)
+    i = 0
+    for name in names:
+        shape = np.shape(particles[name])
+        n = int(np.prod(shape[1:]))
+        block = x[:, i:i + n].reshape(shape)
+        values[name] = np.exp(block) if name in POSITIVE_VARS else block
+        i += n
+    return values
+
+
+def n_unique(particles, names=STATIC_VARS):
+    """Number of distinct particles, by the variables `names` (by default all but the growth noise)."""
+    names = [name for name in names if name in particles]
+    return len(np.unique(pack(particles, names)[0], axis=0))
+
+
+def noise_blocks(nDs, block_days):
+    """(start, end) of consecutive blocks of `block_days` days covering all nDs days, the most recent first."""
+    return [(max(0, end - block_days), end) for end in range(nDs, 0, -block_days)]
+
+
+def rejuvenate(engine, particles, sigma, block_days=14, n_moves=10, step_scale=0.5, rng=None):
+    """
+    Metropolis moves leaving the posterior of the new data invariant, alternating between
+
+    - a random walk on all other parameters at once (CM_Alpha, RegionLogR_noise, HyperRVar, the initial sizes
+      and Phi_1; HyperRVar and Phi_1 on the log scale), with the covariance of the particles scaled by
+      2.38 ** 2 / dimension, and
+    - random walks with standard deviation step_scale * sigma on the growth noise, one block of `block_days`
+      days at a time, from the most recent block back to the first day (see noise_blocks). Given the other
+      parameters, the likelihood factorises over regions, so each region's block is accepted or rejected
+      independently.
+
+    Both proposals are fixed before the first move, so every move is a valid Metropolis kernel. Each move costs
+    one likelihood evaluation for the parameters and one per noise block. The growth noise of the early days
+    is pinned down by the old data as well, so it moves less than the recent noise; compare n_unique over
+    NOISE_VARS before and after to see how far it spread.
+
+    :return: moved particles, and a dict of the acceptance rate of each move, by "static" and "noise" (the
+    mean over the noise blocks)
+    """
+    rng = np.random.RandomState() if rng is None else rng
+    particles = dict(particles)
+    nS, nRs, nDs = particles[NOISE_VARS[0]].shape
+    blocks = noise_blocks(nDs, block_days)
+
+    names = [name for name in STATIC_VARS if name in particles]
+    x, log_scale = pack(particles, names)
+    dim = x.shape[1]
+    cov = np.atleast_2d(np.cov(x, rowvar=False)) * 2.38 ** 2 / dim
+    chol = np.linalg.cholesky(cov + 1e-9 * max(np.trace(cov) / dim, 1e-12) * np.eye(dim))
+
+    def log_target(x, region_log_lik, values):
+        # density of the log-scale columns includes the Jacobian of exp
+        return np.sum(region_log_lik, axis=-1) + engine.log_prior(values) + np.sum(x[:, log_scale], axis=-1)
+
+    region_log_lik = engine.region_log_likelihood(particles)
+    current = log_target(x, region_log_lik, particles)
+    acceptance = dict(static=[], noise=[])
+    for _ in range(n_moves):
+        x_proposal = x + rng.normal(size=x.shape) @ chol.T
+        proposal = unpack(x_proposal, particles, names)
+        proposal_log_lik = engine.region_log_likelihood(proposal)
+        proposed = log_target(x_proposal, proposal_log_lik, proposal)
+        accept = np.log(rng.uniform(size=nS)) < np.nan_to_num(proposed - current, nan=-np.inf)
+
+        x = np.where(accept[:, None], x_proposal, x)
+        particles = unpack(x, particles, names)
+        region_log_lik = np.where(accept[:, None], proposal_log_lik, region_log_lik)
+        current = np.where(accept, proposed, current)
+        acceptance["static"].append(np.mean(accept))
+
+        noise_accepted = []
+        for start, end in blocks:
+            proposal = dict(particles)
+            log_prior_ratio = np.zeros((nS, nRs))
+            for name in NOISE_VARS:
+                proposal[name] = particles[name].copy()
+                proposal[name][:, :, start:end] += step_scale * sigma * rng.normal(size=(nS, nRs, end - start))
+                log_prior_ratio -= 0.5 * np.sum(proposal[name][:, :, start:end] ** 2
+                                                - particles[name][:, :, start:end] ** 2, axis=-1) / sigma ** 2
+
+            proposal_log_lik = engine.region_log_likelihood(proposal)
+            log_ratio = np.nan_to_num(proposal_log_lik - region_log_lik + log_prior_ratio, nan=-np.inf)
+            accept = np.log(rng.uniform(size=(nS, nRs))) < log_ratio
+
+            for name in NOISE_VARS:
+                particles[name] = np.where(accept[:, :, None], proposal[name], particles[name])
+            current = current + np.sum(np.where(accept, proposal_log_lik - region_log_lik, 0), axis=-1)
+            region_log_lik = np.where(accept, proposal_log_lik, region_log_lik)
+            noise_accepted.append(np.mean(accept))
+        acceptance["noise"].append(np.mean(noise_accepted))
+
+    return particles, acceptance
+
+
+def sequential_update(previous_model, model, ess_threshold=0.5, block_days=14, n_moves=10, run_kwargs=None,
+                      random_seed=None, **engine_kwargs):
+    """
+    Update the posterior of `previous_model` (already sampled) to the data of `model`, which covers the same
+    regions and features and at least the same days. Sets and returns `model.trace`.
+
+    :param ess_threshold: fraction of particles below which the effective sample size triggers a full rerun
+    :param block_days: length of the growth noise blocks moved at once by rejuvenate
+    :param run_kwargs: arguments passed to model.run on a full rerun
+    :param engine_kwargs: build_model parameters of both models (including cm_prior_sigma), passed to
+    CombinedForwardModel
+    """
+    rng = np.random.RandomState(random_seed)
+    run_kwargs = dict(N=2000, tune=500, chains=4, cores=4) if run_kwargs is None else run_kwargs
+
+    n_new_days = model.nDs - previous_model.nDs
+    if list(model.d.Rs) != list(previous_model.d.Rs) or list(model.d.CMs) != list(previous_model.d.CMs) \
+            or n_new_days < 0:
+        log.warning("Data is not an extension of the previous data, running the full model")
+        model.run(**run_kwargs)
+        return model.trace
+
+    previous_engine = CombinedForwardModel(previous_model, **engine_kwargs)
+    engine = CombinedForwardModel(model, **engine_kwargs)
+
+    names = [name for name in PARTICLE_VARS if name in previous_model.trace.varnames]
+    particles = {name: np.asarray(previous_model.trace[name]) for name in names}
+    nS = len(particles["CM_Alpha"])
+
+    # the priors of the old parameters cancel, and the new growth noise is drawn from its prior, so the
+    # weights reduce to the likelihood ratio of the new and the old data
+    previous_log_lik = np.sum(previous_engine.region_log_likelihood(particles), axis=-1)
+    particles = extend_particles(particles, n_new_days, model.DailyGrowthNoise, rng)
+    log_weights = np.sum(engine.region_log_likelihood(particles), axis=-1) - previous_log_lik
+    log_weights = np.nan_to_num(log_weights, nan=-np.inf)
+
+    ess, weights = effective_sample_size(log_weights)
+    log.info(f"Effective sample size after reweighting: {ess:.0f} of {nS}")
+    if not ess >= ess_threshold * nS:
+        log.warning(f"Effective sample size collapsed ({ess:.0f} of {nS}), running the full model")
+        model.run(**run_kwargs)
+        return model.trace
+
+    indx = systematic_resample(weights, rng)
+    particles = {name: value[indx] for name, value in particles.items()}
+    unique_resampled = n_unique(particles)
+    unique_noise_resampled = n_unique(particles, NOISE_VARS)
+    particles, acceptance = rejuvenate(engine, particles, model.DailyGrowthNoise, block_days, n_moves, rng=rng)
+    unique = n_unique(particles)
+    unique_noise = n_unique(particles, NOISE_VARS)
+    log.info(f"Distinct particles: {unique_resampled} of {nS} after resampling, {unique} after rejuvenation; "
+             f"distinct growth noise {unique_noise_resampled} and {unique_noise}; "
+             f"acceptance rates {np.round(acceptance['static'], 2)} (parameters), "
+             f"{np.round(acceptance['noise'], 2)} (growth noise)")
+
+    outputs = engine.forward(particles)
+    values = dict(particles)
+    values.update(outputs)
+    values["CMReduction"] = np.exp(-particles["CM_Alpha"])
+    values["RegionR"] = engine.R_hyperprior_mean + particles["RegionLogR_noise"] * np.reshape(
+        particles["HyperRVar"], (-1, 1))
+    values["GrowthCases"] = outputs["ExpectedGrowth"] + particles["GrowthCasesNoise"]
+    values["GrowthDeaths"] = outputs["ExpectedGrowth"] + particles["GrowthDeathsNoise"]
+
+    model.trace = ParticleTrace(values, ess=ess, stats=dict(unique_resampled=unique_resampled, unique=unique,
+                                                            unique_noise_resampled=unique_noise_resampled,
+                                                            unique_noise=unique_noise, acceptance=acceptance))
+    return model.trace
+
+
+def compare_to_refit(previous_model, model, run_kwargs=None, varnames=("CMReduction",), **update_kwargs):
+    """
+    Time sequential_update against a full model.run on the same data, and compare the posteriors.
+
+    model.trace is left as the trace of the full run.
+
+    :param update_kwargs: passed to sequential_update, e.g. n_moves or engine parameters
+    :return: dict with the wall seconds of both (update_wall, refit_wall), the effective sample size of the
+    update, and, per variable in `varnames`, a DataFrame of the mean and sd of each element in both posteriors
+    and the difference of the means in posterior sds of the full run
+    """
+    run_kwargs = dict(N=2000, tune=500, chains=4, cores=4) if run_kwargs is None else run_kwargs
+    update_kwargs = dict(update_kwargs, ess_threshold=0)
+
+    start = time.perf_counter()
+    updated = sequential_update(previous_model, model, run_kwargs=run_kwargs, **update_kwargs)
+    update_wall = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model.run(**run_kwargs)
+    refit_wall = time.perf_counter() - start
+
+    comparison = dict(update_wall=update_wall, refit_wall=refit_wall, speedup=refit_wall / update_wall,
+                      ess=updated.ess, **updated.stats)
+    for name in varnames:
+        update_values = np.asarray(updated[name]).reshape(len(updated), -1)
+        refit_values = np.asarray(model.trace[name]).reshape(len(model.trace[name]), -1)
+        table = pd.DataFrame(dict(update_mean=update_values.mean(axis=0), update_sd=update_values.std(axis=0),
+                                  refit_mean=refit_values.mean(axis=0), refit_sd=refit_values.std(axis=0)))
+        table["mean_difference_sds"] = (table.update_mean - table.refit_mean) / table.refit_sd
+        comparison[name] = table
+    log.info(f"Sequential update {update_wall:.0f}s, full rerun {refit_wall:.0f}s ({comparison['speedup']:.1f}x)")
+    return comparison
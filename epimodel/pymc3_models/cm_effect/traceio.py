@@ -0,0 +1,335 @@
+"""
+Columnar trace files, so that one variable, or one region of a variable, can be read without loading the rest.
+
+A trace is saved as a directory with meta.json (variables, shapes, chunks and the region, feature and day
+labels) and one compressed .npz file per chunk of each variable, holding draws of shape [chains, draws, ...].
+Variables with more than one dimension per draw whose first dimension has one element per region, such as the
+[nORs, nDs] expected cases and deaths, are split into chunks of regions along it; all other variables are a
+single chunk. One-dimensional variables with one element per region (RegionR) are a single chunk, but can still
+be read by region; their length must differ from the number of features to be recognised. Without region labels,
+no variable has a region axis.
+
+With storage="npy", each variable is instead one uncompressed .npy file, which TraceReader memory-maps, so
+indexing a trace only reads the pages it touches and several processes reading the same trace share them
+through the page cache. Variables split by region are stored region-major, [regions, chains, draws, ...], so
+the draws of one region are contiguous on disk; trace.InfectedCases[:, region, :] is then a view of one block.
+
+A StoragePolicy per variable can store it at a lower precision, with fewer draws, or quantised to 8 or 16 bit
+integers scaled to the range of each element. Plots only need the latent trajectories at modest precision and
+for a few hundred draws (TRAJECTORY_POLICIES), while CMReduction and the hyperparameters are kept exact. The
+sampled draws kept of each variable are saved with it; a TraceReader with align_draws returns all variables at
+the draws kept of every variable, so that draws of different variables correspond, as posterior_predictive
+needs.
+"""
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+TRACE_STORAGE = ["npz", "npy"]
+
+
+class StoragePolicy(object):
+    def __init__(self, dtype=None, thin=1, max_draws=None, quantize=None):
+        """
+        How one variable is stored.
+
+        :param dtype: dtype to store the draws in, e.g. "float32" or "float16"
+        :param thin: keep every thin-th draw of each chain
+        :param max_draws: keep at most this many draws of each chain, evenly spaced, after thinning
+        :param quantize: store the draws as unsigned integers with this many bits (8 or 16), scaled to the range of
+        each element over all draws; takes the place of dtype
+        """
+        if quantize not in (None, 8, 16):
+            raise ValueError(f"quantize must be None, 8 or 16, not {quantize}")
+        self.dtype = dtype
+        self.thin = thin
+        self.max_draws = max_draws
+        self.quantize = quantize
+
+    def __repr__(self):
+        return f"StoragePolicy(dtype={self.dtype}, thin={self.thin}, max_draws={self.max_draws}, " \
+               f"quantize={self.quantize})"
+
+    def draw_indices(self, ndraws):
+        """Indices of the kept draws of each chain of `ndraws` draws."""
+        indices = np.arange(ndraws)[::self.thin]
+        if self.max_draws is not None and len(indices) > self.max_draws:
+            indices = indices[np.linspace(0, len(indices) - 1, self.max_draws).round().astype(int)]
+        return indices
+
+    def select_draws(self, values):
+        """The kept draws of values [chains, draws, ...]."""
+        return values[:, self.draw_indices(values.shape[1])]
+
+    def encode(self, values):
+        """
+        :return: the stored draws, and the offset and scale of each element if quantised (otherwise None)
+        """
+        values = self.select_draws(values)
+        if self.quantize is not None:
+            low, high = values.min(axis=(0, 1)), values.max(axis=(0, 1))
+            scale = np.where(high > low, (high - low) / (2 ** self.quantize - 1), 1.)
+            stored = np.round((values - low) / scale).astype(f"uint{self.quantize}")
+            return stored, dict(offset=np.asarray(low, dtype=float), scale=scale)
+
+        if self.dtype is not None:
+            dtype = np.dtype(self.dtype)
+            if np.issubdtype(dtype, np.floating) and np.max(np.abs(values)) > np.finfo(dtype).max:
+                raise ValueError(f"Draws up to {np.max(np.abs(values)):.3g} do not fit in {dtype}")
+            if np.issubdtype(dtype, np.integer) and values.size > 0 and \
+                    (np.min(values) < np.iinfo(dtype).min or np.max(values) > np.iinfo(dtype).max):
+                raise ValueError(f"Draws from {np.min(values):.3g} to {np.max(values):.3g} do not fit in {dtype}")
+            values = values.astype(dtype)
+        return values, None
+
+
+def decode(values, quantization=None):
+    """Draws stored by StoragePolicy.encode, with the offset and scale of the stored elements if quantised."""
+    if quantization is None:
+        return values
+    return values * quantization["scale"] + quantization["offset"]
+
+
+TRAJECTORIES = ["Infected", "InfectedCases", "InfectedDeaths", "ExpectedCases", "ExpectedDeaths"]
+TRAJECTORY_POLICIES = {name: StoragePolicy(dtype="float32", max_draws=500) for name in TRAJECTORIES}
+
+
+def _chunks(n, chunk_regions):
+    return [(start, min(start + chunk_regions, n)) for start in range(0, n, chunk_regions)]
+
+
+def export_trace(path, trace, varnames=None, regions=None, cms=None, days=None, chunk_regions=1, storage="npz",
+                 policies=None):
+    """
+    Save `trace` (a MultiTrace or anything with get_values(name, combine=False)) to the directory `path`.
+
+    :param varnames: variables to save, default all
+    :param regions, cms, days: labels of the region, feature and day dimensions, saved with the trace; variables
+    only have a region axis if `regions` is given
+    :param chunk_regions: regions per chunk of the variables split by region, with npz storage
+    :param storage: "npz" for compressed chunks, "npy" for uncompressed, memory-mappable files
+    :param policies: dict of variable name -> StoragePolicy; other variables are stored as sampled
+    :return: DataFrame with, for each variable, its policy, the bytes of its draws as sampled and as stored, and
+    the largest absolute and relative error of the stored draws
+    """
+    if storage not in TRACE_STORAGE:
+        raise ValueError(f"storage must be one of {TRACE_STORAGE}, not {storage}")
+    varnames = trace.varnames if varnames is None else varnames
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(tmp_path)
+
+    policies = {} if policies is None else policies
+    variables = {}
+    report = []
+    try:
+        for name in varnames:
+            sampled = np.stack(trace.get_values(name, combine=False))
+            policy = policies.get(name, StoragePolicy())
+            values, quantization = policy.encode(sampled)
+            report.append(_policy_report(name, policy, sampled, values, quantization))
+            if quantization is not None:
+                np.savez(os.path.join(tmp_path, f"{name}.quant.npz"), **quantization)
+
+            per_region = _per_region(values.shape[2:], regions, cms)
+            by_region = per_region and values.ndim >= 4
+            if storage == "npy":
+                chunks = [(0, values.shape[2])] if by_region else [(None, None)]
+                np.save(os.path.join(tmp_path, f"{name}.npy"), np.moveaxis(values, 2, 0) if by_region else values)
+            else:
+                chunks = _chunks(values.shape[2], chunk_regions) if by_region else [(None, None)]
+                for i, (start, end) in enumerate(chunks):
+                    np.savez_compressed(os.path.join(tmp_path, f"{name}.{i}.npz"),
+                                        values=values[:, :, start:end] if by_region else values)
+            variables[name] = dict(shape=list(values.shape[2:]), dtype=str(values.dtype), chunks=chunks,
+                                   ndraws=values.shape[1], draws=policy.draw_indices(sampled.shape[1]).tolist(),
+                                   quantized=quantization is not None, per_region=per_region)
+
+        meta = dict(version=FORMAT_VERSION, storage=storage, nchains=trace.nchains, ndraws=len(trace),
+                    variables=variables, regions=regions, cms=cms, days=days)
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(meta, f, default=str)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    # swap in the complete directory, so readers never see a partial trace
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+
+    report = pd.DataFrame(report)
+    saved = report.sampled_bytes.sum() - report.stored_bytes.sum()
+    if saved > 0:
+        log.info(f"Storage policies saved {saved / 2 ** 20:.1f} of {report.sampled_bytes.sum() / 2 ** 20:.1f} MiB")
+    return report
+
+
+def _per_region(shape, regions, cms):
+    """Whether the first dimension of a variable of `shape` has one element per region."""
+    if regions is None or len(shape) == 0 or shape[0] != len(regions):
+        return False
+    # a one-dimensional variable could equally have one element per feature
+    return len(shape) > 1 or cms is None or shape[0] != len(cms)
+
+
+def _policy_report(name, policy, sampled, values, quantization):
+    kept = policy.select_draws(sampled)
+    error = np.abs(decode(values, quantization) - kept)
+    magnitude = np.abs(kept)
+    stored_bytes = values.nbytes + (0 if quantization is None else sum(a.nbytes for a in quantization.values()))
+    return dict(variable=name, policy=repr(policy), sampled_bytes=sampled.nbytes, stored_bytes=stored_bytes,
+                saved_bytes=sampled.nbytes - stored_bytes, max_abs_error=float(np.max(error, initial=0)),
+                max_rel_error=float(np.max(error[magnitude > 0] / magnitude[magnitude > 0], initial=0)))
+
+
+def save_model_trace(path, model, varnames=None, chunk_regions=1, storage="npz", policies=None):
+    """Save model.trace with the labels of the model's data, see export_trace."""
+    return export_trace(path, model.trace, varnames, regions=list(model.d.Rs), cms=list(model.d.CMs),
+                        days=[str(d) for d in model.d.Ds], chunk_regions=chunk_regions, storage=storage,
+                        policies=policies)
+
+
+class TraceReader(object):
+    """
+    Reads a trace saved by export_trace, one variable or region at a time. Indexing returns draws of all chains
+    combined, like a MultiTrace (trace["CMReduction"], trace.CMReduction), so it can be used as model.trace.
+    With npy storage, whole variables are returned as read-only views of the memory-mapped files.
+    """
+
+    def __init__(self, path, align_draws=False):
+        """
+        :param align_draws: return every variable at the draws kept of all variables (see StoragePolicy), so that
+        the draws of different variables correspond, e.g. for posterior_predictive
+        """
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.storage = self.meta.get("storage", "npz")
+        self._mmaps = {}
+        self.align_draws = align_draws
+        self._common_draws = self.common_draws() if align_draws else None
+
+    @property
+    def varnames(self):
+        return list(self.meta["variables"])
+
+    @property
+    def nchains(self):
+        return self.meta["nchains"]
+
+    @property
+    def regions(self):
+        return self.meta["regions"]
+
+    def draw_indices(self, name):
+        """Indices of the sampled draws of each chain that are stored for `name`."""
+        variable = self.meta["variables"][name]
+        if "draws" in variable:
+            return np.asarray(variable["draws"], dtype=int)
+        if variable["ndraws"] == self.meta["ndraws"]:
+            return np.arange(variable["ndraws"])
+        raise ValueError(f"{name} was saved without the indices of its kept draws, it cannot be aligned")
+
+    def common_draws(self, varnames=None):
+        """Indices of the sampled draws stored for all of `varnames` (default all variables)."""
+        varnames = self.varnames if varnames is None else varnames
+        common = np.arange(self.meta["ndraws"])
+        for name in varnames:
+            common = np.intersect1d(common, self.draw_indices(name))
+        return common
+
+    def _region_indices(self, regions):
+        if isinstance(regions, (str, int, np.integer)):
+            regions = [regions]
+        return [self.regions.index(r) if isinstance(r, str) else int(r) for r in regions]
+
+    def mmap(self, name):
+        """The memory-mapped array of `name` (npy storage), [regions, chains, draws, ...] if split by region."""
+        if name not in self._mmaps:
+            self._mmaps[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self._mmaps[name]
+
+    def _load_chunk(self, name, i):
+        with np.load(os.path.join(self.path, f"{name}.{i}.npz")) as f:
+            return f["values"]
+
+    def _quantization(self, name, indices=None):
+        with np.load(os.path.join(self.path, f"{name}.quant.npz")) as f:
+            quantization = dict(f)
+        if indices is not None:
+            quantization = {key: value[indices] for key, value in quantization.items()}
+        return quantization
+
+    def get_values(self, name, regions=None, combine=True, chains=None):
+        """
+        Draws of `name`, loading only the chunks needed. Variables stored with a thinning StoragePolicy have
+        fewer draws than the trace, unless the reader aligns draws.
+
+        :param regions: region codes or indices to read, for variables with a region axis; default all
+        :param combine: combine the chains into one draw axis, otherwise return a list with one array per chain
+        :param chains: chain indices to return, default all
+        """
+        variable = self.meta["variables"][name]
+        chunks = variable["chunks"]
+        indices = None if regions is None else self._region_indices(regions)
+        by_region = chunks[0][0] is not None
+        if indices is not None and not by_region and not variable.get("per_region", False):
+            raise ValueError(f"{name} has no region axis, it cannot be read by region")
+
+        if indices is not None and not by_region:
+            # one-dimensional per-region variables are stored as one chunk
+            values = self.mmap(name) if self.storage == "npy" else self._load_chunk(name, 0)
+            values = values[:, :, indices]
+        elif self.storage == "npy":
+            values = self.mmap(name)
+            if by_region:
+                if indices is not None:
+                    values = values[indices]
+                values = np.moveaxis(values, 0, 2)
+        elif indices is None:
+            values = np.concatenate([self._load_chunk(name, i) for i in range(len(chunks))], axis=2) \
+                if len(chunks) > 1 else self._load_chunk(name, 0)
+        else:
+            parts = []
+            for r in indices:
+                i = next(i for i, (start, end) in enumerate(chunks) if start <= r < end)
+                parts.append(self._load_chunk(name, i)[:, :, r - chunks[i][0]])
+            values = np.stack(parts, axis=2)
+
+        if chains is not None:
+            values = values[np.atleast_1d(chains)]
+        if self.align_draws:
+            values = values[:, np.searchsorted(self.draw_indices(name), self._common_draws)]
+        if variable.get("quantized"):
+            values = decode(values, self._quantization(name, indices))
+        if combine:
+            # a view for region-major arrays, whose chain and draw axes stay adjacent
+            return values.reshape((-1, *values.shape[2:]))
+        return list(values)
+
+    def __getitem__(self, name):
+        return self.get_values(name)
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name == "meta" or name not in self.meta["variables"]:
+            raise AttributeError(name)
+        return self[name]
+
+    def __len__(self):
+        return len(self._common_draws) if self.align_draws else self.meta["ndraws"]
+
+    def to_dict(self, varnames=None):
+        """Per-chain draws, in the layout accepted by arviz functions."""
+        varnames = self.varnames if varnames is None else varnames
+        return {name: np.stack(self.get_values(name, combine=False)) for name in varnames}
+
+
+def load_trace(path, align_draws=False):
+    return TraceReader(path, align_draws)
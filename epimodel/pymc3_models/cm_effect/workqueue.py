@@ -0,0 +1,251 @@
+"""
+Work queue on a shared filesystem, for running sampling jobs on several machines without a queue service.
+
+The queue is a directory with pending/, claimed/, done/ and failed/ subdirectories holding one pickled
+SamplingJob per file. A worker claims a job by renaming its file from pending/ to claimed/; the rename is
+atomic on the file server (including NFS), so exactly one worker gets each job. While the job runs, the worker
+touches the claimed file as a heartbeat. A claim whose file has not been touched for `stale_after` seconds
+(e.g. because its node died) is moved back to pending/ by any worker. Finished jobs are moved to done/ or
+failed/. Job targets must be importable on every node and should write their outputs atomically.
+
+Workers register their memory budget in workers/, refreshed every round like a heartbeat. A pending job whose
+memory estimate exceeds the budget of every live worker can never be claimed, so it is moved to failed/ with
+the reason in a .error file next to it.
+"""
+import copy
+import json
+import logging
+import os
+import pickle
+import socket
+import time
+
+from epimodel.pymc3_models.cm_effect.scheduler import CoreBudgetScheduler
+
+log = logging.getLogger(__name__)
+
+QUEUE_STATES = ["pending", "claimed", "done", "failed"]
+
+
+class WorkQueue(object):
+    def __init__(self, root, stale_after=600):
+        """
+        :param stale_after: seconds without a heartbeat after which a claim is re-queued. Heartbeats are file
+        modification times set by the file server, so this should allow for clock differences between nodes.
+        """
+        self.root = root
+        self.stale_after = stale_after
+        for state in QUEUE_STATES + ["workers"]:
+            os.makedirs(os.path.join(root, state), exist_ok=True)
+
+    def path(self, state, name):
+        return os.path.join(self.root, state, f"{name}.job")
+
+    def names(self, state):
+        return sorted(f[:-len(".job")] for f in os.listdir(os.path.join(self.root, state)) if f.endswith(".job"))
+
+    def put(self, job, force=False):
+        """Queue `job` unless a job of the same name is queued, running or done (any state, with force)."""
+        states = ["pending", "claimed"] if force else ["pending", "claimed", "done"]
+        if any(os.path.exists(self.path(state, job.name)) for state in states):
+            log.info(f"{job.name} is already queued")
+            return False
+
+        tmp_path = os.path.join(self.root, f".{job.name}.{socket.gethostname()}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(job, f)
+        os.replace(tmp_path, self.path("pending", job.name))
+        return True
+
+    def claim(self, fits=None):
+        """
+        Claim the first pending job for which `fits(job)` is true.
+
+        :return: the claimed SamplingJob, or None
+        """
+        for name in self.names("pending"):
+            path = self.path("pending", name)
+            try:
+                with open(path, "rb") as f:
+                    job = pickle.load(f)
+                if fits is not None and not fits(job):
+                    continue
+                # touch before the rename, which keeps the modification time, so the claim is never stale
+                os.utime(path)
+                os.rename(path, self.path("claimed", name))
+            except FileNotFoundError:
+                # claimed by another worker in the meantime
+                continue
+            log.info(f"Claimed {name} on {socket.gethostname()}")
+            return job
+        return None
+
+    def heartbeat(self, name):
+        """Mark the claim of `name` as alive, returning False if the claim was lost."""
+        try:
+            os.utime(self.path("claimed", name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def finish(self, name, exitcode):
+        state = "done" if exitcode == 0 else "failed"
+        try:
+            os.rename(self.path("claimed", name), self.path(state, name))
+        except FileNotFoundError:
+            log.warning(f"Claim of {name} was lost before it finished")
+
+    def reject(self, name, reason):
+        """Move the pending job `name` to failed/, writing `reason` to failed/`name`.error."""
+        try:
+            os.rename(self.path("pending", name), self.path("failed", name))
+        except FileNotFoundError:
+            return False
+        with open(os.path.join(self.root, "failed", f"{name}.error"), "w") as f:
+            f.write(reason + "\n")
+        log.error(reason)
+        return True
+
+    def error(self, name):
+        """Reason the job `name` was rejected, or None."""
+        try:
+            with open(os.path.join(self.root, "failed", f"{name}.error")) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def register(self, worker, memory_budget):
+        """Record, or refresh, the memory budget of `worker` (None for unlimited)."""
+        path = os.path.join(self.root, "workers", f"{worker}.json")
+        tmp_path = os.path.join(self.root, f".{worker}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(dict(memory_budget=memory_budget), f)
+        os.replace(tmp_path, path)
+
+    def unregister(self, worker):
+        try:
+            os.remove(os.path.join(self.root, "workers", f"{worker}.json"))
+        except FileNotFoundError:
+            pass
+
+    def memory_budgets(self):
+        """Memory budgets of the workers that registered within the last `stale_after` seconds."""
+        now = time.time()
+        budgets = []
+        directory = os.path.join(self.root, "workers")
+        for filename in os.listdir(directory):
+            try:
+                path = os.path.join(directory, filename)
+                if filename.endswith(".json") and now - os.path.getmtime(path) <= self.stale_after:
+                    with open(path) as f:
+                        budgets.append(json.load(f)["memory_budget"])
+            except FileNotFoundError:
+                continue
+        return budgets
+
+    def fail_oversized(self):
+        """Reject the pending jobs needing more memory than the budget of every live worker, returning their names."""
+        budgets = self.memory_budgets()
+        if not budgets or None in budgets:
+            return []
+        largest = max(budgets)
+        rejected = []
+        for name in self.names("pending"):
+            try:
+                with open(self.path("pending", name), "rb") as f:
+                    job = pickle.load(f)
+            except FileNotFoundError:
+                continue
+            if job.memory is not None and job.memory > largest:
+                reason = (f"{name} needs {job.memory / 2 ** 30:.1f} GiB, more than the memory budget of any worker "
+                          f"({largest / 2 ** 30:.1f} GiB)")
+                if self.reject(name, reason):
+                    rejected.append(name)
+        return rejected
+
+    def requeue_stale(self):
+        now = time.time()
+        for name in self.names("claimed"):
+            path = self.path("claimed", name)
+            try:
+                if now - os.path.getmtime(path) > self.stale_after:
+                    os.rename(path, self.path("pending", name))
+                    log.warning(f"Re-queued stale claim {name}")
+            except FileNotFoundError:
+                continue
+
+    def requeue_failed(self):
+        for name in self.names("failed"):
+            os.rename(self.path("failed", name), self.path("pending", name))
+            if self.error(name) is not None:
+                os.remove(os.path.join(self.root, "failed", f"{name}.error"))
+
+    def status(self):
+        return {state: len(self.names(state)) for state in QUEUE_STATES}
+
+
+class QueueWorker(CoreBudgetScheduler):
+    """
+    Scheduler that runs jobs claimed from a WorkQueue within the core and memory budget of this node. Jobs that
+    fit no registered worker's memory budget are failed, see WorkQueue.fail_oversized.
+    """
+
+    def __init__(self, queue, n_cores=None, poll_interval=5, pin_cores=True, memory_budget=None):
+        super().__init__(n_cores, poll_interval=poll_interval, pin_cores=pin_cores, memory_budget=memory_budget)
+        self.queue = queue
+        self.worker = f"{socket.gethostname()}.{os.getpid()}"
+
+    def _fits(self, job):
+        # jobs needing more memory than this node has stay queued for other nodes
+        if self.reserving() or not self.fits_memory_budget(job):
+            return False
+        clipped = copy.copy(job)
+        clipped.cores = min(job.cores, max(1, self.n_cores // job.threads_per_chain))
+        clipped.threads_per_chain = min(job.threads_per_chain, self.n_cores)
+        return self.can_start(clipped)
+
+    def run(self, exit_when_empty=True):
+        """
+        Claim and run jobs until the queue has no pending or claimed jobs (or forever, without
+        exit_when_empty), returning a dict of job id -> exit code of the jobs run by this worker.
+        """
+        try:
+            return self._run(exit_when_empty)
+        finally:
+            self.queue.unregister(self.worker)
+
+    def _run(self, exit_when_empty):
+        while True:
+            self.rounds += 1
+            self.queue.register(self.worker, self.memory_budget)
+            finished = set(self.exitcodes)
+            self._reap()
+            for job_id in set(self.exitcodes) - finished:
+                self.queue.finish(self.jobs[job_id].name, self.exitcodes[job_id])
+
+            for _, job, _ in self.running.values():
+                if not self.queue.heartbeat(job.name):
+                    log.warning(f"Claim of {job.name} was lost, it is likely being run by another worker too")
+            self.queue.requeue_stale()
+            self.queue.fail_oversized()
+
+            job = self.queue.claim(self._fits)
+            while job is not None:
+                self.submit(job)
+                self._start_fitting()
+                job = self.queue.claim(self._fits)
+
+            if exit_when_empty and not self.running and not self.queue.names("pending") \
+                    and not self.queue.names("claimed"):
+                return self.exitcodes
+            time.sleep(self.poll_interval)
+
+
+def enqueue(jobs, root, force=False):
+    """Add `jobs` to the queue in `root`, returning the number of jobs added."""
+    queue = WorkQueue(root)
+    return sum(queue.put(job, force=force) for job in jobs)
+
+
+def run_worker(root, n_cores=None, poll_interval=5, stale_after=600, exit_when_empty=True):
+    return QueueWorker(WorkQueue(root, stale_after), n_cores, poll_interval).run(exit_when_empty)
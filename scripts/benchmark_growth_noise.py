@@ -0,0 +1,62 @@
+### threading
+import os
+os.environ["THEANO_FLAGS"] = "OMP_NUM_THREADS=1, MKL_NUM_THREADS=1, OPENBLAS_NUM_THREADS=1"
+os.environ["OMP_NUM_THREADS"] = "1"
+os.environ["MKL_NUM_THREADS"] = "1"
+os.environ["OPENBLAS_NUM_THREADS"] = "1"
+
+### Initial imports
+import logging
+import time
+import numpy as np
+import pymc3 as pm
+import arviz as az
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+import warnings
+warnings.simplefilter(action="ignore", category=FutureWarning)
+
+from epimodel.pymc3_models import cm_effect
+from epimodel.pymc3_models.cm_effect.datapreprocessor import DataPreprocessor
+import argparse
+
+# compares the growth noise parameterisations of CMCombined_Final, reporting effective samples of CMReduction
+# per second of sampling and per gradient evaluation. The models have the same posterior, so this is the only
+# basis for choosing the random_walk parameterisation.
+argparser = argparse.ArgumentParser()
+argparser.add_argument("--s", dest="nS", default=1000, type=int)
+argparser.add_argument("--t", dest="nT", default=500, type=int)
+argparser.add_argument("--c", dest="nC", default=4, type=int)
+argparser.add_argument("--max_treedepth", dest="max_treedepth", default=12, type=int)
+argparser.add_argument("--target_accept", dest="target_accept", default=0.95, type=float)
+argparser.add_argument("--data", dest="data_path", default="notebooks/double-entry-data/double_entry_final.csv",
+                       type=str)
+args = argparser.parse_args()
+
+if __name__ == "__main__":
+    dp = DataPreprocessor(drop_HS=True)
+    data = dp.preprocess_data(args.data_path, last_day="2020-05-30")
+    data.mask_reopenings()
+
+    results = []
+    for growth_noise in ["default", "random_walk"]:
+        with cm_effect.models.CMCombined_Final(data, None) as model:
+            model.build_model(growth_noise=growth_noise)
+
+        with model.model:
+            start = time.time()
+            trace = pm.sample(args.nS, tune=args.nT, chains=args.nC, cores=args.nC,
+                              target_accept=args.target_accept, max_treedepth=args.max_treedepth)
+            elapsed = time.time() - start
+
+        ess = np.asarray(az.ess(trace, var_names=["CMReduction"])["CMReduction"])
+        n_grad = np.sum(trace.get_sampler_stats("tree_size"))
+        results.append((growth_noise, elapsed, np.min(ess), np.min(ess) / elapsed, n_grad / np.min(ess),
+                        np.mean(trace.get_sampler_stats("depth")), np.sum(trace.get_sampler_stats("diverging"))))
+
+    print(f"{'parameterisation':>18} {'time (s)':>10} {'min ESS':>10} {'ESS/s':>10} {'grads/ESS':>10} "
+          f"{'mean depth':>11} {'divergences':>12}")
+    for r in results:
+        print(f"{r[0]:>18} {r[1]:>10.0f} {r[2]:>10.0f} {r[3]:>10.3f} {r[4]:>10.0f} {r[5]:>11.2f} {r[6]:>12d}")
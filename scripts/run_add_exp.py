@@ -7,9 +7,6 @@ os.environ["OPENBLAS_NUM_THREADS"] = "1"
 
 ### Initial imports
 import logging
-import copy
-import numpy as np
-import pymc3 as pm
 import seaborn as sns
 sns.set_style("ticks")
 
@@ -20,273 +17,85 @@ import warnings
 warnings.simplefilter(action="ignore", category=FutureWarning)
 
 from epimodel.pymc3_models import cm_effect
-from epimodel.pymc3_models.cm_effect.datapreprocessor import DataPreprocessor
+from epimodel.pymc3_models.cm_effect.experiments import ExperimentSpec, ExperimentRunner
+from epimodel.pymc3_models.cm_effect.catalog import ResultsCatalog, params_key
+from epimodel.pymc3_models.cm_effect.traceio import TRAJECTORY_POLICIES, save_model_trace
 import argparse
-import pickle
 
 argparser = argparse.ArgumentParser()
-argparser.add_argument("--exp", dest="exp", type=int)
+argparser.add_argument("--exp", dest="exp", type=int, nargs="*", help="experiments to run, default all")
 args = argparser.parse_args()
 
-def mask_region(d, region, days=14):
-    i = d.Rs.index(region)
-    c_s = np.nonzero(np.cumsum(d.NewCases.data[i, :] > 0)==days+1)[0][0]
-    d_s = np.nonzero(np.cumsum(d.NewDeaths.data[i, :] > 0)==days+1)[0]
-    if len(d_s) > 0:
-        d_s = d_s[0]
-    else:
-        d_s = len(d.Ds)
+mob_data_path = "notebooks/double-entry-data/double_entry_final_mob.csv"
+oxcgrt_features = ["Travel Screen/Quarantine", "Travel Bans", "Public Transport Limited", "Internal Movement Limited",
+                   "Public Information Campaigns", "Symptomatic Testing"]
+major_interventions = ["School Closure", "Stay Home Order", "Some Businesses Suspended", "University Closure",
+                       "Most Businesses Suspended", "Gatherings <10", "Gatherings <1000", "Gatherings <100"]
+mask_reopenings = ("mask_reopenings", {})
 
-    d.Active.mask[i,c_s:] = True
-    d.Confirmed.mask[i,c_s:] = True
-    d.Deaths.mask[i,d_s:] = True
-    d.NewDeaths.mask[i,d_s:] = True
-    d.NewCases.mask[i,c_s:] = True
-
-if __name__ == "__main__":
-
-    dp = DataPreprocessor()
-    exp_num = args.exp
-
-    print(f"running exp {exp_num}")
+EXPERIMENTS = [
     # structural sensitivity
-    if exp_num == 1:
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30", schools_unis="whoops")
-        data.mask_reopenings()
-
-        with cm_effect.models.CMCombined_Additive(data, None) as model:
-            model.build_model()
-
-    elif exp_num == 2:
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings()
-
-        with cm_effect.models.CMCombined_Final_V3(data, None) as model:
-            model.build_model()
-
-    elif exp_num == 3:
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings()
-
-        with cm_effect.models.CMCombined_Final_DifEffects(data, None) as model:
-            model.build_model()
-
-    elif exp_num == 4:
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings()
-
-        with cm_effect.models.CMCombined_Final_ICL(data, None) as model:
-            model.build_model()
-
-    # OxCGRT Checks
-    elif exp_num == 5:
-        dp.drop_features = ["Public Transport Limited",
-                              "Internal Movement Limited",
-                              "Public Information Campaigns", "Symptomatic Testing"]
-
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings()
-
-        with cm_effect.models.CMCombined_Final(data, None) as model:
-            model.build_model()
-
-    elif exp_num == 6:
-        dp.drop_features = ["Travel Screen/Quarantine", "Travel Bans",
-                              "Internal Movement Limited",
-                              "Public Information Campaigns", "Symptomatic Testing"]
-
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings()
-
-        with cm_effect.models.CMCombined_Final(data, None) as model:
-            model.build_model()
-
-    elif exp_num == 7:
-        dp.drop_features = ["Travel Screen/Quarantine", "Travel Bans", "Public Transport Limited",
-                              "Public Information Campaigns", "Symptomatic Testing"]
-
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings()
-
-        with cm_effect.models.CMCombined_Final(data, None) as model:
-            model.build_model()
-
-    elif exp_num == 8:
-        dp.drop_features = ["Travel Screen/Quarantine", "Travel Bans", "Public Transport Limited",
-                              "Internal Movement Limited", "Symptomatic Testing"]
-
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings()
-
-        with cm_effect.models.CMCombined_Final(data, None) as model:
-            model.build_model()
-
-    elif exp_num == 9:
-        dp.drop_features = ["Travel Screen/Quarantine", "Travel Bans", "Public Transport Limited", "Public Information Campaigns",
-                              "Internal Movement Limited"]
-
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings()
-
-        with cm_effect.models.CMCombined_Final(data, None) as model:
-            model.build_model()
-
-    elif exp_num == 10:
-        dp.drop_features.append("Mobility - retail and rec")
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final_mob.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings(max_cms=9)
-
-        with cm_effect.models.CMCombined_Final(data, None) as model:
-            model.build_model()
-
-    elif exp_num == 11:
-        # mobility 2
-        dp.drop_features.append("Mobility - workplace")
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final_mob.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings(max_cms=9)
-
-        with cm_effect.models.CMCombined_Final(data, None) as model:
-            model.build_model()
-
-    elif exp_num == 12:
-        # mobility 3
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final_mob.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings(max_cms=9)
-
-        with cm_effect.models.CMCombined_Final(data, None) as model:
-            model.build_model()
-
+    ExperimentSpec(1, cm_effect.models.CMCombined_Additive, transforms=[mask_reopenings]),
+    ExperimentSpec(2, cm_effect.models.CMCombined_Final_V3, transforms=[mask_reopenings]),
+    ExperimentSpec(3, cm_effect.models.CMCombined_Final_DifEffects, transforms=[mask_reopenings]),
+    ExperimentSpec(4, cm_effect.models.CMCombined_Final_ICL, transforms=[mask_reopenings]),
+    # OxCGRT checks, including the travel features or one of the other OxCGRT features
+    ExperimentSpec(5, cm_effect.models.CMCombined_Final, drop=oxcgrt_features[2:], transforms=[mask_reopenings]),
+    *[ExperimentSpec(4 + i, cm_effect.models.CMCombined_Final, drop=[f for f in oxcgrt_features if f != feature],
+                     transforms=[mask_reopenings])
+      for i, feature in enumerate(oxcgrt_features) if i >= 2],
+    # mobility
+    ExperimentSpec(10, cm_effect.models.CMCombined_Final, data_path=mob_data_path,
+                   drop=[*oxcgrt_features, "Mobility - retail and rec"], transforms=[("mask_reopenings", {"max_cms": 9})]),
+    ExperimentSpec(11, cm_effect.models.CMCombined_Final, data_path=mob_data_path,
+                   drop=[*oxcgrt_features, "Mobility - workplace"], transforms=[("mask_reopenings", {"max_cms": 9})]),
+    ExperimentSpec(12, cm_effect.models.CMCombined_Final, data_path=mob_data_path,
+                   transforms=[("mask_reopenings", {"max_cms": 9})]),
     # any NPI active
-    elif exp_num == 13:
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-
-        major_interventions = ["School Closure", "Stay Home Order", "Some Businesses Suspended",  "University Closure",
-                               "Most Businesses Suspended", "Gatherings <10", "Gatherings <1000", "Gatherings <100"]
-
-        nRs, nCMs, nDs = data.ActiveCMs.shape
-
-        ActiveCMs = np.zeros((nRs, nCMs + 1, nDs))
-        ActiveCMs[:, :-1, :] = data.ActiveCMs
-
-        maj_indxs = np.array([data.CMs.index(x) for x in major_interventions])
-
-        for r in range(nRs):
-            maj_active = np.sum(data.ActiveCMs[r, maj_indxs, :], axis=0)
-            # bonus NPI is **any** major NPI is active.
-            ActiveCMs[r, -1, :] = maj_active > 0
-
-        data.CMs = [*data.CMs, "Any NPI Active"]
-        data.ActiveCMs = ActiveCMs
-
-        data.mask_reopenings()
-        with cm_effect.models.CMCombined_Final(data, None) as model:
-            model.build_model()
-
+    ExperimentSpec(13, cm_effect.models.CMCombined_Final,
+                   transforms=[("add_any_active", {"features": major_interventions}), mask_reopenings]),
     # NPI timing
-    elif exp_num == 14:
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-
-        major_interventions = ["School Closure", "Stay Home Order", "Some Businesses Suspended", "University Closure",
-                               "Most Businesses Suspended", "Gatherings <10", "Gatherings <1000", "Gatherings <100", "Mask Wearing"]
-        ActiveCMs = copy.deepcopy(data.ActiveCMs)
-        maj_indxs = np.array([data.CMs.index(x) for x in major_interventions])
-        nRs, nCMs, nDs = ActiveCMs.shape
-        maj_mat = np.zeros((len(major_interventions), len(major_interventions)))
-        for r in range(nRs):
-            maj_active = np.sum(data.ActiveCMs[r, maj_indxs, :], axis=0)
-            for i in range(len(major_interventions)):
-                ActiveCMs[r, i, :] = maj_active > i
-
-
-        data.CMs = [f"Major {i + 1}" for i in range(len(major_interventions))]
-        data.ActiveCMs = ActiveCMs
-
-        data.mask_reopenings()
-
-        with cm_effect.models.CMCombined_Final(data, None) as model:
-            model.build_model()
-
-    # Different Delays
-    elif exp_num == 15:
-        dp.drop_features = ["Travel Screen/Quarantine", "Travel Bans", "Public Transport Limited",
-                              "Internal Movement Limited",
-                              "Public Information Campaigns"]
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings()
-
-        with cm_effect.models.CMCombined_Final_DifDelays(data, None) as model:
-            model.build_model()
-
+    ExperimentSpec(14, cm_effect.models.CMCombined_Final,
+                   transforms=[("count_active", {"features": [*major_interventions, "Mask Wearing"]}),
+                               mask_reopenings]),
+    # different delays
+    ExperimentSpec(15, cm_effect.models.CMCombined_Final_DifDelays, drop=oxcgrt_features[:-1],
+                   transforms=[mask_reopenings]),
     # delayed schools and universities
-    elif exp_num == 16:
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings()
-        n_delay = 6
-        to_delay_index = [data.CMs.index(cm) for cm in ["School Closure", "University Closure"]]
-        active_cms = copy.deepcopy(data.ActiveCMs)
-        data.ActiveCMs[:, to_delay_index, n_delay:] = active_cms[:, to_delay_index, :-n_delay]
-        data.ActiveCMs[:, to_delay_index, :n_delay] = 0
-        with cm_effect.models.CMCombined_Final(data, None) as model:
-            model.build_model()
-
-    # aggregated holdouts
-    elif exp_num == 17:
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-
-        data.mask_region_ends()
-        # and mask earlier if needed
-        data.mask_reopenings(n_extra=20)
-
-        with cm_effect.models.CMCombined_Final(data, None) as model:
-            model.build_model()
-
-    elif exp_num == 18:
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings()
-
-        with cm_effect.models.CMActive_Final(data, None) as model:
-            model.build_model()
-
-    elif exp_num == 19:
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings()
-
-        with cm_effect.models.CMDeath_Final(data, None) as model:
-            model.build_model()
-
-    elif exp_num == 20:
-        data = dp.preprocess_data("notebooks/double-entry-data/double_entry_final.csv", last_day="2020-05-30",
-                                  schools_unis="whoops")
-        data.mask_reopenings()
-        to_del_index = [data.CMs.index(cm) for cm in ["School Closure", "University Closure"]]
-        data.ActiveCMs[:, to_del_index, :] = 0
-
-        with cm_effect.models.CMCombined_Final(data, None) as model:
-            model.build_model()
-
-
-    with model.model:
-        model.trace = pm.sample(2000, tune=500, cores=4, chains=4, max_treedepth=12)
+    ExperimentSpec(16, cm_effect.models.CMCombined_Final,
+                   transforms=[mask_reopenings, ("delay_features", {"features": ["School Closure",
+                                                                                 "University Closure"],
+                                                                    "n_delay": 6})]),
+    # aggregated holdouts, masking earlier if needed
+    ExperimentSpec(17, cm_effect.models.CMCombined_Final,
+                   transforms=[("mask_region_ends", {}), ("mask_reopenings", {"n_extra": 20})]),
+    ExperimentSpec(18, cm_effect.models.CMActive_Final, transforms=[mask_reopenings]),
+    ExperimentSpec(19, cm_effect.models.CMDeath_Final, transforms=[mask_reopenings]),
+    ExperimentSpec(20, cm_effect.models.CMCombined_Final,
+                   transforms=[mask_reopenings, ("ignore_features", {"features": ["School Closure",
+                                                                                  "University Closure"]})]),
+]
+
+
+def save_trace(exp_num, model, timings):
+    # read with traceio.load_trace, which loads single variables or regions
+    # the latent trajectories are only plotted, so they are kept at float32 for 500 draws per chain; load with
+    # align_draws=True to use the trace as model.trace, e.g. for posterior_predictive
+    trace_path = f"additional_exps/exp_{exp_num}.trace"
+    report = save_model_trace(trace_path, model, policies=TRAJECTORY_POLICIES)
+    log.info(f"Trace storage of experiment {exp_num}:\n{report.to_string()}")
+    params = EXPERIMENTS_BY_NAME[exp_num].params()
+    ResultsCatalog().record("additional_exps", exp_num, model, params=params, result_key=params_key(params),
+                            trace_path=trace_path, timings=timings)
+
+
+EXPERIMENTS_BY_NAME = {spec.name: spec for spec in EXPERIMENTS}
 
+if __name__ == "__main__":
     out_dir = "additional_exps"
     if not os.path.exists(out_dir):
         os.makedirs(out_dir)
-    pickle.dump(model.trace, open(f"additional_exps/exp_{exp_num}.pkl","wb"))
+
+    runner = ExperimentRunner(EXPERIMENTS)
+    print(f"running exps {args.exp if args.exp else list(runner.specs)}")
+    runner.run(args.exp if args.exp else None, save=save_trace)
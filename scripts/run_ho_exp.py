@@ -19,7 +19,9 @@ import warnings
 warnings.simplefilter(action="ignore", category=FutureWarning)
 
 from epimodel.pymc3_models import cm_effect
+from epimodel.pymc3_models.cm_effect.catalog import ResultsCatalog, params_key
 from epimodel.pymc3_models.cm_effect.datapreprocessor import DataPreprocessor
+from epimodel.pymc3_models.cm_effect.instrumentation import run_record, stage
 import argparse
 import pickle
 
@@ -65,11 +67,15 @@ if __name__ == "__main__":
         indx = data.Rs.index(rg)
 
         print(f"holdout {rg} w/ {indx}")
-        with cm_effect.models.CMCombined_Final(data, None) as model:
-            model.build_model()
+        with run_record(f"holdout_{rg}") as record:
+            with cm_effect.models.CMCombined_Final(data, None) as model, stage("build_model"):
+                model.build_model()
 
-        with model.model:
-            model.trace = pm.sample(1500, tune=500, cores=4, max_treedepth=12)
+            with model.model, stage("sample"):
+                model.trace = pm.sample(1500, tune=500, cores=4, max_treedepth=12)
 
         results_obj = ResultsObject(indx, model.trace)
         pickle.dump(results_obj, open(f"ho_results_final4/{rg}.pkl","wb"))
+        params = dict(heldout_region=rg, N=1500, tune=500)
+        ResultsCatalog().record("ho_results_final4", rg, model, params=params, result_key=params_key(params),
+                                trace_path=f"ho_results_final4/{rg}.pkl", timings=record.walls())
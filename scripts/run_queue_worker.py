@@ -0,0 +1,36 @@
+### Initial imports
+import logging
+import argparse
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+from epimodel.pymc3_models.cm_effect.workqueue import WorkQueue, QueueWorker
+
+argparser = argparse.ArgumentParser()
+argparser.add_argument("--queue", dest="queue", required=True, type=str,
+                       help="work queue directory on the shared filesystem")
+argparser.add_argument("--cores", dest="n_cores", default=None, type=int,
+                       help="core budget on this node, defaults to all available cores")
+argparser.add_argument("--stale", dest="stale_after", default=600, type=int,
+                       help="seconds without heartbeat after which a claim is re-queued")
+argparser.add_argument("--retry_failed", dest="retry_failed", action="store_true",
+                       help="re-queue failed jobs before starting")
+argparser.add_argument("--status", dest="status", action="store_true", help="only print the queue status")
+argparser.add_argument("--forever", dest="forever", action="store_true",
+                       help="keep waiting for new jobs when the queue is empty")
+args = argparser.parse_args()
+
+if __name__ == "__main__":
+    queue = WorkQueue(args.queue, stale_after=args.stale_after)
+    if args.status:
+        print(queue.status())
+        exit()
+
+    if args.retry_failed:
+        queue.requeue_failed()
+
+    exitcodes = QueueWorker(queue, n_cores=args.n_cores).run(exit_when_empty=not args.forever)
+    for name, code in exitcodes.items():
+        print(f"{name}: exit code {code}")
+    print(queue.status())
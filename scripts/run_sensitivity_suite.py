@@ -0,0 +1,81 @@
+### Initial imports
+import logging
+import argparse
+
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+from epimodel.pymc3_models.cm_effect import sensitivitylib
+from epimodel.pymc3_models.cm_effect.scheduler import SamplingJob, run_jobs
+from epimodel.pymc3_models.cm_effect.workqueue import enqueue
+
+argparser = argparse.ArgumentParser()
+argparser.add_argument("--cores", dest="n_cores", default=None, type=int,
+                       help="core budget for the whole suite, defaults to all available cores")
+argparser.add_argument("--chains", dest="n_chains", default=4, type=int)
+argparser.add_argument("--threads", dest="n_threads", default=1, type=int,
+                       help="BLAS/OpenMP threads per chain")
+argparser.add_argument("--model_types", nargs="+", dest="model_types", default=["combined"], type=str)
+argparser.add_argument("--plan", dest="plan", action="store_true",
+                       help="only print the deduplicated runs of the suite")
+argparser.add_argument("--dry_run", dest="dry_run", action="store_true",
+                       help="print every run of the suite with duplicates, stored results and estimated times from "
+                            "run_profile.jsonl, without building or sampling any model")
+argparser.add_argument("--queue", dest="queue", default=None, type=str,
+                       help="add the runs to the work queue in this directory instead of running them, "
+                            "see scripts/run_queue_worker.py")
+args = argparser.parse_args()
+
+suite = [
+    sensitivitylib.cm_leavout_sensitivity,
+    sensitivitylib.cm_prior_sensitivity,
+    sensitivitylib.daily_growth_noise_sensitivity,
+    sensitivitylib.delay_mean_sensitivity,
+    sensitivitylib.min_num_confirmed_sensitivity,
+    sensitivitylib.R_hyperprior_mean_sensitivity,
+    sensitivitylib.serial_interval_sensitivity,
+    sensitivitylib.min_num_deaths_sensitivity,
+    sensitivitylib.smoothing_sensitivity,
+]
+
+if __name__ == "__main__":
+    if args.plan:
+        runner = sensitivitylib.SensitivityRunner()
+        for f in suite:
+            f(args.model_types, runner=runner)
+        runner.print_plan()
+        exit()
+
+    if args.dry_run:
+        runner = sensitivitylib.SensitivityRunner()
+        for f in suite:
+            runner.source = f.__name__
+            f(args.model_types, runner=runner)
+        plan = runner.dry_run()
+
+        with pd.option_context("display.max_rows", None, "display.width", 200):
+            print(plan)
+        to_run = plan[plan.duplicate_of.isnull() & ~plan.cached]
+        print(f"{len(plan)} runs: {plan.duplicate_of.notnull().sum()} duplicates, {plan.cached.sum()} stored, "
+              f"{len(to_run)} to sample")
+        print(f"estimated {to_run.core_hours.sum():.1f} core-hours, "
+              f"{to_run.core_hours.isnull().sum()} runs without timing records")
+        print(plan.groupby("source").core_hours.sum())
+        exit()
+
+    if args.queue is not None:
+        runner = sensitivitylib.SensitivityRunner()
+        for f in suite:
+            f(args.model_types, runner=runner)
+        n_queued = enqueue(runner.jobs(threads_per_chain=args.n_threads), args.queue)
+        print(f"Queued {n_queued} jobs in {args.queue}")
+        exit()
+
+    jobs = [SamplingJob(f.__name__, f, args=(args.model_types,), chains=args.n_chains,
+                        threads_per_chain=args.n_threads) for f in suite]
+
+    exitcodes = run_jobs(jobs, n_cores=args.n_cores)
+    for name, code in exitcodes.items():
+        print(f"{name}: exit code {code}")
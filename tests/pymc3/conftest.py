@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def synthetic_data():
+    """Small PreprocessedData with 3 regions, 2 NPIs and 60 days."""
+    datapreprocessor = pytest.importorskip("epimodel.pymc3_models.cm_effect.datapreprocessor")
+
+    rng = np.random.RandomState(0)
+    nRs, nCMs, nDs = 3, 2, 60
+    Ds = list(pd.date_range("2020-02-10", periods=nDs, tz="utc"))
+
+    ActiveCMs = np.zeros((nRs, nCMs, nDs))
+    for r in range(nRs):
+        for cm in range(nCMs):
+            ActiveCMs[r, cm, 25 + 5 * r + 7 * cm:] = 1
+
+    NewCases = np.round(np.exp(np.linspace(2, 6, nDs)) * rng.uniform(0.8, 1.2, size=(nRs, nDs)))
+    NewDeaths = np.round(NewCases / 30)
+    Confirmed = np.cumsum(NewCases, axis=1)
+    Deaths = np.cumsum(NewDeaths, axis=1)
+
+    return datapreprocessor.PreprocessedData(
+        np.ma.masked_invalid(Confirmed.copy()),
+        np.ma.masked_invalid(Confirmed),
+        ActiveCMs,
+        ["NPI 1", "NPI 2"],
+        ["AA", "BB", "CC"],
+        Ds,
+        np.ma.masked_invalid(Deaths),
+        np.ma.masked_invalid(NewDeaths),
+        np.ma.masked_invalid(NewCases),
+        ["Region A", "Region B", "Region C"],
+    )
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.catalog import ResultsCatalog, params_key
+from epimodel.pymc3_models.cm_effect.results import StoredTrace
+
+
+class SampledModel(object):
+    def __init__(self, d, trace):
+        self.d = d
+        self.trace = trace
+
+
+def test_runs_are_queried_by_parameters(synthetic_data, tmp_path):
+    catalog = ResultsCatalog(str(tmp_path / "catalog.sqlite"))
+    rng = np.random.RandomState(0)
+    for i, noise in enumerate([0.1, 0.2, 0.1]):
+        trace = StoredTrace({"CMReduction": 0.5 + 0.1 * i + 0.01 * rng.randn(2, 100, 2)})
+        catalog.record("daily_growth_noise_sensitivity", f"run_{i}", SampledModel(synthetic_data, trace),
+                       params=dict(model_type="combined", DailyGrowthNoise=noise, transforms=["mask_reopenings"],
+                                   delay=np.arange(3.)),
+                       trace_path=f"result_store/{i}.npz", timings=dict(sample=10. * i))
+
+    runs = catalog.runs(DailyGrowthNoise=0.1)
+    assert runs.name.tolist() == ["run_0", "run_2"]
+    assert runs.param_transforms[0] == ["mask_reopenings"]
+    assert runs.data_fingerprint[0] == synthetic_data.fingerprint()
+    assert len(catalog.runs(model_type="combined", params=dict(DailyGrowthNoise=0.2))) == 1
+    assert len(catalog.runs(experiment="other")) == 0
+
+    summaries = catalog.summaries("CMReduction", DailyGrowthNoise=0.1)
+    assert summaries.label.tolist() == ["NPI 1", "NPI 2"] * 2
+    assert np.allclose(summaries.q50, [0.5, 0.5, 0.7, 0.7], atol=0.01)
+    assert np.all(summaries.q2_5 < summaries.q50) and np.all(summaries.q50 < summaries.q97_5)
+    assert np.all(np.abs(summaries.r_hat - 1) < 0.05)
+
+
+def test_rerecorded_runs_replace_earlier_records_and_skip_elements(synthetic_data, tmp_path):
+    catalog = ResultsCatalog(str(tmp_path / "catalog.sqlite"))
+    rng = np.random.RandomState(0)
+    alpha = 0.1 * rng.randn(2, 100, 2)
+    # the chains of feature 0 disagree, as for a left-out feature sampled from its prior
+    alpha[1, :, 0] += 5
+    model = SampledModel(synthetic_data, StoredTrace({"CM_Alpha": alpha, "CMReduction": np.exp(-alpha)}))
+    model.free_variables = ["CM_Alpha"]
+
+    for _ in range(2):
+        catalog.record("cm_leavout_sensitivity", "cm_leavout_0", model, result_key="key",
+                       skip_elements={"CM_Alpha": [0], "CMReduction": [0]})
+    catalog.record("cm_leavout_sensitivity", "cm_leavout_0", model, result_key="other")
+
+    assert catalog.contains("cm_leavout_sensitivity", "cm_leavout_0", "key")
+    assert not catalog.contains(None, "cm_leavout_0", "key")
+    runs = catalog.runs()
+    assert runs.result_key.tolist() == ["key", "other"]
+    assert runs.max_r_hat[0] < 1.05 and runs.max_r_hat[1] > 1.5
+
+    summaries = catalog.summaries("CMReduction")
+    assert summaries.label.tolist() == ["NPI 2", "NPI 1", "NPI 2"]
+
+
+def test_params_key_is_stable():
+    params = dict(model_type="combined", fold=0, heldout=["DE", "HU"], alpha=np.arange(3.0))
+    assert params_key(params) == params_key(dict(reversed(list(params.items()))))
+    assert params_key(params) != params_key(dict(params, fold=1))
+    assert params_key(params) != params_key(dict(params, alpha=np.arange(4.0)))
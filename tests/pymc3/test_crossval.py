@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from scipy.stats import nbinom
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.crossval import heldout_scores, holdout_fold
+from epimodel.pymc3_models.cm_effect.sequential import ParticleTrace
+
+
+def test_heldout_scores_match_scipy(synthetic_data):
+    heldout = holdout_fold(synthetic_data, ["BB"])
+    c_s, d_s = heldout["BB"]
+    assert np.all(synthetic_data.NewCases.mask[1, c_s:])
+
+    nS, nRs, nDs = 10, 3, 60
+    trace = ParticleTrace({"ExpectedCases": np.full((nS, nRs, nDs), 100.0),
+                           "ExpectedDeaths": np.full((nS, nRs, nDs), 3.0),
+                           "Phi_1": np.full(nS, 5.0)})
+    rows = heldout_scores(trace, synthetic_data, heldout)
+
+    cases = synthetic_data.NewCases.data[1, c_s:]
+    mu = 100.0
+    expected = np.sum(nbinom.logpmf(cases, 5.0, 5.0 / (5.0 + mu)))
+    assert rows[0]["observation"] == "cases"
+    assert rows[0]["n_days"] == nDs - c_s
+    assert rows[0]["lppd"] == pytest.approx(expected)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.diagnostics import diagnostics, rhat
+from epimodel.pymc3_models.cm_effect.results import StoredTrace
+
+
+class SampledModel(object):
+    def __init__(self, trace):
+        self.trace = trace
+
+
+def test_diagnostics_table_and_cache():
+    rng = np.random.RandomState(0)
+    alpha = rng.randn(4, 500, 3)
+    alpha[1, :, 2] += 3
+    model = SampledModel(StoredTrace({"CM_Alpha": alpha, "Psi": rng.randn(4, 500)}))
+
+    table = diagnostics(model, ["CM_Alpha", "Psi"])
+    assert table.variable.tolist() == ["CM_Alpha"] * 3 + ["Psi"]
+    assert table.element.tolist() == ["0", "1", "2", ""]
+    assert np.all(np.abs(table.r_hat[[0, 1, 3]] - 1) < 0.02)
+    assert table.r_hat[2] > 1.1
+    assert np.all(np.abs(table.ess_relative[[0, 1, 3]] - 1) < 0.2)
+    assert np.allclose(table.ess, table.ess_relative * 2000)
+
+    cached = model.diagnostics_cache[1]["Psi"]
+    assert diagnostics(model, ["Psi"]).r_hat[0] == table.r_hat[3]
+    assert model.diagnostics_cache[1]["Psi"] is cached
+
+    model.trace = StoredTrace({"Psi": rng.randn(4, 500)})
+    assert diagnostics(model, ["Psi"]).r_hat[0] != table.r_hat[3]
+
+
+def test_rhat_with_odd_draw_count():
+    # reference values of the rank-normalised split R-hat of Vehtari et al. (2019), folding the draws around the
+    # median of all draws before splitting the chains, computed one element at a time. The middle draws, which
+    # splitting drops when the number of draws is odd, move that median.
+    rng = np.random.RandomState(2)
+    x = rng.randn(4, 101, 1)
+    x[0] *= 3
+    x[:, 50] += 4
+    assert rhat(x)[0] == pytest.approx(1.1005125747427684, rel=1e-9)
+
+    x = rng.randn(4, 7, 1)
+    x[:, 3, 0] = 5 + np.arange(4)
+    x[0] *= 2
+    assert rhat(x)[0] == pytest.approx(1.252811647327278, rel=1e-9)
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.experiments import ExperimentSpec, ExperimentRunner, TRANSFORMS
+from epimodel.pymc3_models.cm_effect.models import CMCombined_Final, CMDeath_Final
+
+
+def test_graph_shares_preprocessing_and_data():
+    specs = [
+        ExperimentSpec(1, CMCombined_Final, transforms=[("mask_reopenings", {})]),
+        ExperimentSpec(2, CMDeath_Final, transforms=[("mask_reopenings", {})]),
+        ExperimentSpec(3, CMCombined_Final, drop=[], transforms=[("mask_reopenings", {})]),
+    ]
+    graph = ExperimentRunner(specs).graph()
+
+    assert len(graph) == 1
+    data_nodes = list(graph.values())[0]
+    assert len(data_nodes) == 2
+    assert sorted(len(models) for models in data_nodes.values()) == [1, 2]
+
+
+def test_feature_transforms(synthetic_data):
+    TRANSFORMS["add_any_active"](synthetic_data, ["NPI 1", "NPI 2"])
+    assert synthetic_data.CMs[-1] == "Any NPI Active"
+    assert np.all(synthetic_data.ActiveCMs[:, -1, :] == np.any(synthetic_data.ActiveCMs[:, :2, :], axis=1))
+
+    TRANSFORMS["drop_features"](synthetic_data, ["NPI 1"])
+    assert synthetic_data.CMs == ["NPI 2", "Any NPI Active"]
+    assert synthetic_data.ActiveCMs.shape == (3, 2, 60)
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.factory import DataSpec, ModelSpec
+
+
+def test_unknown_model_type():
+    with pytest.raises(ValueError):
+        ModelSpec("combined_icl_no_noise", DataSpec())
+
+
+def test_spec_keys_deduplicate():
+    a = ModelSpec("combined", DataSpec(), daily_growth_noise=0.2, attrs={"DelayProbCases": np.ones(3) / 3})
+    b = ModelSpec("combined", DataSpec(), daily_growth_noise=0.2, attrs={"DelayProbCases": np.ones(3) / 3})
+    c = ModelSpec("combined", DataSpec(min_deaths=50), daily_growth_noise=0.2)
+    assert a.key() == b.key()
+    assert a.key() != c.key()
+
+
+def test_only_registered_noise_attributes_are_set():
+    assert ModelSpec("combined_no_noise", DataSpec(), daily_growth_noise=0.1, region_var_noise=0.1).attrs == {}
+    assert ModelSpec("combined_dif", DataSpec(), region_var_noise=0.2).attrs == {"RegionVariationNoise": 0.2}
+
+
+def test_mask_overlay_leaves_base_unchanged(synthetic_data):
+    from epimodel.pymc3_models.cm_effect.factory import mask_region
+
+    overlay = synthetic_data.mask_overlay()
+    mask_region(overlay, "BB")
+
+    assert np.any(overlay.NewCases.mask[1])
+    assert not np.any(np.ma.getmaskarray(synthetic_data.NewCases)[1])
+    assert np.shares_memory(overlay.NewCases.data, synthetic_data.NewCases.data)
+
+
+def test_leavout_modes(synthetic_data):
+    from epimodel.pymc3_models.cm_effect.factory import leavout_cm
+
+    deleted = leavout_cm(synthetic_data, synthetic_data.CMs, 0, mode="delete")
+    assert deleted.CMs == ["NPI 2"]
+    assert deleted.ActiveCMs.shape == (3, 1, 60)
+
+    masked = leavout_cm(synthetic_data, synthetic_data.CMs, 0, mode="mask")
+    assert masked.CMs == synthetic_data.CMs
+    assert masked.ActiveCMs.shape == synthetic_data.ActiveCMs.shape
+    assert np.all(masked.ActiveCMs[:, 0, :] == 0)
+    assert np.all(masked.ActiveCMs[:, 1, :] == synthetic_data.ActiveCMs[:, 1, :])
+    assert np.any(synthetic_data.ActiveCMs[:, 0, :] != 0)
+
+
+def test_masked_leavouts_share_graph_spec():
+    specs = [ModelSpec("combined", DataSpec(cm_leavout=i, cm_leavout_mode="mask")) for i in range(3)]
+    assert len({spec.key() for spec in specs}) == 3
+    assert {spec.graph_spec().key() for spec in specs} == {ModelSpec("combined", DataSpec()).key()}
+
+    deleted = ModelSpec("combined", DataSpec(cm_leavout=0))
+    assert deleted.graph_spec() is deleted
+
+
+def test_masked_leavouts_need_independent_feature_priors():
+    with pytest.raises(ValueError):
+        ModelSpec("combined_additive", DataSpec(cm_leavout=0, cm_leavout_mode="mask"))
+    ModelSpec("combined_additive", DataSpec(cm_leavout=0))
+
+
+def test_masked_leavout_model_data_follows_spec(synthetic_data):
+    from epimodel.pymc3_models.cm_effect.factory import ModelFactory, leavout_cm
+
+    factory = ModelFactory()
+    full = ModelSpec("combined", DataSpec())
+    masked = ModelSpec("combined", DataSpec(cm_leavout=0, cm_leavout_mode="mask"))
+    factory.set_data(full.data_spec, synthetic_data)
+    factory.set_data(masked.data_spec, leavout_cm(synthetic_data, synthetic_data.CMs, 0, mode="mask"))
+
+    model = factory.model(masked)
+    assert model is factory.model(full)
+    model = factory.model(masked)
+    assert np.all(model.ActiveCMs.get_value()[:, 0, :] == 0)
+    assert np.all(model.d.ActiveCMs[:, 0, :] == 0)
+
+    factory.model(full)
+    assert np.array_equal(model.d.ActiveCMs, synthetic_data.ActiveCMs)
+
+
+def test_start_point_fingerprint_tracks_masked_leavouts(synthetic_data):
+    from epimodel.pymc3_models.cm_effect.factory import leavout_cm
+    from epimodel.pymc3_models.cm_effect.models import CMCombined_Final
+    from epimodel.pymc3_models.cm_effect.startpoints import model_fingerprint
+
+    with CMCombined_Final(synthetic_data) as model:
+        model.build_model()
+    full = model_fingerprint(model)
+
+    pm.set_data({"ActiveCMs": leavout_cm(synthetic_data, synthetic_data.CMs, 0, mode="mask").ActiveCMs},
+                model=model)
+    masked = model_fingerprint(model)
+    assert masked != full
+
+    model.build_kwargs = {"cm_prior_sigma": 0.5}
+    assert model_fingerprint(model) != masked
+
+    with pytest.raises(ValueError):
+        model.run(10, map_start=True, start={})
+
+
+def test_build_kwargs_are_checked_against_model_type():
+    ModelSpec("combined", DataSpec(), build_kwargs=dict(cm_prior="icl"))
+    with pytest.raises(ValueError):
+        ModelSpec("active", DataSpec(), build_kwargs=dict(cm_prior="icl"))
+    with pytest.raises(ValueError):
+        ModelSpec("combined_v3", DataSpec(), build_kwargs=dict(cm_prior="half_normal"))
+    with pytest.raises(ValueError):
+        ModelSpec("combined_additive", DataSpec(), build_kwargs=dict(cm_prior_conc="wide"))
+
+
+def test_prior_sensitivity_skips_priors_that_do_not_apply():
+    from epimodel.pymc3_models.cm_effect.sensitivitylib import prior_build_kwargs
+
+    assert prior_build_kwargs("combined", "icl", 10) == dict(cm_prior="icl")
+    assert prior_build_kwargs("active", "icl", 10) is None
+    assert prior_build_kwargs("combined_additive", "wide", 10) is None
+    assert prior_build_kwargs("combined_additive", 5, 10) == dict(cm_prior_conc=5)
+    assert prior_build_kwargs("combined_additive", "default", 10) == {}
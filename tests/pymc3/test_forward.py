@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from pytest import approx
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.models import CMCombined_Final, produce_CIs
+from epimodel.pymc3_models.cm_effect.forward import CombinedForwardModel, delay_convolve
+from epimodel.pymc3_models.cm_effect.results import StoredTrace
+
+
+def random_point(model, rng):
+    return {name: rng.normal(scale=0.1, size=np.shape(value)) for name, value in model.test_point.items()}
+
+
+def test_delay_convolve_matches_numpy():
+    infected = np.random.uniform(size=(2, 3, 20))
+    delay = np.random.uniform(size=8)
+    expected = np.array([[np.convolve(x, delay)[:20] for x in region] for region in infected])
+    assert delay_convolve(infected, delay) == approx(expected)
+
+
+def test_forward_matches_theano_graph(synthetic_data):
+    with CMCombined_Final(synthetic_data) as model:
+        model.build_model()
+
+    rng = np.random.RandomState(1)
+    points = [random_point(model, rng) for _ in range(3)]
+
+    f_theano = model.fastfn([model.ExpectedCases, model.ExpectedDeaths, model.CM_Alpha, model.HyperRVar,
+                             model.Phi])
+    theano_outputs = [f_theano(p) for p in points]
+
+    draws = {name: np.stack([p[name] for p in points]) for name in points[0]}
+    draws["CM_Alpha"] = np.stack([o[2] for o in theano_outputs])
+    draws["HyperRVar"] = np.stack([o[3] for o in theano_outputs])
+    draws["Phi_1"] = np.stack([o[4] for o in theano_outputs])
+
+    engine = CombinedForwardModel(model)
+    outputs = engine.forward(draws)
+    assert outputs["ExpectedCases"] == approx(np.stack([o[0] for o in theano_outputs]), rel=1e-5)
+    assert outputs["ExpectedDeaths"] == approx(np.stack([o[1] for o in theano_outputs]), rel=1e-5)
+
+    log_lik = engine.log_likelihood(draws, outputs)
+    for i, p in enumerate(points):
+        assert log_lik["ObservedCases"][i] == approx(model.ObservedCases.logp_elemwise(p), rel=1e-5)
+        assert log_lik["ObservedDeaths"][i] == approx(model.ObservedDeaths.logp_elemwise(p), rel=1e-5)
+
+
+def test_posterior_predictive_is_batched_and_cached(synthetic_data):
+    np.random.seed(0)
+    mu = np.full((2, 2000, 3, 4), 50.)
+    mu[:, :, 2, 3] = np.nan
+    phi = np.concatenate([np.full((2, 1000), 5.), np.full((2, 1000), 50.)], axis=1)
+    model = CMCombined_Final(synthetic_data, None)
+    model.trace = StoredTrace({"ExpectedCases": mu, "Phi_1": phi})
+
+    draws = model.posterior_predictive("ExpectedCases")
+    assert draws.shape == (4000, 3, 4)
+    assert np.isnan(draws[:, 2, 3]).all() and np.isfinite(draws[:, :2]).all()
+    # NB variance mu + mu ** 2 / phi, with phi per draw
+    low_phi, high_phi = draws[phi.reshape(-1) == 5., 0, 0], draws[phi.reshape(-1) == 50., 0, 0]
+    assert np.mean(draws[:, 0, 0]) == pytest.approx(50, rel=0.05)
+    assert np.var(low_phi) == pytest.approx(50 + 50 ** 2 / 5., rel=0.15)
+    assert np.var(high_phi) == pytest.approx(50 + 50 ** 2 / 50., rel=0.15)
+
+    assert model.posterior_predictive("ExpectedCases") is draws
+    model.trace = StoredTrace({"ExpectedCases": mu, "Phi_1": phi})
+    assert model.posterior_predictive("ExpectedCases") is not draws
+
+
+def test_region_CIs_match_produce_CIs(synthetic_data):
+    growth = np.random.normal(size=(2, 50, 3, 4))
+    model = CMCombined_Final(synthetic_data, None)
+    model.trace = StoredTrace({"ExpectedGrowth": growth})
+
+    for country_indx in range(3):
+        expected = produce_CIs(np.exp(model.trace.ExpectedGrowth[:, country_indx, :]))
+        for value, expected_value in zip(model.region_CIs("ExpectedGrowth", country_indx, exp=True), expected):
+            assert value == approx(expected_value)
+
+    cis = model.trajectory_CIs("ExpectedGrowth", exp=True)
+    assert model.trajectory_CIs("ExpectedGrowth", exp=True) is cis
+    model.trace = StoredTrace({"ExpectedGrowth": growth})
+    assert model.trajectory_CIs("ExpectedGrowth", exp=True) is not cis
@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.instrumentation import instrumented, run_record, stage, stage_table
+
+
+@instrumented("square")
+def square(x):
+    return x ** 2
+
+
+def test_stages_are_recorded_per_run(tmp_path):
+    path = str(tmp_path / "profile.jsonl")
+
+    # outside a run nothing is recorded
+    with stage("ignored"):
+        square(1)
+
+    for name in ["a", "b"]:
+        with run_record(name, path, model_type="combined"):
+            with stage("outer", n_grad=10) as fields:
+                fields["extra"] = 1
+                square(2)
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert [r["run"] for r in records] == ["a", "b"]
+    assert [s["stage"] for s in records[0]["stages"]] == ["square", "outer", "total"]
+
+    table = stage_table(path)
+    assert len(table) == 6
+    outer = table[table.stage == "outer"].iloc[0]
+    assert outer.n_grad == 10 and outer.extra == 1 and outer.model_type == "combined"
+    assert table[table.stage == "square"].parent.tolist() == ["outer", "outer"]
+    assert (table.wall >= 0).all() and (table.maxrss_mb > 0).all()
+
+
+# run in a fresh interpreter, so that larger children run earlier by other tests cannot hide the peaks
+CHILD_STAGES = """
+import json, subprocess, sys
+from epimodel.pymc3_models.cm_effect.instrumentation import run_record, stage
+
+child = "import time; x = b'1' * ({} * 2 ** 20); time.sleep(1)"
+with run_record("children") as record:
+    for name, mb in [("large", 300), ("smaller", 150), ("none", 0)]:
+        with stage(name):
+            if mb:
+                subprocess.run([sys.executable, "-c", child.format(mb)], check=True)
+print(json.dumps(record.stages))
+"""
+
+
+def test_child_peak_rss_is_recorded_per_stage():
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    output = subprocess.run([sys.executable, "-c", CHILD_STAGES], check=True, stdout=subprocess.PIPE,
+                            env=dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.environ.get("PYTHONPATH", "")])))
+    stages = {s["stage"]: s for s in json.loads(output.stdout.decode().strip().splitlines()[-1])}
+
+    assert stages["large"]["children_maxrss_mb"] > 250
+    # a smaller child after a larger one is still recorded
+    assert 120 < stages["smaller"]["children_maxrss_mb"] < 250
+    assert stages["none"]["children_maxrss_mb"] == 0
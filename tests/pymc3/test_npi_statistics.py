@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from pytest import approx
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.npi_statistics import NPIStatistics
+
+
+def test_statistics_match_loops():
+    rng = np.random.RandomState(0)
+    active = np.zeros((6, 4, 30))
+    for r in range(6):
+        for cm in range(4):
+            active[r, cm, rng.randint(0, 40):] = 1
+    observed = rng.uniform(size=(6, 30)) > 0.3
+    stats = NPIStatistics(active, observed)
+
+    for cm in range(4):
+        mask = active[:, cm, :] * observed
+        assert stats.days_active[cm] == np.sum(mask)
+        for cm2 in range(4):
+            if np.sum(mask) > 0:
+                assert stats.coactivation[cm, cm2] == approx(np.sum(mask * active[:, cm2, :]) / np.sum(mask))
+
+            both = [r for r in range(6) if active[r, cm].any() and active[r, cm2].any()]
+            if both:
+                lags = np.array([np.argmax(active[r, cm2]) - np.argmax(active[r, cm]) for r in both])
+                assert stats.onset_lag[cm, cm2] == approx(np.mean(lags))
+                assert stats.onset_before[cm, cm2] == approx(np.mean(lags > 0))
+                assert stats.onset_same_day[cm, cm2] == approx(np.mean(lags == 0))
+
+
+def test_npi_statistics_cached_until_data_changes(synthetic_data):
+    stats = synthetic_data.npi_statistics()
+    assert synthetic_data.npi_statistics() is stats
+    assert stats.onsets[:, 1] == approx([32, 37, 42])
+
+    synthetic_data.NewDeaths[0, -10:] = np.ma.masked
+    masked = synthetic_data.npi_statistics()
+    assert masked is not stats
+    assert masked.days_active == approx(stats.days_active - 10)
+
+    synthetic_data.ignore_feature(1)
+    assert synthetic_data.npi_statistics().days_active[1] == 0
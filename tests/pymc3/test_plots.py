@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import pytest
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+plt = pytest.importorskip("matplotlib.pyplot")
+
+from epimodel.pymc3_models.cm_effect.models import CMCombined_Final
+from epimodel.pymc3_models.cm_effect.results import StoredTrace
+
+
+def read_pdfs(directory):
+    contents = []
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), "rb") as f:
+            contents.append(f.read())
+    return contents
+
+
+def test_parallel_pages_match_serial(synthetic_data, tmp_path):
+    rng = np.random.RandomState(0)
+    model = CMCombined_Final(synthetic_data, None)
+    shape = (2, 50, len(synthetic_data.Rs), len(synthetic_data.Ds))
+    trajectory = np.exp(np.linspace(1, 6, shape[-1])) * rng.uniform(0.8, 1.2, shape)
+    model.trace = StoredTrace(dict(
+        InfectedCases=trajectory, ExpectedCases=trajectory, InfectedDeaths=trajectory / 30,
+        ExpectedDeaths=trajectory / 30, ExpectedGrowth=rng.normal(0.1, 0.05, shape),
+        GrowthCases=rng.normal(0.1, 0.05, shape), GrowthDeaths=rng.normal(0.1, 0.05, shape),
+        Phi_1=rng.uniform(5, 10, shape[:2]),
+    ))
+
+    model.plot_region_predictions(model.cm_plot_style, output_dir=str(tmp_path / "serial"))
+    plt.close("all")
+    model.plot_region_predictions(model.cm_plot_style, output_dir=str(tmp_path / "parallel"), n_workers=2)
+
+    serial = read_pdfs(tmp_path / "serial")
+    assert len(serial) == 1
+    assert read_pdfs(tmp_path / "parallel") == serial
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.results import ResultStore, result_key
+
+
+def test_store_round_trip(tmp_path):
+    with pm.Model() as model:
+        sd = pm.HalfNormal("sd", 1)
+        x = pm.Normal("x", 0, sd, shape=3)
+        pm.Deterministic("y", 2 * x)
+        model.trace = pm.sample(20, tune=10, chains=2, cores=1, step=pm.Metropolis(), progressbar=False)
+
+    store = ResultStore(str(tmp_path))
+    key = result_key("data", "Model", {"DelayProb": np.ones(3)}, {}, dict(N=20, chains=2))
+    assert key not in store
+
+    store.save(key, model, info=dict(outputs=["a.txt"]))
+    assert key in store
+
+    trace = store.load(key)
+    assert sorted(trace.varnames) == ["sd", "x", "y"]
+    assert trace.nchains == 2
+    assert trace["x"] == pytest.approx(model.trace["x"])
+    assert trace.y.shape == (40, 3)
+    assert store.manifest()[0]["outputs"] == ["a.txt"]
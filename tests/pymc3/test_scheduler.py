@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.scheduler import SamplingJob, CoreBudgetScheduler
+
+
+def write_env(path):
+    with open(path, "w") as f:
+        f.write(f"{os.environ['OMP_NUM_THREADS']} {os.environ['EPIMODEL_CORES']} {len(os.sched_getaffinity(0))}")
+
+
+def test_jobs_are_queued_within_budget(tmp_path):
+    scheduler = CoreBudgetScheduler(n_cores=1, poll_interval=0.1)
+    for i in range(3):
+        scheduler.submit(SamplingJob(f"job{i}", write_env, args=(str(tmp_path / f"job{i}.txt"),), chains=1))
+
+    exitcodes = scheduler.run()
+    assert exitcodes == {"job0": 0, "job1": 0, "job2": 0}
+    for i in range(3):
+        assert (tmp_path / f"job{i}.txt").read_text() == "1 1 1"
+
+
+def test_oversized_job_is_clipped():
+    scheduler = CoreBudgetScheduler(n_cores=1)
+    job = SamplingJob("big", write_env, chains=4, threads_per_chain=2)
+    scheduler.submit(job)
+    assert job.n_cpus == 1
+
+
+def test_jobs_wait_for_memory_budget():
+    scheduler = CoreBudgetScheduler(n_cores=2, memory_budget=10)
+    first = SamplingJob("first", write_env, chains=1, memory=6)
+    second = SamplingJob("second", write_env, chains=1, memory=6)
+
+    assert scheduler.can_start(first)
+    scheduler.running["first"] = (None, first, [0])
+    assert scheduler.free_memory == 4
+    assert not scheduler.can_start(second)
+
+
+def test_jobs_over_memory_budget_are_refused():
+    scheduler = CoreBudgetScheduler(n_cores=1, memory_budget=10)
+    scheduler.submit(SamplingJob("huge", write_env, chains=1, memory=11))
+    assert scheduler.pending == []
+    assert scheduler.exitcodes == {"huge": None}
+
+
+def test_jobs_with_the_same_name_are_kept_apart(tmp_path):
+    scheduler = CoreBudgetScheduler(n_cores=1, poll_interval=0.1)
+    ids = [scheduler.submit(SamplingJob("job", write_env, args=(str(tmp_path / f"job{i}.txt"),), chains=1))
+           for i in range(2)]
+    assert ids == ["job", "job#2"]
+    assert scheduler.run() == {"job": 0, "job#2": 0}
+
+
+def test_oldest_job_is_not_overtaken_forever():
+    scheduler = CoreBudgetScheduler(n_cores=1, memory_budget=10, max_wait_rounds=2)
+    scheduler.running["running"] = (None, SamplingJob("running", write_env, chains=1, memory=3), [])
+    started = []
+    scheduler._start = started.append
+
+    scheduler.submit(SamplingJob("big", write_env, chains=1, memory=8))
+    scheduler.submit(SamplingJob("small", write_env, chains=1, memory=3))
+    scheduler._start_fitting()
+    assert [job.name for job in started] == ["small"]
+
+    scheduler.rounds += 2
+    scheduler.submit(SamplingJob("later", write_env, chains=1, memory=3))
+    scheduler._start_fitting()
+    assert [job.name for job in started] == ["small"]
+    assert scheduler.reserving()
@@ -0,0 +1,55 @@
+import json
+
+import numpy as np
+import pytest
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.factory import DataSpec, ModelFactory, ModelSpec
+from epimodel.pymc3_models.cm_effect.results import ResultStore
+from epimodel.pymc3_models.cm_effect.sensitivitylib import SensitivityRunner, estimate_times, sampler_settings, \
+    timing_history
+
+
+def test_times_are_estimated_from_most_specific_records(tmp_path):
+    path = str(tmp_path / "profile.jsonl")
+    records = [
+        dict(run="combined", spec="a", result_key="k1",
+             stages=[dict(stage="build_model", wall=10.), dict(stage="sample", wall=100.)]),
+        dict(run="combined", spec="b", result_key="k2",
+             stages=[dict(stage="build_model", wall=20.), dict(stage="sample", wall=300.)]),
+        # stored results are loaded, not sampled, and give no sampling time
+        dict(run="combined", spec="b", result_key="k2", stages=[dict(stage="load_result", wall=1.)]),
+    ]
+    with open(path, "w") as f:
+        f.writelines(json.dumps(r) + "\n" for r in records)
+
+    history = timing_history(path)
+    assert len(history) == 2
+    assert estimate_times(history, "k2", "x", "combined") == (20., 300.)
+    assert estimate_times(history, "k3", "a", "combined") == (10., 100.)
+    assert estimate_times(history, "k3", "x", "combined") == (15., 200.)
+    assert np.all(np.isnan(estimate_times(history, "k3", "x", "active")))
+
+
+class NoBuildFactory(ModelFactory):
+    def model(self, spec):
+        raise AssertionError("model built for a stored result")
+
+
+def test_stored_results_are_used_without_building(tmp_path, synthetic_data):
+    with pm.Model() as model:
+        pm.Normal("CMReduction", 1, 0.1, shape=2)
+        model.trace = pm.sample(20, tune=10, chains=2, cores=1, step=pm.Metropolis(), progressbar=False)
+
+    spec = ModelSpec("combined", DataSpec())
+    runner = SensitivityRunner(factory=NoBuildFactory(), store=ResultStore(str(tmp_path / "store")), profile=None,
+                               catalog=None)
+    runner.factory.set_data(spec.data_spec, synthetic_data)
+    runner.store.save(runner.result_key(spec, sampler_settings()), model)
+
+    runner.add(spec, str(tmp_path / "out.txt"))
+    runner.execute()
+    assert np.loadtxt(str(tmp_path / "out.txt")) == pytest.approx(model.trace["CMReduction"])
+    assert np.loadtxt(str(tmp_path / "outrhats.txt")).shape == (2,)
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.datapreprocessor import PreprocessedData
+from epimodel.pymc3_models.cm_effect.models import CMCombined_Final
+from epimodel.pymc3_models.cm_effect.sequential import NOISE_VARS, ParticleTrace, compare_to_refit, n_unique, \
+    noise_blocks, rejuvenate, sequential_update, systematic_resample
+
+
+def first_days(data, nDs):
+    return PreprocessedData(data.Active[:, :nDs].copy(), data.Confirmed[:, :nDs].copy(),
+                            data.ActiveCMs[:, :, :nDs].copy(), data.CMs, data.Rs, data.Ds[:nDs],
+                            data.Deaths[:, :nDs].copy(), data.NewDeaths[:, :nDs].copy(),
+                            data.NewCases[:, :nDs].copy(), data.RNames)
+
+
+def test_systematic_resample_keeps_proportions():
+    weights = np.array([0.5, 0.25, 0.25, 0.0])
+    indx = systematic_resample(weights, np.random.RandomState(0))
+    assert np.bincount(indx, minlength=4).tolist() == [2, 1, 1, 0]
+
+
+def previous_and_new_models(data, nS=100):
+    with CMCombined_Final(first_days(data, 50)) as previous_model:
+        previous_model.build_model()
+    with CMCombined_Final(data) as model:
+        model.build_model()
+
+    rng = np.random.RandomState(0)
+    nRs = 3
+    previous_model.trace = ParticleTrace({
+        "CM_Alpha": rng.normal(0, 0.1, size=(nS, 2)),
+        "RegionLogR_noise": rng.normal(0, 1, size=(nS, nRs)),
+        "HyperRVar": rng.uniform(0.3, 0.7, size=nS),
+        "InitialSizeCases_log": rng.normal(2.0, 0.1, size=(nS, nRs)),
+        "InitialSizeDeaths_log": rng.normal(-1.0, 0.1, size=(nS, nRs)),
+        "GrowthCasesNoise": rng.normal(0, 0.2, size=(nS, nRs, 50)),
+        "GrowthDeathsNoise": rng.normal(0, 0.2, size=(nS, nRs, 50)),
+        "Phi_1": np.full(nS, 5.0),
+    })
+    return previous_model, model
+
+
+def test_sequential_update_extends_particles(synthetic_data):
+    nS, nRs = 100, 3
+    previous_model, model = previous_and_new_models(synthetic_data, nS)
+
+    trace = sequential_update(previous_model, model, ess_threshold=0, n_moves=2, random_seed=0)
+    assert trace is model.trace
+    assert trace.GrowthCasesNoise.shape == (nS, nRs, 60)
+    assert trace["ExpectedCases"].shape == (nS, nRs, 60)
+    assert trace.CMReduction.shape == (nS, 2)
+    assert 0 < trace.ess <= nS
+    assert trace.stats["unique"] >= trace.stats["unique_resampled"]
+    assert trace.stats["unique_noise"] >= trace.stats["unique_noise_resampled"]
+
+
+class GaussianEngine(object):
+    """CM_Alpha[:, 0] observed once with sd 0.1 at 1, split over two regions; N(0, 0.2) prior."""
+
+    def region_log_likelihood(self, draws):
+        log_lik = -0.5 * ((np.asarray(draws["CM_Alpha"])[:, 0] - 1) / 0.1) ** 2
+        return np.tile(log_lik[:, None] / 2, (1, 2))
+
+    def log_prior(self, draws):
+        hyper = np.ravel(draws["HyperRVar"])
+        return -0.5 * np.sum(np.asarray(draws["CM_Alpha"]) ** 2, axis=1) / 0.04 \
+            + np.where(hyper > 0, -0.5 * (hyper / 0.5) ** 2, -np.inf)
+
+
+def test_rejuvenation_spreads_duplicated_parameters():
+    rng = np.random.RandomState(0)
+    nS = 2000
+    # 20 distinct particles, each duplicated 100 times as after resampling
+    particles = {
+        "CM_Alpha": np.tile(rng.normal(0.8, 0.09, size=(20, 1)), (100, 1)),
+        "HyperRVar": np.tile(np.abs(rng.normal(0, 0.5, size=20)), 100),
+        "GrowthCasesNoise": np.zeros((nS, 2, 5)),
+        "GrowthDeathsNoise": np.zeros((nS, 2, 5)),
+    }
+    assert n_unique(particles) == 20
+
+    moved, acceptance = rejuvenate(GaussianEngine(), particles, 0.2, n_moves=30, rng=rng)
+    assert n_unique(moved) > 1900
+    assert 0.1 < np.mean(acceptance["static"]) < 0.9
+    # posterior N(0.8, 0.0894) of CM_Alpha, prior HalfNormal(0.5) of HyperRVar
+    assert np.mean(moved["CM_Alpha"]) == pytest.approx(0.8, abs=0.01)
+    assert np.std(moved["CM_Alpha"]) == pytest.approx(0.0894, rel=0.1)
+    assert np.mean(moved["HyperRVar"]) == pytest.approx(0.5 * np.sqrt(2 / np.pi), rel=0.1)
+
+
+def test_rejuvenation_moves_growth_noise_of_all_days():
+    assert noise_blocks(30, 7) == [(23, 30), (16, 23), (9, 16), (2, 9), (0, 2)]
+
+    rng = np.random.RandomState(0)
+    nS = 500
+    particles = {
+        "CM_Alpha": np.tile(rng.normal(0.8, 0.09, size=(5, 1)), (100, 1)),
+        "HyperRVar": np.tile(np.abs(rng.normal(0, 0.5, size=5)), 100),
+        "GrowthCasesNoise": np.zeros((nS, 2, 30)),
+        "GrowthDeathsNoise": np.zeros((nS, 2, 30)),
+    }
+    assert n_unique(particles, NOISE_VARS) == 1
+
+    moved, acceptance = rejuvenate(GaussianEngine(), particles, 0.2, block_days=7, n_moves=60, rng=rng)
+    assert n_unique(moved, NOISE_VARS) == nS
+    assert len(acceptance["noise"]) == 60
+    # the likelihood does not depend on the noise, so every day is sampled from its N(0, 0.2) prior
+    for name in NOISE_VARS:
+        assert np.mean(moved[name][:, :, 0] != 0) > 0.95
+        assert np.std(moved[name]) == pytest.approx(0.2, rel=0.1)
+
+
+def test_compare_to_refit(synthetic_data):
+    previous_model, model = previous_and_new_models(synthetic_data)
+    with model:
+        step = pm.Metropolis()
+    comparison = compare_to_refit(previous_model, model, n_moves=2, random_seed=0,
+                                  run_kwargs=dict(N=20, tune=10, chains=1, cores=1, step=step, progressbar=False))
+    assert comparison["update_wall"] > 0 and comparison["refit_wall"] > 0
+    assert list(comparison["CMReduction"].columns) == ["update_mean", "update_sd", "refit_mean", "refit_sd",
+                                                       "mean_difference_sds"]
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.streaming import QuantileSketch, RunningMoments
+
+
+def test_merged_summaries_match_draws():
+    rng = np.random.RandomState(0)
+    chains = [rng.lognormal(size=(3000, 3)) for _ in range(4)]
+
+    states = []
+    for draws in chains:
+        moments, sketch = RunningMoments((3,)), QuantileSketch((3,), k=200, rng=rng)
+        for x in draws:
+            moments.update(x)
+            sketch.update(x)
+        states.append((moments, sketch))
+
+    moments, sketch = states[0]
+    for other_moments, other_sketch in states[1:]:
+        moments, sketch = moments.merge(other_moments), sketch.merge(other_sketch)
+
+    all_draws = np.concatenate(chains)
+    assert moments.n == len(all_draws)
+    assert np.allclose(moments.mean, all_draws.mean(axis=0))
+    assert np.allclose(moments.var, all_draws.var(axis=0, ddof=1))
+
+    q = [2.5, 25, 50, 75, 97.5]
+    estimated = sketch.quantiles(q)
+    assert estimated.shape == (5, 3)
+    # compare in rank, the error the sketch bounds
+    ranks = np.array([[np.mean(all_draws[:, j] <= estimated[i, j]) for j in range(3)] for i in range(len(q))])
+    assert np.all(np.abs(ranks - np.array(q)[:, None] / 100) < 0.01)
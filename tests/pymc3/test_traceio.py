@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.traceio import TRACE_STORAGE, StoragePolicy, export_trace, load_trace
+
+
+class ArrayTrace(object):
+    """Minimal MultiTrace stand-in holding [chains, draws, ...] arrays."""
+
+    def __init__(self, values):
+        self.values = values
+        self.varnames = list(values)
+        self.nchains = 2
+
+    def get_values(self, name, combine=True):
+        return list(self.values[name])
+
+    def __len__(self):
+        return 5
+
+
+def test_export_and_selective_load(tmp_path):
+    rng = np.random.RandomState(0)
+    values = {"CMReduction": rng.rand(2, 5, 3), "ExpectedDeaths": rng.rand(2, 5, 4, 10)}
+    path = str(tmp_path / "exp.trace")
+    export_trace(path, ArrayTrace(values), regions=["AA", "BB", "CC", "DD"], chunk_regions=3)
+
+    trace = load_trace(path)
+    assert trace.varnames == ["CMReduction", "ExpectedDeaths"]
+    assert len(trace) == 5 and trace.nchains == 2
+    assert np.array_equal(trace.CMReduction, values["CMReduction"].reshape(10, 3))
+    assert np.array_equal(trace["ExpectedDeaths"], values["ExpectedDeaths"].reshape(10, 4, 10))
+
+    dd = trace.get_values("ExpectedDeaths", regions="DD")
+    assert np.array_equal(dd, values["ExpectedDeaths"][:, :, 3:].reshape(10, 1, 10))
+    per_chain = trace.get_values("ExpectedDeaths", regions=["BB", 3], combine=False)
+    assert np.array_equal(per_chain[1], values["ExpectedDeaths"][1][:, [1, 3]])
+    assert trace.to_dict()["CMReduction"].shape == (2, 5, 3)
+
+
+def test_per_region_variables_are_read_by_region(tmp_path):
+    rng = np.random.RandomState(0)
+    values = {"CMReduction": rng.rand(2, 5, 3), "RegionR": rng.rand(2, 5, 4), "HyperRVar": rng.rand(2, 5)}
+    for storage in TRACE_STORAGE:
+        path = str(tmp_path / f"exp.{storage}.trace")
+        export_trace(path, ArrayTrace(values), regions=["AA", "BB", "CC", "DD"], cms=["NPI 1", "NPI 2", "NPI 3"],
+                     storage=storage, policies={"RegionR": StoragePolicy(quantize=16)})
+        trace = load_trace(path)
+
+        region_r = trace.get_values("RegionR", regions=["DD", "BB"])
+        assert np.allclose(region_r, values["RegionR"][:, :, [3, 1]].reshape(10, 2), atol=1e-4)
+        with pytest.raises(ValueError):
+            trace.get_values("CMReduction", regions="AA")
+        with pytest.raises(ValueError):
+            trace.get_values("HyperRVar", regions="AA")
+
+
+def test_only_region_first_variables_are_split_by_region(tmp_path):
+    rng = np.random.RandomState(0)
+    # CMActiveEffects is [features, days], not [regions, days]
+    values = {"ExpectedCases": rng.rand(2, 5, 4, 10), "CMActiveEffects": rng.rand(2, 5, 3, 10)}
+    for storage in TRACE_STORAGE:
+        path = str(tmp_path / f"exp.{storage}.trace")
+        export_trace(path, ArrayTrace(values), regions=["AA", "BB", "CC", "DD"], storage=storage)
+        trace = load_trace(path)
+        assert np.array_equal(trace.CMActiveEffects, values["CMActiveEffects"].reshape(10, 3, 10))
+        with pytest.raises(ValueError):
+            trace.get_values("CMActiveEffects", regions="AA")
+
+        # without region labels, nothing has a region axis
+        export_trace(path, ArrayTrace(values), storage=storage)
+        trace = load_trace(path)
+        assert np.array_equal(trace.ExpectedCases, values["ExpectedCases"].reshape(10, 4, 10))
+        with pytest.raises(ValueError):
+            trace.get_values("ExpectedCases", regions=[0])
+
+
+def test_memory_mapped_storage(tmp_path):
+    rng = np.random.RandomState(0)
+    values = {"CMReduction": rng.rand(2, 5, 3), "InfectedCases": rng.rand(2, 5, 4, 10)}
+    path = str(tmp_path / "exp.trace")
+    export_trace(path, ArrayTrace(values), regions=["AA", "BB", "CC", "DD"], storage="npy")
+
+    trace = load_trace(path)
+    assert trace.mmap("InfectedCases").shape == (4, 2, 5, 10)
+    infected = trace.InfectedCases
+    assert np.shares_memory(infected, trace.mmap("InfectedCases"))
+    assert np.array_equal(infected[:, 2, :], values["InfectedCases"][:, :, 2].reshape(10, 10))
+    assert np.array_equal(trace.CMReduction, values["CMReduction"].reshape(10, 3))
+
+    bb = trace.get_values("InfectedCases", regions="BB", chains=1)
+    assert np.array_equal(bb, values["InfectedCases"][1, :, [1]].transpose(1, 0, 2))
+
+
+def test_storage_policies(tmp_path):
+    rng = np.random.RandomState(0)
+    values = {"CMReduction": rng.rand(2, 5, 3), "ExpectedCases": 1000 * rng.rand(2, 5, 4, 10),
+              "InfectedCases": 1000 * rng.rand(2, 5, 4, 10)}
+    policies = {"ExpectedCases": StoragePolicy(dtype="float16", thin=2),
+                "InfectedCases": StoragePolicy(quantize=8, max_draws=2)}
+    for storage in TRACE_STORAGE:
+        path = str(tmp_path / f"exp.{storage}.trace")
+        report = export_trace(path, ArrayTrace(values), regions=["AA", "BB", "CC", "DD"], storage=storage,
+                              policies=policies).set_index("variable")
+        trace = load_trace(path)
+
+        assert np.array_equal(trace.CMReduction, values["CMReduction"].reshape(10, 3))
+        assert report.loc["CMReduction", "saved_bytes"] == 0 and report.loc["CMReduction", "max_abs_error"] == 0
+
+        expected = trace.get_values("ExpectedCases", combine=False)
+        assert expected[0].shape == (3, 4, 10) and expected[0].dtype == np.float16
+        error = np.abs(np.stack(expected) - values["ExpectedCases"][:, ::2]).max()
+        assert 0 < error == pytest.approx(report.loc["ExpectedCases", "max_abs_error"]) and error < 1
+        assert report.loc["ExpectedCases", "stored_bytes"] == 2 * 3 * 40 * 2
+
+        infected = trace.get_values("InfectedCases", regions=["DD", "BB"])
+        kept = values["InfectedCases"][:, [0, 4]][:, :, [3, 1]].reshape(4, 2, 10)
+        assert np.abs(infected - kept).max() <= report.loc["InfectedCases", "max_abs_error"] + 1e-9
+        assert report.loc["InfectedCases", "max_abs_error"] <= 1000 / 255 / 2
+        assert report.loc["InfectedCases", "saved_bytes"] > 0
+
+    with pytest.raises(ValueError):
+        export_trace(str(tmp_path / "overflow.trace"), ArrayTrace({"CMReduction": 1e6 * values["CMReduction"]}),
+                     policies={"CMReduction": StoragePolicy(dtype="float16")})
+    with pytest.raises(ValueError):
+        export_trace(str(tmp_path / "overflow.trace"), ArrayTrace({"Count": np.full((2, 5), 70000.)}),
+                     policies={"Count": StoragePolicy(dtype="int16")})
+
+
+def test_aligned_draws_correspond_across_policies(tmp_path):
+    rng = np.random.RandomState(0)
+    values = {"Phi_1": rng.rand(2, 5), "ExpectedCases": rng.rand(2, 5, 4, 10)}
+    path = str(tmp_path / "exp.trace")
+    export_trace(path, ArrayTrace(values), regions=["AA", "BB", "CC", "DD"],
+                 policies={"ExpectedCases": StoragePolicy(max_draws=3)})
+
+    assert load_trace(path).Phi_1.shape == (10,)
+    trace = load_trace(path, align_draws=True)
+    assert list(trace.common_draws()) == [0, 2, 4] and len(trace) == 3
+    assert np.array_equal(trace.Phi_1, values["Phi_1"][:, [0, 2, 4]].reshape(6))
+    assert np.array_equal(trace.get_values("ExpectedCases", regions="BB", combine=False)[1],
+                          values["ExpectedCases"][1][[0, 2, 4]][:, [1]])
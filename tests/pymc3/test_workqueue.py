@@ -0,0 +1,75 @@
+import os
+import time
+
+import pytest
+
+theano = pytest.importorskip("theano")
+pm = pytest.importorskip("pymc3")
+
+from epimodel.pymc3_models.cm_effect.scheduler import SamplingJob
+from epimodel.pymc3_models.cm_effect.workqueue import WorkQueue, QueueWorker
+
+
+def write_name(path, name):
+    with open(path, "w") as f:
+        f.write(name)
+
+
+def test_each_job_is_claimed_once(tmp_path):
+    queue = WorkQueue(str(tmp_path))
+    assert queue.put(SamplingJob("a", write_name, chains=1))
+    assert not queue.put(SamplingJob("a", write_name, chains=1))
+
+    other = WorkQueue(str(tmp_path))
+    assert queue.claim().name == "a"
+    assert other.claim() is None
+    assert queue.status() == {"pending": 0, "claimed": 1, "done": 0, "failed": 0}
+
+    queue.finish("a", 0)
+    assert not queue.put(SamplingJob("a", write_name, chains=1))
+    assert queue.status()["done"] == 1
+
+
+def test_stale_claims_are_requeued(tmp_path):
+    queue = WorkQueue(str(tmp_path), stale_after=60)
+    queue.put(SamplingJob("a", write_name, chains=1))
+    queue.claim()
+
+    queue.requeue_stale()
+    assert queue.names("claimed") == ["a"]
+
+    old = time.time() - 120
+    os.utime(queue.path("claimed", "a"), (old, old))
+    queue.requeue_stale()
+    assert queue.names("pending") == ["a"]
+    assert not queue.heartbeat("a")
+
+
+def test_worker_runs_queued_jobs(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue"))
+    for name in ["a", "b"]:
+        queue.put(SamplingJob(name, write_name, args=(str(tmp_path / f"{name}.txt"), name), chains=1))
+
+    exitcodes = QueueWorker(queue, n_cores=1, poll_interval=0.1).run()
+    assert exitcodes == {"a": 0, "b": 0}
+    assert queue.names("done") == ["a", "b"]
+    assert (tmp_path / "b.txt").read_text() == "b"
+
+
+def test_jobs_too_large_for_every_worker_fail(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue"))
+    queue.put(SamplingJob("big", write_name, args=(str(tmp_path / "big.txt"), "big"), chains=1, memory=2 ** 40))
+
+    # a live worker with a large enough budget keeps the job queued for it
+    queue.register("large", 2 ** 41)
+    assert queue.fail_oversized() == []
+    queue.unregister("large")
+
+    exitcodes = QueueWorker(queue, n_cores=1, poll_interval=0.1, memory_budget=2 ** 30).run()
+    assert exitcodes == {}
+    assert queue.names("failed") == ["big"]
+    assert "more than the memory budget of any worker" in queue.error("big")
+    assert queue.memory_budgets() == []
+
+    queue.requeue_failed()
+    assert queue.names("pending") == ["big"] and queue.error("big") is None